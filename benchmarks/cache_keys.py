@@ -0,0 +1,60 @@
+"""Compares the cost of building and hashing cache keys.
+
+The "legacy" builder is the old ``repr()`` string concatenation that
+``cogs.utils.cache`` used to do, the "tuple" builder is the current one.
+
+Run with ``python -m benchmarks.cache_keys`` from the bot directory.
+"""
+
+import timeit
+
+from cogs.utils import cache
+
+class Cog:
+    pass
+
+def legacy_make_key(func, args, kwargs):
+    def _true_repr(o):
+        if o.__class__.__repr__ is object.__repr__:
+            return f'<{o.__class__.__module__}.{o.__class__.__name__}>'
+        return repr(o)
+
+    key = [ f'{func.__module__}.{func.__name__}' ]
+    key.extend(_true_repr(o) for o in args)
+    for k, v in kwargs.items():
+        if k == 'connection':
+            continue
+
+        key.append(_true_repr(k))
+        key.append(_true_repr(v))
+
+    return ''.join(key)
+
+async def get_starboard(self, guild_id, *, connection=None):
+    pass
+
+def main(number=200000):
+    wrapped = cache.cache()(get_starboard)
+    cog = Cog()
+    guild_id = 81384788765712384
+    connection = object()
+
+    legacy_args = (cog, guild_id)
+    legacy_kwargs = {'connection': connection}
+
+    # a lookup builds a fresh key and then hashes it, so that's what we measure.
+    # neither key has its hash cached since they're created every time.
+    cases = [
+        ('legacy build', lambda: legacy_make_key(get_starboard, legacy_args, legacy_kwargs)),
+        ('tuple build', lambda: wrapped.get_key(cog, guild_id, connection=connection)),
+        ('legacy build+hash', lambda: hash(legacy_make_key(get_starboard, legacy_args, legacy_kwargs))),
+        ('tuple build+hash', lambda: hash(wrapped.get_key(cog, guild_id, connection=connection))),
+    ]
+
+    print(f'{number} iterations each, best of 5')
+    for name, stmt in cases:
+        best = min(timeit.repeat(stmt, number=number, repeat=5))
+        print(f'{name:<18}: {best / number * 1e9:8.1f} ns/call')
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,214 @@
+"""Compares the ``?star stats`` queries against the starrers and the leaderboards.
+
+A synthetic starboard is generated inside a scratch ``star_bench`` schema
+along with its ``star_givers`` and ``star_receivers`` leaderboards, built
+the same way ``Stars.rebuild_leaderboards`` does. Every query the server
+and member stats run is timed in its old form, joining ``starrers`` to
+``starboard_entries``, and in its new form against the leaderboards, and
+their results are checked to be the same.
+
+Run with ``python -m benchmarks.star_leaderboards [stars] [uri]`` from the
+bot directory. ``stars`` defaults to 2 million and ``uri`` to ``config.postgresql``.
+The schema is dropped afterwards.
+"""
+
+import asyncio
+import sys
+import time
+
+import asyncpg
+
+SCHEMA = 'star_bench'
+
+SETUP = """
+DROP SCHEMA IF EXISTS {0} CASCADE;
+CREATE SCHEMA {0};
+SET search_path TO {0};
+
+CREATE TABLE starboard_entries (
+    id SERIAL PRIMARY KEY,
+    bot_message_id BIGINT,
+    message_id BIGINT UNIQUE NOT NULL,
+    channel_id BIGINT,
+    author_id BIGINT,
+    guild_id BIGINT NOT NULL,
+    stars INTEGER DEFAULT (0) NOT NULL
+);
+
+CREATE TABLE starrers (
+    id SERIAL PRIMARY KEY,
+    author_id BIGINT NOT NULL,
+    entry_id INTEGER NOT NULL REFERENCES starboard_entries (id) ON DELETE CASCADE
+);
+
+CREATE TABLE star_givers (
+    id SERIAL PRIMARY KEY,
+    guild_id BIGINT NOT NULL,
+    author_id BIGINT NOT NULL,
+    stars INTEGER DEFAULT (0) NOT NULL
+);
+
+CREATE TABLE star_receivers (
+    id SERIAL PRIMARY KEY,
+    guild_id BIGINT NOT NULL,
+    author_id BIGINT NOT NULL,
+    stars INTEGER DEFAULT (0) NOT NULL
+);
+""".format(SCHEMA)
+
+# a handful of guilds with guild 1 being the big old one, every entry
+# gets a skewed number of starrers from a pool of 20000 members per guild
+GENERATE_ENTRIES = """
+INSERT INTO starboard_entries (bot_message_id, message_id, channel_id, author_id, guild_id)
+SELECT CASE WHEN random() < 0.8 THEN n * 2 + 1 END,
+       n * 2,
+       1 + floor(random() * 50)::bigint,
+       1 + floor(power(random(), 2) * 20000)::bigint,
+       CASE WHEN random() < 0.7 THEN 1 ELSE 2 + floor(random() * 20)::bigint END
+FROM generate_series(1, $1) AS n;
+"""
+
+# the entry.id is only there so the series is generated again for every entry
+GENERATE_STARRERS = """
+INSERT INTO starrers (author_id, entry_id)
+SELECT DISTINCT t.starrer, entry.id
+FROM starboard_entries entry,
+     LATERAL (
+         SELECT 1 + floor(power(random(), 3) * 20000)::bigint AS starrer
+         FROM generate_series(1, 1 + floor(power(random(), 4) * $1)::int + entry.id * 0)
+     ) AS t;
+"""
+
+INDEXES = """
+UPDATE starboard_entries entry
+SET stars = counted.total
+FROM (SELECT entry_id, COUNT(*) AS total FROM starrers GROUP BY entry_id) AS counted
+WHERE entry.id = counted.entry_id;
+
+CREATE INDEX ON starboard_entries (bot_message_id);
+CREATE INDEX ON starboard_entries (guild_id);
+CREATE INDEX ON starboard_entries (guild_id, stars) WHERE bot_message_id IS NOT NULL;
+CREATE INDEX ON starboard_entries (guild_id, author_id, stars);
+CREATE INDEX ON starrers (entry_id);
+CREATE UNIQUE INDEX ON starrers (author_id, entry_id);
+
+INSERT INTO star_givers (guild_id, author_id, stars)
+SELECT entry.guild_id, starrers.author_id, COUNT(*)
+FROM starrers
+INNER JOIN starboard_entries entry
+ON entry.id = starrers.entry_id
+GROUP BY entry.guild_id, starrers.author_id;
+
+INSERT INTO star_receivers (guild_id, author_id, stars)
+SELECT guild_id, author_id, SUM(stars)
+FROM starboard_entries
+WHERE author_id IS NOT NULL
+GROUP BY guild_id, author_id;
+
+CREATE UNIQUE INDEX ON star_givers (guild_id, author_id);
+CREATE INDEX ON star_givers (guild_id, stars);
+CREATE UNIQUE INDEX ON star_receivers (guild_id, author_id);
+CREATE INDEX ON star_receivers (guild_id, stars);
+"""
+
+_joined = """WITH t AS (
+                 SELECT entry.author_id AS entry_author_id, starrers.author_id, entry.message_id, entry.bot_message_id
+                 FROM starrers
+                 INNER JOIN starboard_entries entry
+                 ON entry.id = starrers.entry_id
+                 WHERE entry.guild_id=$1
+             )
+          """
+
+# (name, old query, new query), $1 is the guild and $2 its busiest member
+CASES = [
+    ('guild totals',
+     """SELECT (SELECT COUNT(*) FROM starboard_entries WHERE guild_id=$1),
+               (SELECT COUNT(*) FROM starrers INNER JOIN starboard_entries entry
+                ON entry.id = starrers.entry_id WHERE entry.guild_id=$1);""",
+     """SELECT (SELECT COUNT(*) FROM starboard_entries WHERE guild_id=$1),
+               (SELECT COALESCE(SUM(stars), 0) FROM star_givers WHERE guild_id=$1);"""),
+    ('top receivers',
+     _joined + 'SELECT entry_author_id, COUNT(*) AS "Stars" FROM t WHERE entry_author_id IS NOT NULL GROUP BY 1 ORDER BY "Stars" DESC LIMIT 3;',
+     'SELECT author_id, stars AS "Stars" FROM star_receivers WHERE guild_id=$1 AND stars > 0 ORDER BY stars DESC LIMIT 3;'),
+    ('top givers',
+     _joined + 'SELECT author_id, COUNT(*) AS "Stars" FROM t GROUP BY 1 ORDER BY "Stars" DESC LIMIT 3;',
+     'SELECT author_id, stars AS "Stars" FROM star_givers WHERE guild_id=$1 AND stars > 0 ORDER BY stars DESC LIMIT 3;'),
+    ('top posts',
+     _joined + 'SELECT bot_message_id, COUNT(*) AS "Stars" FROM t WHERE bot_message_id IS NOT NULL GROUP BY 1 ORDER BY "Stars" DESC LIMIT 3;',
+     """SELECT bot_message_id, stars AS "Stars" FROM starboard_entries
+        WHERE guild_id=$1 AND bot_message_id IS NOT NULL ORDER BY stars DESC LIMIT 3;"""),
+    ('member totals',
+     _joined + """SELECT (SELECT COUNT(*) FROM t WHERE entry_author_id=$2), (SELECT COUNT(*) FROM t WHERE author_id=$2),
+                         (SELECT COUNT(*) FROM starboard_entries WHERE guild_id=$1 AND author_id=$2);""",
+     """SELECT COALESCE((SELECT stars FROM star_receivers WHERE guild_id=$1 AND author_id=$2), 0),
+               COALESCE((SELECT stars FROM star_givers WHERE guild_id=$1 AND author_id=$2), 0),
+               (SELECT COUNT(*) FROM starboard_entries WHERE guild_id=$1 AND author_id=$2);"""),
+    ('member top posts',
+     _joined + 'SELECT message_id, COUNT(*) AS "Stars" FROM t WHERE entry_author_id=$2 GROUP BY 1 ORDER BY "Stars" DESC LIMIT 3;',
+     """SELECT message_id, stars AS "Stars" FROM starboard_entries
+        WHERE guild_id=$1 AND author_id=$2 AND stars > 0 ORDER BY stars DESC LIMIT 3;"""),
+]
+
+def _comparable(name, records):
+    if 'totals' in name:
+        return tuple(records[0])
+    # ties in the top three can come back in either order so only compare the counts
+    return sorted(record['Stars'] for record in records)
+
+async def _timed(con, query, args, repeat):
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        records = await con.fetch(query, *args)
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best, records
+
+async def main(stars, uri, repeat=5):
+    con = await asyncpg.connect(uri)
+    try:
+        # about 4 starrers per entry on average
+        print(f'generating about {stars} stars...')
+        start = time.perf_counter()
+        await con.execute(SETUP)
+        await con.execute(GENERATE_ENTRIES, stars // 4)
+        await con.execute(GENERATE_STARRERS, 16)
+        await con.execute(INDEXES)
+        # VACUUM can't be part of a multi statement string, it's for the index only scans
+        await con.execute('VACUUM ANALYZE starboard_entries, starrers, star_givers, star_receivers;')
+        print(f'set up in {time.perf_counter() - start:.1f}s')
+
+        guild_id = 1
+        member_id = await con.fetchval('SELECT author_id FROM star_receivers WHERE guild_id=$1 ORDER BY stars DESC LIMIT 1;', guild_id)
+        total = await con.fetchval('SELECT COUNT(*) FROM starrers;')
+        print(f'{total} stars, busiest member of guild {guild_id} is {member_id}')
+
+        print(f'best of {repeat}')
+        print(f'{"query":<18} {"old":>10} {"new":>10} {"speedup":>8}')
+        old_total = new_total = 0.0
+        for name, old, new in CASES:
+            args = (guild_id, member_id) if '$2' in old else (guild_id,)
+            old_time, old_records = await _timed(con, old, args, repeat)
+            new_time, new_records = await _timed(con, new, args, repeat)
+            old_total += old_time
+            new_total += new_time
+
+            same = _comparable(name, old_records) == _comparable(name, new_records)
+            mismatch = '' if same else '  MISMATCH'
+            print(f'{name:<18} {old_time * 1000:8.1f}ms {new_time * 1000:8.1f}ms {old_time / new_time:7.1f}x{mismatch}')
+
+        print(f'{"total":<18} {old_total * 1000:8.1f}ms {new_total * 1000:8.1f}ms {old_total / new_total:7.1f}x')
+    finally:
+        await con.execute(f'DROP SCHEMA IF EXISTS {SCHEMA} CASCADE;')
+        await con.close()
+
+if __name__ == '__main__':
+    stars = int(sys.argv[1]) if len(sys.argv) > 1 else 2000000
+    if len(sys.argv) > 2:
+        uri = sys.argv[2]
+    else:
+        import config
+        uri = config.postgresql
+
+    asyncio.get_event_loop().run_until_complete(main(stars, uri))
@@ -0,0 +1,310 @@
+"""Compares how many star and unstar reactions per second the database can take.
+
+The "legacy" path is the old sequence of queries ``Stars._star_message`` and
+``Stars._unstar_message`` used to run, recounting ``starrers`` every time.
+The "counted" path is the single statement that keeps the ``stars``
+column on ``starboard_entries`` up to date on its own, and the "shipped"
+path is the statement the bot actually runs, which also bumps the
+``star_givers`` and ``star_receivers`` leaderboards in the same go.
+Comparing the last two shows what the leaderboards cost. Discord API
+calls aren't part of any of them, this only measures the time spent
+in PostgreSQL.
+
+Every reaction is run on its own connection round trip, one after another,
+the same way the bot does it while holding the message's lock.
+
+Run with ``python -m benchmarks.star_reactions [reactions] [uri]`` from the
+bot directory. ``reactions`` defaults to 20000 and ``uri`` to ``config.postgresql``.
+Everything happens in a scratch ``stars_bench`` schema that is dropped afterwards.
+"""
+
+import asyncio
+import random
+import sys
+import time
+
+import asyncpg
+
+SCHEMA = 'stars_bench'
+
+SETUP = """
+DROP SCHEMA IF EXISTS {0} CASCADE;
+CREATE SCHEMA {0};
+SET search_path TO {0};
+
+CREATE TABLE starboard_entries (
+    id SERIAL PRIMARY KEY,
+    bot_message_id BIGINT,
+    message_id BIGINT UNIQUE NOT NULL,
+    channel_id BIGINT,
+    author_id BIGINT,
+    guild_id BIGINT NOT NULL,
+    stars INTEGER DEFAULT (0) NOT NULL
+);
+
+CREATE INDEX ON starboard_entries (bot_message_id);
+CREATE INDEX ON starboard_entries (guild_id);
+
+CREATE TABLE starrers (
+    id SERIAL PRIMARY KEY,
+    author_id BIGINT NOT NULL,
+    entry_id INTEGER NOT NULL REFERENCES starboard_entries (id) ON DELETE CASCADE
+);
+
+CREATE INDEX ON starrers (entry_id);
+CREATE UNIQUE INDEX ON starrers (author_id, entry_id);
+
+CREATE TABLE star_givers (
+    id SERIAL PRIMARY KEY,
+    guild_id BIGINT NOT NULL,
+    author_id BIGINT NOT NULL,
+    stars INTEGER DEFAULT (0) NOT NULL
+);
+
+CREATE UNIQUE INDEX ON star_givers (guild_id, author_id);
+CREATE INDEX ON star_givers (guild_id, stars);
+
+CREATE TABLE star_receivers (
+    id SERIAL PRIMARY KEY,
+    guild_id BIGINT NOT NULL,
+    author_id BIGINT NOT NULL,
+    stars INTEGER DEFAULT (0) NOT NULL
+);
+
+CREATE UNIQUE INDEX ON star_receivers (guild_id, author_id);
+CREATE INDEX ON star_receivers (guild_id, stars);
+""".format(SCHEMA)
+
+THRESHOLD = 3
+GUILD_ID = 1
+
+def author_of(message_id):
+    # spread the messages over a few hundred authors so the receivers aren't all one row
+    return message_id // 10 % 300
+
+async def legacy_star(con, message_id, starrer_id):
+    query = """WITH to_insert AS (
+                   INSERT INTO starboard_entries AS entries (message_id, channel_id, guild_id, author_id)
+                   VALUES ($1, $2, $3, $4)
+                   ON CONFLICT (message_id) DO NOTHING
+                   RETURNING entries.id
+               )
+               INSERT INTO starrers (author_id, entry_id)
+               SELECT $5, entry.id
+               FROM (
+                   SELECT id FROM to_insert
+                   UNION ALL
+                   SELECT id FROM starboard_entries WHERE message_id=$1
+                   LIMIT 1
+               ) AS entry
+               RETURNING entry_id;
+            """
+
+    record = await con.fetchrow(query, message_id, 2, GUILD_ID, author_of(message_id), starrer_id)
+    entry_id = record[0]
+
+    count = await con.fetchval("SELECT COUNT(*) FROM starrers WHERE entry_id=$1;", entry_id)
+    if count < THRESHOLD:
+        return
+
+    bot_message_id = await con.fetchval("SELECT bot_message_id FROM starboard_entries WHERE message_id=$1;", message_id)
+    if bot_message_id is None:
+        query = "UPDATE starboard_entries SET bot_message_id=$1 WHERE message_id=$2;"
+        await con.execute(query, message_id + 1, message_id)
+
+async def legacy_unstar(con, message_id, starrer_id):
+    query = """DELETE FROM starrers USING starboard_entries entry
+               WHERE entry.message_id=$1
+               AND   entry.id=starrers.entry_id
+               AND   starrers.author_id=$2
+               RETURNING starrers.entry_id, entry.bot_message_id
+            """
+
+    entry_id, bot_message_id = await con.fetchrow(query, message_id, starrer_id)
+    count = await con.fetchval("SELECT COUNT(*) FROM starrers WHERE entry_id=$1;", entry_id)
+    if count == 0:
+        await con.execute("DELETE FROM starboard_entries WHERE id=$1;", entry_id)
+    elif bot_message_id is not None and count < THRESHOLD:
+        await con.execute("UPDATE starboard_entries SET bot_message_id=NULL WHERE id=$1;", entry_id)
+
+async def counted_star(con, message_id, starrer_id):
+    query = """WITH entry AS (
+                   INSERT INTO starboard_entries AS entries (message_id, channel_id, guild_id, author_id, stars)
+                   VALUES ($1, $2, $3, $4, 1)
+                   ON CONFLICT (message_id) DO UPDATE SET stars = entries.stars + 1
+                   RETURNING entries.id, entries.stars, entries.bot_message_id
+               ), starrer AS (
+                   INSERT INTO starrers (author_id, entry_id)
+                   SELECT $5, id FROM entry
+               )
+               SELECT id, stars, bot_message_id FROM entry;
+            """
+
+    entry_id, count, bot_message_id = await con.fetchrow(query, message_id, 2, GUILD_ID, author_of(message_id), starrer_id)
+    if count >= THRESHOLD and bot_message_id is None:
+        await con.execute("UPDATE starboard_entries SET bot_message_id=$1 WHERE id=$2;", message_id + 1, entry_id)
+
+async def counted_unstar(con, message_id, starrer_id):
+    query = """WITH starrer AS (
+                   DELETE FROM starrers USING starboard_entries entry
+                   WHERE entry.message_id=$1
+                   AND   entry.id=starrers.entry_id
+                   AND   starrers.author_id=$2
+                   RETURNING starrers.entry_id
+               )
+               UPDATE starboard_entries
+               SET stars = starboard_entries.stars - 1
+               FROM starrer
+               WHERE starboard_entries.id = starrer.entry_id
+               RETURNING starboard_entries.id, starboard_entries.stars, starboard_entries.bot_message_id;
+            """
+
+    entry_id, count, bot_message_id = await con.fetchrow(query, message_id, starrer_id)
+    if count == 0:
+        await con.execute("DELETE FROM starboard_entries WHERE id=$1;", entry_id)
+    elif bot_message_id is not None and count < THRESHOLD:
+        await con.execute("UPDATE starboard_entries SET bot_message_id=NULL WHERE id=$1;", entry_id)
+
+async def shipped_star(con, message_id, starrer_id):
+    query = """WITH entry AS (
+                   INSERT INTO starboard_entries AS entries (message_id, channel_id, guild_id, author_id, stars)
+                   VALUES ($1, $2, $3, $4, 1)
+                   ON CONFLICT (message_id) DO UPDATE SET stars = entries.stars + 1
+                   RETURNING entries.id, entries.stars, entries.bot_message_id, entries.author_id
+               ), starrer AS (
+                   INSERT INTO starrers (author_id, entry_id)
+                   SELECT $5, id FROM entry
+               ), given AS (
+                   INSERT INTO star_givers (guild_id, author_id, stars)
+                   VALUES ($3, $5, 1)
+                   ON CONFLICT (guild_id, author_id) DO UPDATE SET stars = star_givers.stars + 1
+               ), received AS (
+                   INSERT INTO star_receivers (guild_id, author_id, stars)
+                   SELECT $3, author_id, 1 FROM entry WHERE author_id IS NOT NULL
+                   ON CONFLICT (guild_id, author_id) DO UPDATE SET stars = star_receivers.stars + 1
+               )
+               SELECT id, stars, bot_message_id FROM entry;
+            """
+
+    entry_id, count, bot_message_id = await con.fetchrow(query, message_id, 2, GUILD_ID, author_of(message_id), starrer_id)
+    if count >= THRESHOLD and bot_message_id is None:
+        await con.execute("UPDATE starboard_entries SET bot_message_id=$1 WHERE id=$2;", message_id + 1, entry_id)
+
+async def shipped_unstar(con, message_id, starrer_id):
+    query = """WITH starrer AS (
+                   DELETE FROM starrers USING starboard_entries entry
+                   WHERE entry.message_id=$1
+                   AND   entry.id=starrers.entry_id
+                   AND   starrers.author_id=$2
+                   RETURNING starrers.entry_id
+               ), entry AS (
+                   UPDATE starboard_entries
+                   SET stars = starboard_entries.stars - 1
+                   FROM starrer
+                   WHERE starboard_entries.id = starrer.entry_id
+                   RETURNING starboard_entries.id, starboard_entries.stars, starboard_entries.bot_message_id,
+                             starboard_entries.guild_id, starboard_entries.author_id
+               ), given AS (
+                   UPDATE star_givers
+                   SET stars = star_givers.stars - 1
+                   FROM entry
+                   WHERE star_givers.guild_id = entry.guild_id
+                   AND   star_givers.author_id = $2
+               ), received AS (
+                   UPDATE star_receivers
+                   SET stars = star_receivers.stars - 1
+                   FROM entry
+                   WHERE star_receivers.guild_id = entry.guild_id
+                   AND   star_receivers.author_id = entry.author_id
+               )
+               SELECT id, stars, bot_message_id FROM entry;
+            """
+
+    entry_id, count, bot_message_id = await con.fetchrow(query, message_id, starrer_id)
+    if count == 0:
+        await con.execute("DELETE FROM starboard_entries WHERE id=$1;", entry_id)
+    elif bot_message_id is not None and count < THRESHOLD:
+        await con.execute("UPDATE starboard_entries SET bot_message_id=NULL WHERE id=$1;", entry_id)
+
+def workload(reactions, *, messages=500, users=2000, seed=0):
+    """Generates a reproducible mix of stars and unstars, about a quarter of them unstars."""
+    rng = random.Random(seed)
+    starred = {}
+    operations = []
+    while len(operations) < reactions:
+        message_id = 10000 + rng.randrange(messages) * 10
+        starrers = starred.setdefault(message_id, set())
+        if starrers and rng.random() < 0.25:
+            starrer_id = rng.choice(sorted(starrers))
+            starrers.discard(starrer_id)
+            operations.append((False, message_id, starrer_id))
+        else:
+            starrer_id = rng.randrange(users)
+            if starrer_id in starrers:
+                continue
+            starrers.add(starrer_id)
+            operations.append((True, message_id, starrer_id))
+    return operations
+
+async def run(con, operations, star, unstar):
+    await con.execute('TRUNCATE starboard_entries, starrers, star_givers, star_receivers RESTART IDENTITY;')
+    start = time.perf_counter()
+    for is_star, message_id, starrer_id in operations:
+        if is_star:
+            await star(con, message_id, starrer_id)
+        else:
+            await unstar(con, message_id, starrer_id)
+    elapsed = time.perf_counter() - start
+
+    # every path should leave the same starrers behind and the counts should agree with them
+    drift = await con.fetchval("""SELECT COUNT(*) FROM starboard_entries entry
+                                  WHERE entry.stars <> (SELECT COUNT(*) FROM starrers WHERE entry_id = entry.id);
+                               """)
+
+    # and so should the leaderboards, members that drop back to zero keep their row like in the bot
+    drift += await con.fetchval("""SELECT COUNT(*) FROM star_givers giver
+                                   WHERE giver.stars <> (SELECT COUNT(*) FROM starrers
+                                                         INNER JOIN starboard_entries entry ON entry.id = starrers.entry_id
+                                                         WHERE entry.guild_id = giver.guild_id
+                                                         AND   starrers.author_id = giver.author_id);
+                                """)
+    drift += await con.fetchval("""SELECT COUNT(*) FROM star_receivers receiver
+                                   WHERE receiver.stars <> (SELECT COALESCE(SUM(stars), 0) FROM starboard_entries entry
+                                                            WHERE entry.guild_id = receiver.guild_id
+                                                            AND   entry.author_id = receiver.author_id);
+                                """)
+    starrers = await con.fetchval('SELECT COUNT(*) FROM starrers;')
+    return elapsed, starrers, drift
+
+async def main(reactions, uri):
+    con = await asyncpg.connect(uri)
+    try:
+        await con.execute(SETUP)
+        operations = workload(reactions)
+
+        # the legacy path never touches the stars column so its drift isn't meaningful
+        legacy, legacy_starrers, _ = await run(con, operations, legacy_star, legacy_unstar)
+        counted, counted_starrers, counted_drift = await run(con, operations, counted_star, counted_unstar)
+        shipped, shipped_starrers, shipped_drift = await run(con, operations, shipped_star, shipped_unstar)
+
+        print(f'{reactions} reactions, threshold of {THRESHOLD}')
+        print(f'legacy : {legacy:7.2f}s {reactions / legacy:9.1f} reactions/s')
+        print(f'counted: {counted:7.2f}s {reactions / counted:9.1f} reactions/s ({legacy / counted:.2f}x)')
+        print(f'shipped: {shipped:7.2f}s {reactions / shipped:9.1f} reactions/s ({legacy / shipped:.2f}x, '
+              f'leaderboards cost {shipped / counted:.2f}x)')
+        for name, starrers, drift in (('counted', counted_starrers, counted_drift), ('shipped', shipped_starrers, shipped_drift)):
+            if legacy_starrers != starrers or drift:
+                print(f'MISMATCH ({name}): {legacy_starrers} vs {starrers} starrers, {drift} rows with a wrong count')
+    finally:
+        await con.execute(f'DROP SCHEMA IF EXISTS {SCHEMA} CASCADE;')
+        await con.close()
+
+if __name__ == '__main__':
+    reactions = int(sys.argv[1]) if len(sys.argv) > 1 else 20000
+    if len(sys.argv) > 2:
+        uri = sys.argv[2]
+    else:
+        import config
+        uri = config.postgresql
+
+    asyncio.get_event_loop().run_until_complete(main(reactions, uri))
@@ -0,0 +1,238 @@
+"""Compares the ``?stats`` queries against the raw commands log and the roll ups.
+
+A synthetic commands log is generated inside a scratch ``stats_bench``
+schema along with its hourly roll ups, built the same way
+``data_migrators.migrate_stats`` does. Every query that the ``?stats``,
+``?stats global`` and ``?stats today`` commands run is timed in its old
+form against the raw log and in its new form against the roll ups, and
+their results are checked to be the same.
+
+Run with ``python -m benchmarks.stats_rollups [rows] [uri]`` from the bot
+directory. ``rows`` defaults to 50 million and ``uri`` to ``config.postgresql``.
+The schema is dropped afterwards. Generating 50 million rows takes a while.
+"""
+
+import asyncio
+import datetime
+import re
+import sys
+import time
+
+import asyncpg
+
+SCHEMA = 'stats_bench'
+
+SETUP = """
+DROP SCHEMA IF EXISTS {0} CASCADE;
+CREATE SCHEMA {0};
+SET search_path TO {0};
+
+CREATE TABLE commands (
+    id SERIAL PRIMARY KEY,
+    guild_id BIGINT,
+    channel_id BIGINT,
+    author_id BIGINT,
+    used TIMESTAMP,
+    prefix TEXT,
+    command TEXT
+);
+
+CREATE TABLE command_rollups (
+    id BIGSERIAL PRIMARY KEY,
+    bucket TIMESTAMP NOT NULL,
+    guild_id BIGINT NOT NULL,
+    command TEXT NOT NULL,
+    uses INTEGER DEFAULT (0),
+    first_used TIMESTAMP
+);
+
+CREATE TABLE command_author_rollups (
+    id BIGSERIAL PRIMARY KEY,
+    bucket TIMESTAMP NOT NULL,
+    guild_id BIGINT NOT NULL,
+    author_id BIGINT NOT NULL,
+    command TEXT NOT NULL,
+    uses INTEGER DEFAULT (0),
+    first_used TIMESTAMP
+);
+""".format(SCHEMA)
+
+# a year of usage, skewed towards a handful of guilds, users and commands
+# with about 5% of it in private messages
+GENERATE = """
+INSERT INTO commands (guild_id, channel_id, author_id, used, prefix, command)
+SELECT CASE WHEN random() < 0.05 THEN NULL ELSE 1 + floor(power(random(), 3) * 5000)::bigint END,
+       1 + floor(random() * 100000)::bigint,
+       1 + floor(power(random(), 2) * 200000)::bigint,
+       now()::timestamp - random() * INTERVAL '365 days',
+       '?',
+       'command' || floor(power(random(), 2) * 150)::int
+FROM generate_series(1, $1);
+"""
+
+INDEXES = """
+CREATE INDEX ON commands (guild_id);
+CREATE INDEX ON commands (author_id);
+CREATE INDEX ON commands (command);
+CREATE INDEX ON commands (used);
+
+INSERT INTO command_rollups (bucket, guild_id, command, uses, first_used)
+SELECT date_trunc('hour', used), COALESCE(guild_id, 0), command, COUNT(*), MIN(used)
+FROM commands
+GROUP BY 1, 2, 3;
+
+INSERT INTO command_author_rollups (bucket, guild_id, author_id, command, uses, first_used)
+SELECT date_trunc('hour', used), COALESCE(guild_id, 0), author_id, command, COUNT(*), MIN(used)
+FROM commands
+GROUP BY 1, 2, 3, 4;
+
+CREATE UNIQUE INDEX ON command_rollups (bucket, guild_id, command);
+CREATE INDEX ON command_rollups (guild_id, bucket);
+CREATE UNIQUE INDEX ON command_author_rollups (bucket, guild_id, author_id, command);
+CREATE INDEX ON command_author_rollups (guild_id, author_id, bucket);
+
+ANALYZE;
+"""
+
+def _today(table, key, where=''):
+    # the shape the cogs.stats "today" queries have
+    raw_key = 'guild_id' if key == 'NULLIF(guild_id, 0)' else key
+    extra = f'{where} AND ' if where else ''
+    return f"""SELECT {raw_key}, SUM(uses) AS "uses"
+               FROM (
+                   SELECT {key} AS {raw_key}, uses FROM {table} WHERE {extra}bucket >= :hour
+                   UNION ALL
+                   SELECT {raw_key}, COUNT(*)::int FROM commands WHERE {extra}used > :cutoff AND used < :hour GROUP BY {raw_key}
+               ) AS today
+               GROUP BY {raw_key} ORDER BY "uses" DESC LIMIT 5;"""
+
+def _raw_today(key, where=''):
+    extra = f'{where} AND ' if where else ''
+    return f"""SELECT {key}, COUNT(*) AS "uses" FROM commands
+               WHERE {extra}used > :cutoff
+               GROUP BY {key} ORDER BY "uses" DESC LIMIT 5;"""
+
+# (name, raw query, roll up query)
+# :guild is the busiest guild, :member its busiest member, :cutoff is a day ago
+# and :hour is the first full hour after that
+CASES = [
+    ('guild total',
+     "SELECT COUNT(*), MIN(used) FROM commands WHERE guild_id=:guild;",
+     "SELECT COALESCE(SUM(uses), 0), MIN(first_used) FROM command_rollups WHERE guild_id=:guild;"),
+    ('guild commands',
+     'SELECT command, COUNT(*) AS "uses" FROM commands WHERE guild_id=:guild GROUP BY command ORDER BY "uses" DESC LIMIT 5;',
+     'SELECT command, SUM(uses) AS "uses" FROM command_rollups WHERE guild_id=:guild GROUP BY command ORDER BY "uses" DESC LIMIT 5;'),
+    ('guild commands today',
+     _raw_today('command', 'guild_id=:guild'),
+     _today('command_rollups', 'command', 'guild_id=:guild')),
+    ('guild users',
+     'SELECT author_id, COUNT(*) AS "uses" FROM commands WHERE guild_id=:guild GROUP BY author_id ORDER BY "uses" DESC LIMIT 5;',
+     'SELECT author_id, SUM(uses) AS "uses" FROM command_author_rollups WHERE guild_id=:guild GROUP BY author_id ORDER BY "uses" DESC LIMIT 5;'),
+    ('guild users today',
+     _raw_today('author_id', 'guild_id=:guild'),
+     _today('command_author_rollups', 'author_id', 'guild_id=:guild')),
+    ('member total',
+     "SELECT COUNT(*), MIN(used) FROM commands WHERE guild_id=:guild AND author_id=:member;",
+     "SELECT COALESCE(SUM(uses), 0), MIN(first_used) FROM command_author_rollups WHERE guild_id=:guild AND author_id=:member;"),
+    ('member commands today',
+     _raw_today('command', 'guild_id=:guild AND author_id=:member'),
+     _today('command_author_rollups', 'command', 'guild_id=:guild AND author_id=:member')),
+    ('global total',
+     "SELECT COUNT(*) FROM commands;",
+     "SELECT COALESCE(SUM(uses), 0) FROM command_rollups;"),
+    ('global commands',
+     'SELECT command, COUNT(*) AS "uses" FROM commands GROUP BY command ORDER BY "uses" DESC LIMIT 5;',
+     'SELECT command, SUM(uses) AS "uses" FROM command_rollups GROUP BY command ORDER BY "uses" DESC LIMIT 5;'),
+    ('global guilds',
+     'SELECT guild_id, COUNT(*) AS "uses" FROM commands GROUP BY guild_id ORDER BY "uses" DESC LIMIT 5;',
+     'SELECT NULLIF(guild_id, 0) AS "guild_id", SUM(uses) AS "uses" FROM command_rollups GROUP BY guild_id ORDER BY "uses" DESC LIMIT 5;'),
+    ('global users',
+     'SELECT author_id, COUNT(*) AS "uses" FROM commands GROUP BY author_id ORDER BY "uses" DESC LIMIT 5;',
+     'SELECT author_id, SUM(uses) AS "uses" FROM command_author_rollups GROUP BY author_id ORDER BY "uses" DESC LIMIT 5;'),
+    ('today total',
+     "SELECT COUNT(*) FROM commands WHERE used > :cutoff;",
+     """SELECT (SELECT COALESCE(SUM(uses), 0) FROM command_rollups WHERE bucket >= :hour)
+             + (SELECT COUNT(*) FROM commands WHERE used > :cutoff AND used < :hour);"""),
+    ('today commands', _raw_today('command'), _today('command_rollups', 'command')),
+    ('today guilds', _raw_today('guild_id'), _today('command_rollups', 'NULLIF(guild_id, 0)')),
+    ('today users', _raw_today('author_id'), _today('command_author_rollups', 'author_id')),
+]
+
+_placeholder = re.compile(r':(cutoff|hour|guild|member)\b')
+
+def _prepare(query, values):
+    # turns the :name placeholders into $n ones in order of appearance
+    order = []
+
+    def replace(m):
+        name = m.group(1)
+        if name not in order:
+            order.append(name)
+        return '$%d' % (order.index(name) + 1)
+
+    query = _placeholder.sub(replace, query)
+    return query, [values[name] for name in order]
+
+def _comparable(records):
+    # ties in the top five can come back in either order so only compare the counts
+    return sorted(record['uses'] for record in records)
+
+async def _timed(con, query, args, repeat):
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        records = await con.fetch(query, *args)
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best, records
+
+async def main(rows, uri, repeat=3):
+    con = await asyncpg.connect(uri)
+    try:
+        print(f'generating {rows} rows...')
+        start = time.perf_counter()
+        await con.execute(SETUP)
+        await con.execute(GENERATE, rows)
+        await con.execute(INDEXES)
+        print(f'set up in {time.perf_counter() - start:.1f}s')
+
+        guild_id = await con.fetchval('SELECT guild_id FROM command_rollups WHERE guild_id <> 0 GROUP BY 1 ORDER BY SUM(uses) DESC LIMIT 1;')
+        author_id = await con.fetchval('SELECT author_id FROM command_author_rollups WHERE guild_id=$1 GROUP BY 1 ORDER BY SUM(uses) DESC LIMIT 1;', guild_id)
+        rollups = await con.fetchval('SELECT COUNT(*) FROM command_rollups;')
+        print(f'{rollups} command roll up rows, busiest guild is {guild_id}, busiest member is {author_id}')
+
+        cutoff = datetime.datetime.utcnow() - datetime.timedelta(days=1)
+        hour = cutoff.replace(minute=0, second=0, microsecond=0) + datetime.timedelta(hours=1)
+
+        print(f'best of {repeat}')
+        print(f'{"query":<22} {"raw":>10} {"rollup":>10} {"speedup":>8}')
+        values = {'cutoff': cutoff, 'hour': hour, 'guild': guild_id, 'member': author_id}
+        raw_total = rollup_total = 0.0
+        for name, raw, rollup in CASES:
+            raw_time, raw_records = await _timed(con, *_prepare(raw, values), repeat)
+            rollup_time, rollup_records = await _timed(con, *_prepare(rollup, values), repeat)
+            raw_total += raw_time
+            rollup_total += rollup_time
+
+            if 'total' in name:
+                same = tuple(raw_records[0]) == tuple(rollup_records[0])
+            else:
+                same = _comparable(raw_records) == _comparable(rollup_records)
+
+            mismatch = '' if same else '  MISMATCH'
+            print(f'{name:<22} {raw_time * 1000:8.1f}ms {rollup_time * 1000:8.1f}ms {raw_time / rollup_time:7.1f}x{mismatch}')
+
+        print(f'{"total":<22} {raw_total * 1000:8.1f}ms {rollup_total * 1000:8.1f}ms {raw_total / rollup_total:7.1f}x')
+    finally:
+        await con.execute(f'DROP SCHEMA IF EXISTS {SCHEMA} CASCADE;')
+        await con.close()
+
+if __name__ == '__main__':
+    rows = int(sys.argv[1]) if len(sys.argv) > 1 else 50000000
+    if len(sys.argv) > 2:
+        uri = sys.argv[2]
+    else:
+        import config
+        uri = config.postgresql
+
+    asyncio.get_event_loop().run_until_complete(main(rows, uri))
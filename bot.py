@@ -1,8 +1,8 @@
 from discord.ext import commands
 import discord
-from cogs.utils import checks, context, db
+from cogs.utils import checks, context, db, cache
 from cogs.utils.config import Config
-import datetime, re
+import datetime, re, time
 import json, asyncio
 import copy
 import logging
@@ -41,15 +41,46 @@ initial_extensions = (
     'cogs.dpy',
 )
 
+class PrefixMatcher:
+    """Finds which of a guild's custom prefixes a message starts with.
+
+    The prefixes are bucketed by their first character and sorted longest
+    first so a lookup is one dict access and a few ``startswith`` calls.
+    """
+
+    __slots__ = ('prefixes', '_buckets')
+
+    def __init__(self, prefixes):
+        self.prefixes = tuple(prefixes)
+        buckets = {}
+        for prefix in sorted(self.prefixes, key=len, reverse=True):
+            if prefix:
+                buckets.setdefault(prefix[0], []).append(prefix)
+        self._buckets = { key: tuple(value) for key, value in buckets.items() }
+
+    def match(self, content):
+        for prefix in self._buckets.get(content[:1], ()):
+            if content.startswith(prefix):
+                return prefix
+        return None
+
+_default_prefixes = PrefixMatcher(['?', '!'])
+
 def _prefix_callable(bot, msg):
-    user_id = bot.user.id
-    base = [f'<@!{user_id}> ', f'<@{user_id}> ']
+    content = msg.content
+    mentions = bot.mention_prefixes
+    for mention in mentions:
+        if content.startswith(mention):
+            return mention
+
     if msg.guild is None:
-        base.append('!')
-        base.append('?')
+        matcher = _default_prefixes
     else:
-        base.extend(bot.prefixes.get(msg.guild.id, ['?', '!']))
-    return base
+        matcher = bot.prefixes.get(msg.guild.id, _default_prefixes)
+
+    # when nothing matches, hand back a prefix we already know doesn't match
+    # rather than building a list for get_context to search through again
+    return matcher.match(content) or mentions[0]
 
 class RoboDanny(commands.AutoShardedBot):
     def __init__(self):
@@ -65,8 +96,11 @@ class RoboDanny(commands.AutoShardedBot):
         self.add_command(self.do)
         self._prev_events = deque(maxlen=10)
 
-        # guild_id: list
-        self.prefixes = Config('prefixes.json')
+        # command_name: number of invokes that never touched the database
+        self.commands_without_db = Counter()
+
+        # guild_id: PrefixMatcher, filled by load_prefixes
+        self.prefixes = {}
 
         for extension in initial_extensions:
             try:
@@ -88,25 +122,86 @@ class RoboDanny(commands.AutoShardedBot):
             traceback.print_tb(error.original.__traceback__)
             print(f'{error.original.__class__.__name__}: {error.original}', file=sys.stderr)
 
-    def get_guild_prefixes(self, guild, *, local_inject=_prefix_callable):
-        proxy_msg = discord.Object(id=None)
-        proxy_msg.guild = guild
-        return local_inject(self, proxy_msg)
+    @property
+    def mention_prefixes(self):
+        try:
+            return self._mention_prefixes
+        except AttributeError:
+            user_id = self.user.id
+            self._mention_prefixes = (f'<@!{user_id}> ', f'<@{user_id}> ')
+            return self._mention_prefixes
+
+    def get_guild_prefixes(self, guild):
+        base = list(self.mention_prefixes)
+        if guild is None:
+            base.extend(_default_prefixes.prefixes)
+        else:
+            base.extend(self.get_raw_guild_prefixes(guild.id))
+        return base
 
     def get_raw_guild_prefixes(self, guild_id):
-        return self.prefixes.get(guild_id, ['?', '!'])
+        return list(self.prefixes.get(guild_id, _default_prefixes).prefixes)
+
+    async def load_prefixes(self):
+        records = await self.pool.fetch('SELECT id, prefixes FROM guild_prefixes;')
+        self.prefixes = { guild_id: PrefixMatcher(prefixes) for guild_id, prefixes in records }
+        log.info('Loaded custom prefixes for %s guilds.', len(self.prefixes))
 
     async def set_guild_prefixes(self, guild, prefixes):
-        if len(prefixes) == 0:
-            await self.prefixes.put(guild.id, [])
-        elif len(prefixes) > 10:
+        if len(prefixes) > 10:
             raise RuntimeError('Cannot have more than 10 custom prefixes.')
-        else:
-            await self.prefixes.put(guild.id, sorted(set(prefixes), reverse=True))
+
+        prefixes = sorted(set(prefixes), reverse=True)
+        query = """INSERT INTO guild_prefixes (id, prefixes)
+                   VALUES ($1, $2)
+                   ON CONFLICT (id) DO UPDATE SET prefixes = EXCLUDED.prefixes;
+                """
+        await self.pool.execute(query, guild.id, prefixes)
+
+        # only swap the matcher in once the row is written so the two never disagree
+        self.prefixes[guild.id] = PrefixMatcher(prefixes)
+
+    async def warm_up_caches(self):
+        """Preloads the per-guild configuration of every cog in bulk.
+
+        A cog opts in by defining a ``__preload`` coroutine that takes a
+        connection and the list of guild IDs we're in, fills its caches and
+        returns the number of rows it loaded.
+        """
+        guild_ids = [g.id for g in self.guilds]
+        start = time.perf_counter()
+        loaded = {}
+
+        async with self.pool.acquire() as con:
+            for name, cog in list(self.cogs.items()):
+                hook = getattr(cog, f'_{cog.__class__.__name__}__preload', None)
+                if hook is None:
+                    continue
+
+                cog_start = time.perf_counter()
+                try:
+                    # cursors need a transaction to stream
+                    async with con.transaction(readonly=True):
+                        rows = await hook(con, guild_ids)
+                except Exception:
+                    log.exception('Failed to preload caches for %s.', name)
+                else:
+                    loaded[name] = rows
+                    log.info('Preloaded %s rows for %s in %.2fms.', rows, name, (time.perf_counter() - cog_start) * 1000)
+
+        elapsed = time.perf_counter() - start
+        log.info('Cache warm-up loaded %s rows for %s guilds in %.2fs.', sum(loaded.values()), len(guild_ids), elapsed)
+        self.warm_up_stats = (elapsed, loaded)
 
     async def on_ready(self):
         if not hasattr(self, 'uptime'):
             self.uptime = datetime.datetime.utcnow()
+            self.loop.create_task(self.warm_up_caches())
+
+        if not hasattr(self, 'cache_bus'):
+            # lets other processes know when we invalidate a cache entry and vice versa
+            self.cache_bus = cache.InvalidationBus(self.pool, loop=self.loop)
+            self.cache_bus.start()
 
         print(f'Ready: {self.user} (ID: {self.user.id})')
 
@@ -119,8 +214,14 @@ class RoboDanny(commands.AutoShardedBot):
         if ctx.command is None:
             return
 
-        async with ctx.acquire():
+        # ctx.db only acquires a connection if the command actually uses it
+        try:
             await self.invoke(ctx)
+        finally:
+            await ctx.release()
+
+        if not ctx.used_db:
+            self.commands_without_db[ctx.command.qualified_name] += 1
 
     async def on_message(self, message):
         if message.author.bot:
@@ -128,9 +229,27 @@ class RoboDanny(commands.AutoShardedBot):
         await self.process_commands(message)
 
     async def close(self):
+        if hasattr(self, 'cache_bus'):
+            self.cache_bus.close()
+
+        await Config.flush_all()
+        Config.close_all()
+
+        stats = self.get_cog('Stats')
+        if stats is not None:
+            try:
+                await stats.flush_commands()
+            except Exception:
+                log.exception('Could not write the buffered command usage.')
+
         await super().close()
         await self.session.close()
 
+    async def start(self, *args, **kwargs):
+        # prefixes have to be there before the first message comes in
+        await self.load_prefixes()
+        await super().start(*args, **kwargs)
+
     def run(self):
         try:
             super().run(config.token, reconnect=True)
@@ -206,7 +206,7 @@ class Admin:
                 await ctx.send(f'Unexpected error: `{e}`')
 
 
-    @commands.command(hidden=True)
+    @commands.group(hidden=True, invoke_without_command=True)
     async def sql(self, ctx, *, query: str):
         """Run some SQL."""
         # the imports are here because I imagine some people would want to use
@@ -249,6 +249,49 @@ class Admin:
         else:
             await ctx.send(fmt)
 
+    @sql.command(name='plans', hidden=True)
+    async def sql_plans(self, ctx, fingerprint: str = None):
+        """Shows the query plans captured for slow queries.
+
+        Pass a fingerprint to see the full plan.
+        """
+        from .utils.formats import TabularData
+        from .utils.querystats import stats
+
+        if fingerprint is not None:
+            plan = stats.plans.get(fingerprint)
+            if plan is None:
+                return await ctx.send('No plan captured with that fingerprint.')
+
+            kind = 'EXPLAIN (ANALYZE, BUFFERS)' if plan.analyzed else 'EXPLAIN'
+            fmt = f'```sql\n{plan.query}\n```\n{kind} after {plan.elapsed * 1000:.2f}ms at {plan.captured_at:%Y-%m-%d %H:%M} UTC\n' \
+                  f'```\n{plan.plan}\n```'
+            if len(fmt) > 2000:
+                fp = io.BytesIO(fmt.encode('utf-8'))
+                await ctx.send('Plan too long...', file=discord.File(fp, f'{fingerprint}.txt'))
+            else:
+                await ctx.send(fmt)
+            return
+
+        if not stats.plans:
+            budget = stats.explain_budget
+            if budget is None:
+                return await ctx.send('Plan capturing is disabled, set `explain_budget` in the config.')
+            return await ctx.send(f'No query has gone over the {budget * 1000:.0f}ms budget yet.')
+
+        table = TabularData()
+        table.set_columns(['Fingerprint', 'Took', 'Captured', 'Query'])
+        for plan in reversed(stats.plans.values()):
+            query = plan.query if len(plan.query) <= 50 else plan.query[:49] + '\N{HORIZONTAL ELLIPSIS}'
+            table.add_row([plan.fingerprint, f'{plan.elapsed * 1000:.0f}ms', f'{plan.captured_at:%m-%d %H:%M}', query])
+
+        fmt = f'```\n{table.render()}\n```'
+        if len(fmt) > 2000:
+            fp = io.BytesIO(fmt.encode('utf-8'))
+            await ctx.send('Too many results...', file=discord.File(fp, 'plans.txt'))
+        else:
+            await ctx.send(fmt)
+
     @commands.command(hidden=True)
     async def sudo(self, ctx, who: Union[discord.Member, discord.User], *, command: str):
         """Run a command as another user."""
@@ -4,7 +4,7 @@ import asyncio
 import discord
 import re
 import lxml.etree as etree
-from collections import Counter
+from collections import Counter, defaultdict
 
 DISCORD_API_ID    = 81384788765712384
 DISCORD_BOTS_ID   = 110373943822540800
@@ -48,6 +48,22 @@ class API:
         self.issue = re.compile(r'##(?P<number>[0-9]+)')
         self._recently_blocked = set()
 
+    async def __preload(self, connection, guild_ids):
+        # feeds aren't tied to a guild so just load the ones we can see
+        feeds = defaultdict(dict)
+        with self.get_feeds.preload() as feed_cache:
+            query = 'SELECT channel_id, name, role_id FROM feeds;'
+            async for channel_id, name, role_id in connection.cursor(query):
+                if self.bot.get_channel(channel_id) is not None:
+                    feeds[channel_id][name] = role_id
+
+            for channel_id, value in feeds.items():
+                if feed_cache.full:
+                    break
+                feed_cache.prime(value, self, channel_id)
+
+        return sum(len(v) for v in feeds.values())
+
     async def on_member_join(self, member):
         if member.guild.id != DISCORD_API_ID:
             return
@@ -220,6 +236,7 @@ class API:
     @rtfm.command()
     async def stats(self, ctx, *, member: discord.Member = None):
         """Tells you stats about the ?rtfm command."""
+        await ctx.acquire(readonly=True)
         query = 'SELECT SUM(count) AS total_uses FROM rtfm;'
         record = await ctx.db.fetchrow(query)
         total_uses = record['total_uses']
@@ -337,7 +354,7 @@ class API:
         except:
             pass
 
-    @cache.cache()
+    @cache.cache(maxsize=1024, ignore=('self', 'connection'))
     async def get_feeds(self, channel_id, *, connection=None):
         con = connection or self.bot.pool
         query = 'SELECT name, role_id FROM feeds WHERE channel_id=$1;'
@@ -53,12 +53,7 @@ class CommandConfig(db.Table, table_name='command_config'):
     name = db.Column(db.String)
     whitelist = db.Column(db.Boolean)
 
-    @classmethod
-    def create_table(cls, *, exists_ok=True):
-        statement = super().create_table(exists_ok=exists_ok)
-        # create the unique index
-        sql = "CREATE UNIQUE INDEX IF NOT EXISTS command_config_uniq_idx ON command_config (channel_id, name, whitelist);"
-        return statement + '\n' + sql
+    uniq = db.Index('channel_id', 'name', 'whitelist', unique=True)
 
 class CommandName(commands.Converter):
     async def convert(self, ctx, argument):
@@ -153,6 +148,32 @@ class Config:
     def __init__(self, bot):
         self.bot = bot
 
+    async def __preload(self, connection, guild_ids):
+        rows = 0
+
+        with self.get_plonks.preload() as plonk_cache, self.get_command_permissions.preload() as permission_cache:
+            plonks = defaultdict(set)
+            query = "SELECT guild_id, entity_id FROM plonks WHERE guild_id = ANY($1::bigint[]);"
+            async for guild_id, entity_id in connection.cursor(query, guild_ids):
+                plonks[guild_id].add(entity_id)
+                rows += 1
+
+            permissions = defaultdict(list)
+            query = "SELECT guild_id, name, channel_id, whitelist FROM command_config WHERE guild_id = ANY($1::bigint[]);"
+            async for guild_id, name, channel_id, whitelist in connection.cursor(query, guild_ids):
+                permissions[guild_id].append((name, channel_id, whitelist))
+                rows += 1
+
+            for guild_id in guild_ids:
+                if plonk_cache.full and permission_cache.full:
+                    break
+
+                plonk_cache.prime(frozenset(plonks[guild_id]), self, guild_id)
+                resolved = ResolvedCommandPermissions(guild_id, permissions[guild_id])
+                permission_cache.prime(resolved, self, guild_id)
+
+        return rows
+
     async def is_plonked(self, guild_id, member_id, *, channel_id=None, connection=None, check_bypass=True):
         if check_bypass:
             guild = self.bot.get_guild(guild_id)
@@ -161,16 +182,20 @@ class Config:
                 if member is not None and member.guild_permissions.manage_guild:
                     return False
 
+        plonks = await self.get_plonks(guild_id, connection=connection)
+        return member_id in plonks or (channel_id is not None and channel_id in plonks)
+
+    @cache.batched(maxsize=8192, strategy=cache.Strategy.lru_ttl, ttl=3600.0, ignore=('self', 'connection'))
+    async def get_plonks(self, guild_ids, *, connection=None):
         connection = connection or self.bot.pool
+        query = "SELECT guild_id, entity_id FROM plonks WHERE guild_id = ANY($1::bigint[]);"
+        records = await connection.fetch(query, guild_ids)
 
-        if channel_id is None:
-            query = "SELECT 1 FROM plonks WHERE guild_id=$1 AND entity_id=$2;"
-            row = await connection.fetchrow(query, guild_id, member_id)
-        else:
-            query = "SELECT 1 FROM plonks WHERE guild_id=$1 AND entity_id IN ($2, $3);"
-            row = await connection.fetchrow(query, guild_id, member_id, channel_id)
+        plonks = defaultdict(set)
+        for guild_id, entity_id in records:
+            plonks[guild_id].add(entity_id)
 
-        return row is not None
+        return {guild_id: frozenset(plonks[guild_id]) for guild_id in guild_ids}
 
     async def __global_check_once(self, ctx):
         if ctx.guild is None:
@@ -185,19 +210,22 @@ class Config:
         if bypass:
             return True
 
-        # check if we're plonked
-        is_plonked = await self.is_plonked(ctx.guild.id, ctx.author.id, channel_id=ctx.channel.id,
-                                                                        connection=ctx.db, check_bypass=False)
+        # check if we're plonked, this goes through the batched lookup rather than ctx.db
+        is_plonked = await self.is_plonked(ctx.guild.id, ctx.author.id, channel_id=ctx.channel.id, check_bypass=False)
 
         return not is_plonked
 
-    @cache.cache(strategy=cache.Strategy.raw)
-    async def get_command_permissions(self, guild_id, *, connection=None):
+    @cache.batched(maxsize=8192, strategy=cache.Strategy.lru_ttl, ttl=3600.0, ignore=('self', 'connection'))
+    async def get_command_permissions(self, guild_ids, *, connection=None):
         connection = connection or self.bot.pool
-        query = "SELECT name, channel_id, whitelist FROM command_config WHERE guild_id=$1;"
+        query = "SELECT guild_id, name, channel_id, whitelist FROM command_config WHERE guild_id = ANY($1::bigint[]);"
+        records = await connection.fetch(query, guild_ids)
 
-        records = await connection.fetch(query, guild_id)
-        return ResolvedCommandPermissions(guild_id, records)
+        grouped = defaultdict(list)
+        for guild_id, name, channel_id, whitelist in records:
+            grouped[guild_id].append((name, channel_id, whitelist))
+
+        return {guild_id: ResolvedCommandPermissions(guild_id, grouped[guild_id]) for guild_id in guild_ids}
 
     async def __global_check(self, ctx):
         if ctx.guild is None:
@@ -207,7 +235,7 @@ class Config:
         if is_owner:
             return True
 
-        resolved = await self.get_command_permissions(ctx.guild.id, connection=ctx.db)
+        resolved = await self.get_command_permissions(ctx.guild.id)
         return not resolved.is_blocked(ctx)
 
     async def _bulk_ignore_entries(self, ctx, entries):
@@ -223,6 +251,8 @@ class Config:
             # do a bulk COPY
             await ctx.db.copy_records_to_table('plonks', columns=('guild_id', 'entity_id'), records=to_insert)
 
+        self.get_plonks.invalidate(self, ctx.guild.id)
+
     async def __error(self, ctx, error):
         if isinstance(error, commands.BadArgument):
             await ctx.send(error)
@@ -250,6 +280,7 @@ class Config:
             # shortcut for a single insert
             query = "INSERT INTO plonks (guild_id, entity_id) VALUES ($1, $2) ON CONFLICT DO NOTHING;"
             await ctx.db.execute(query, ctx.guild.id, ctx.channel.id)
+            self.get_plonks.invalidate(self, ctx.guild.id)
         else:
             await self._bulk_ignore_entries(ctx, entities)
 
@@ -305,6 +336,7 @@ class Config:
 
         query = "DELETE FROM plonks WHERE guild_id=$1;"
         await ctx.db.execute(query, ctx.guild.id)
+        self.get_plonks.invalidate(self, ctx.guild.id)
         await ctx.send('Successfully cleared all ignores.')
 
     @config.group(pass_context=True, invoke_without_command=True, aliases=['unplonk'])
@@ -325,6 +357,7 @@ class Config:
             entities = [c.id for c in entities]
             await ctx.db.execute(query, ctx.guild.id, entities)
 
+        self.get_plonks.invalidate(self, ctx.guild.id)
         await ctx.send(ctx.tick(True))
 
     @unignore.command(name='all')
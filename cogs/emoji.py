@@ -63,13 +63,7 @@ class EmojiStats(db.Table, table_name='emoji_stats'):
     emoji_id = db.Column(db.Integer(big=True), index=True)
     total = db.Column(db.Integer, default=0)
 
-    @classmethod
-    def create_table(cls, *, exists_ok=True):
-        statement = super().create_table(exists_ok=exists_ok)
-
-        # create the indexes
-        sql = "CREATE UNIQUE INDEX IF NOT EXISTS emoji_stats_uniq_idx ON emoji_stats (guild_id, emoji_id);"
-        return statement + '\n' + sql
+    uniq = db.Index('guild_id', 'emoji_id', unique=True)
 
 class Emoji:
     """Custom emoji tracking"""
@@ -90,21 +84,15 @@ class Emoji:
     async def bulk_insert(self):
         try:
             while not self.bot.is_closed():
-                query = """INSERT INTO emoji_stats (guild_id, emoji_id, total)
-                           SELECT x.guild, x.emoji, x.added
-                           FROM jsonb_to_recordset($1::jsonb) AS x(guild BIGINT, emoji BIGINT, added INT)
-                           ON CONFLICT (guild_id, emoji_id) DO UPDATE
-                           SET total = emoji_stats.total + excluded.total;
-                        """
-
                 async with self._batch_lock:
-                    transformed = [
-                        {'guild': guild_id, 'emoji': emoji_id, 'added': count}
+                    records = [
+                        {'guild_id': guild_id, 'emoji_id': emoji_id, 'total': count}
                         for guild_id, data in self._batch_of_data.items()
                         for emoji_id, count in data.items()
                     ]
                     self._batch_of_data.clear()
-                    await self.bot.pool.execute(query, transformed)
+                    await EmojiStats.upsert_many(records, conflict=('guild_id', 'emoji_id'),
+                                                 update={'total': 'emoji_stats.total + EXCLUDED.total'})
                 await asyncio.sleep(60)
         except asyncio.CancelledError:
             pass
@@ -220,6 +208,7 @@ class Emoji:
     @commands.group(hidden=True, invoke_without_command=True)
     async def blobstats(self, ctx, *, emoji: BlobEmoji = None):
         """Usage statistics of blobs."""
+        await ctx.acquire(readonly=True)
         if emoji is None:
             await self.get_all_blob_stats(ctx)
         else:
@@ -1,5 +1,5 @@
 from discord.ext import commands
-from .utils import checks, formats
+from .utils import checks, formats, db
 from .utils.paginator import HelpPaginator, CannotPaginate
 import discord
 from collections import OrderedDict, deque, Counter
@@ -9,6 +9,13 @@ import copy
 import unicodedata
 import inspect
 
+class Prefixes(db.Table, table_name='guild_prefixes'):
+    # the guild_id
+    id = db.Column(db.Integer(big=True), primary_key=True)
+
+    # an empty array means only the mention prefixes
+    prefixes = db.Column(db.Array(db.String), nullable=False)
+
 class Prefix(commands.Converter):
     async def convert(self, ctx, argument):
         user_id = ctx.bot.user.id
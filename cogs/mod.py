@@ -128,14 +128,27 @@ class Mod:
             elif isinstance(original, discord.HTTPException):
                 await ctx.send('Somehow, an unexpected error occurred. Try again later?')
 
-    @cache.cache()
-    async def get_guild_config(self, guild_id):
-        query = """SELECT * FROM guild_mod_config WHERE id=$1;"""
-        async with self.bot.pool.acquire() as con:
-            record = await con.fetchrow(query, guild_id)
-            if record is not None:
-                return await ModConfig.from_record(record, self.bot)
-            return None
+    async def __preload(self, connection, guild_ids):
+        query = """SELECT * FROM guild_mod_config WHERE id = ANY($1::bigint[]);"""
+        configs = {}
+        with self.get_guild_config.preload() as config_cache:
+            async for record in connection.cursor(query, guild_ids):
+                configs[record['id']] = await ModConfig.from_record(record, self.bot)
+
+            for guild_id in guild_ids:
+                if config_cache.full:
+                    break
+                config_cache.prime(configs.get(guild_id), self, guild_id)
+
+        return len(configs)
+
+    @cache.batched(maxsize=8192, strategy=cache.Strategy.lru_ttl, ttl=3600.0, ignore=('self', 'connection'))
+    async def get_guild_config(self, guild_ids, *, connection=None):
+        connection = connection or self.bot.pool
+        query = """SELECT * FROM guild_mod_config WHERE id = ANY($1::bigint[]);"""
+        records = await connection.fetch(query, guild_ids)
+        # guilds without a record resolve to None
+        return {r['id']: await ModConfig.from_record(r, self.bot) for r in records}
 
     async def check_raid(self, config, guild, member, timestamp):
         if config.raid_mode != RaidMode.strict.value:
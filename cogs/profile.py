@@ -427,6 +427,7 @@ class Profile:
     async def stats(self, ctx):
         """Retrieves some statistics on the profile database."""
 
+        await ctx.acquire(readonly=True)
         query = "SELECT COUNT(*) FROM profiles;"
 
         total = await ctx.db.fetchrow(query)
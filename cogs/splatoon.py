@@ -579,8 +579,8 @@ class Splatoon:
     def __init__(self, bot):
         self.bot = bot
         self.splat1_data = config.Config('splatoon.json', loop=bot.loop)
-        self.splat2_data = config.Config('splatoon2.json', loop=bot.loop,
-                                         object_hook=splatoon2_decoder, encoder=Splatoon2Encoder)
+        self.splat2_data = config.Config('splatoon2.json', loop=bot.loop, flush_interval=60.0,
+                                         backend='journal', object_hook=splatoon2_decoder, encoder=Splatoon2Encoder)
         self.map_data = []
         self.map_updater = bot.loop.create_task(self.update_maps())
 
@@ -598,6 +598,7 @@ class Splatoon:
         self.map_updater.cancel()
         self._splatnet2.cancel()
         self._authenticator.cancel()
+        self.splat2_data.close()
 
     async def __error(self, ctx, error):
         if isinstance(error, commands.BadArgument):
@@ -840,6 +841,7 @@ class Splatoon:
                 if not merch:
                     return 300.0
 
+                changed = set()
                 for elem in merch:
                     try:
                         value = Merchandise(elem)
@@ -853,9 +855,13 @@ class Splatoon:
                         for gear in kind:
                             if gear.name == value.gear.name:
                                 gear.image = value.gear.image
+                                changed.add(value.gear.kind)
                                 break
 
-                await self.splat2_data.save()
+                # only journal the kinds of gear that actually changed
+                for kind in changed:
+                    await self.splat2_data.put(kind, self.splat2_data.get(kind))
+
                 self.sp2_shop.sort(key=lambda m: m.end_time)
                 now = datetime.datetime.utcnow()
                 try:
@@ -958,7 +964,8 @@ class Splatoon:
                     for value in data.values():
                         old.append(value)
 
-                await self.splat2_data.save()
+                    await self.splat2_data.put(kind, old)
+
                 return 3600.0 # redo in an hour
         except Exception as e:
             await self.bot.get_cog('Stats').log_error(extra=f'Splatnet Stat Error')
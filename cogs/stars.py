@@ -27,7 +27,7 @@ def requires_starboard():
 
         cog = ctx.bot.get_cog('Stars')
 
-        ctx.starboard = await cog.get_starboard(ctx.guild.id, connection=ctx.db)
+        ctx.starboard = await cog.get_starboard(ctx.guild.id)
         if ctx.starboard.channel is None:
             raise StarError('\N{WARNING SIGN} Starboard channel not found.')
 
@@ -56,17 +56,96 @@ class StarboardEntry(db.Table, table_name='starboard_entries'):
     channel_id = db.Column(db.Integer(big=True))
     author_id = db.Column(db.Integer(big=True))
     guild_id = db.Column(db.ForeignKey('starboard', 'id', sql_type=db.Integer(big=True)), index=True, nullable=False)
+    stars = db.Column(db.Integer, default=0, nullable=False,
+                      backfill='(SELECT COUNT(*) FROM starrers WHERE starrers.entry_id = starboard_entries.id)')
+
+    # for the top starred posts of a guild and of a member
+    top = db.Index('guild_id', 'stars', where='bot_message_id IS NOT NULL')
+    author_top = db.Index('guild_id', 'author_id', 'stars')
 
 class Starrers(db.Table):
     id = db.PrimaryKeyColumn()
     author_id = db.Column(db.Integer(big=True), nullable=False)
     entry_id = db.Column(db.ForeignKey('starboard_entries', 'id'), index=True, nullable=False)
 
-    @classmethod
-    def create_table(cls, *, exists_ok=True):
-        statement = super().create_table(exists_ok=exists_ok)
-        sql = "CREATE UNIQUE INDEX IF NOT EXISTS starrers_uniq_idx ON starrers (author_id, entry_id);"
-        return statement + '\n' + sql
+    uniq = db.Index('author_id', 'entry_id', unique=True)
+
+class StarGivers(db.Table, table_name='star_givers'):
+    id = db.PrimaryKeyColumn()
+    guild_id = db.Column(db.ForeignKey('starboard', 'id', sql_type=db.Integer(big=True)), nullable=False)
+    author_id = db.Column(db.Integer(big=True), nullable=False)
+    stars = db.Column(db.Integer, default=0, nullable=False)
+
+    uniq = db.Index('guild_id', 'author_id', unique=True)
+    top = db.Index('guild_id', 'stars')
+
+class StarReceivers(db.Table, table_name='star_receivers'):
+    id = db.PrimaryKeyColumn()
+    guild_id = db.Column(db.ForeignKey('starboard', 'id', sql_type=db.Integer(big=True)), nullable=False)
+    author_id = db.Column(db.Integer(big=True), nullable=False)
+    stars = db.Column(db.Integer, default=0, nullable=False)
+
+    uniq = db.Index('guild_id', 'author_id', unique=True)
+    top = db.Index('guild_id', 'stars')
+
+def _delete_entries(condition):
+    # deleting an entry cascades to its starrers so their stars
+    # have to come off the leaderboards in the same statement
+    return f"""WITH deleted AS (
+                   DELETE FROM starboard_entries WHERE {condition}
+                   RETURNING id, guild_id, author_id, stars, bot_message_id
+               ), given AS (
+                   UPDATE star_givers
+                   SET stars = star_givers.stars - counted.stars
+                   FROM (
+                       SELECT deleted.guild_id, starrers.author_id, COUNT(*) AS stars
+                       FROM starrers
+                       INNER JOIN deleted
+                       ON deleted.id = starrers.entry_id
+                       GROUP BY deleted.guild_id, starrers.author_id
+                   ) AS counted
+                   WHERE star_givers.guild_id = counted.guild_id
+                   AND   star_givers.author_id = counted.author_id
+               ), received AS (
+                   UPDATE star_receivers
+                   SET stars = star_receivers.stars - counted.stars
+                   FROM (
+                       SELECT guild_id, author_id, SUM(stars) AS stars
+                       FROM deleted
+                       WHERE author_id IS NOT NULL
+                       GROUP BY guild_id, author_id
+                   ) AS counted
+                   WHERE star_receivers.guild_id = counted.guild_id
+                   AND   star_receivers.author_id = counted.author_id
+               )
+               SELECT bot_message_id FROM deleted;
+            """
+
+class _PendingEdit:
+    __slots__ = ('message', 'content', 'embed', 'dirty', 'task')
+
+    def __init__(self, message, content, embed):
+        self.message = message
+        self.content = content
+        self.embed = embed
+        self.dirty = True
+        self.task = None
+
+class _LockStats:
+    __slots__ = ('acquired', 'contended', 'total_wait', 'max_wait')
+
+    def __init__(self):
+        self.acquired = 0
+        self.contended = 0
+        self.total_wait = 0.0
+        self.max_wait = 0.0
+
+    def record(self, waited, contended):
+        self.acquired += 1
+        if contended:
+            self.contended += 1
+            self.total_wait += waited
+            self.max_wait = max(self.max_wait, waited)
 
 class StarboardConfig:
     __slots__ = ('bot', 'id', 'channel_id', 'threshold', 'locked', 'needs_migration', 'max_age')
@@ -108,35 +187,152 @@ class Stars:
         self.bot = bot
 
         # cache message objects to save Discord some HTTP requests.
-        self._message_cache = {}
-        self._cleaner = self.bot.loop.create_task(self.clean_message_cache())
+        # new messages are put in as they're sent since that's when they get starred
+        self._message_cache = cache.ExpiringCache(10000, 3600.0, lru=True)
+        self._message_hits = 0
+        self._message_misses = 0
+
+        # the guilds with a starboard channel as of the last time their config was
+        # loaded, so on_message doesn't have to look up the config of every guild
+        self._starboard_guilds = set()
 
         # if it's in this set,
         self._about_to_be_deleted = set()
 
+        # message_id: asyncio.Lock
+        # keyed by the original message so reactions on the starboard copy share it
         self._locks = weakref.WeakValueDictionary()
+        self.lock_stats = _LockStats()
+
+        # bot_message_id: _PendingEdit
+        # only the latest content is kept and it's sent at most once per window
+        self._pending_edits = {}
+        self.edit_window = getattr(bot.config, 'starboard_edit_window', 5.0)
 
     def __unload(self):
-        self._cleaner.cancel()
+        self._message_cache.clear()
+
+        # the reloaded cog edits the message again on the next star
+        for pending in self._pending_edits.values():
+            pending.task.cancel()
+        self._pending_edits.clear()
+
+    async def __preload(self, connection, guild_ids):
+        query = "SELECT * FROM starboard WHERE id = ANY($1::bigint[]);"
+        records = {}
+        with self.get_starboard.preload() as starboard_cache:
+            async for record in connection.cursor(query, guild_ids):
+                records[record['id']] = record
+
+            for guild_id in guild_ids:
+                config = StarboardConfig(guild_id=guild_id, bot=self.bot, record=records.get(guild_id))
+                self._track_starboard(config)
+                starboard_cache.prime(config, self, guild_id)
+
+        return len(records)
 
     async def __error(self, ctx, error):
         if isinstance(error, StarError):
             await ctx.send(error)
 
-    async def clean_message_cache(self):
+    def schedule_edit(self, message, content, embed):
+        """Edits a starboard message without hammering the rate limit.
+
+        The first edit goes out right away. Any edits requested within
+        :attr:`edit_window` seconds after it are merged into a single edit
+        with the latest content.
+        """
+        pending = self._pending_edits.get(message.id)
+        if pending is not None:
+            pending.message = message
+            pending.content = content
+            pending.embed = embed
+            pending.dirty = True
+            return
+
+        pending = self._pending_edits[message.id] = _PendingEdit(message, content, embed)
+        pending.task = self.bot.loop.create_task(self._run_edits(pending))
+
+    def cancel_edit(self, message_id):
+        """Drops any pending edit, this must be called before deleting a starboard message."""
+        pending = self._pending_edits.pop(message_id, None)
+        if pending is not None:
+            pending.task.cancel()
+
+    async def _run_edits(self, pending):
+        message_id = pending.message.id
         try:
-            while not self.bot.is_closed():
-                self._message_cache.clear()
-                await asyncio.sleep(3600)
+            while pending.dirty:
+                pending.dirty = False
+                try:
+                    await pending.message.edit(content=pending.content, embed=pending.embed)
+                except discord.NotFound:
+                    break
+                except discord.HTTPException:
+                    log.exception('Could not edit starboard message %s.', message_id)
+
+                await asyncio.sleep(self.edit_window)
         except asyncio.CancelledError:
             pass
+        finally:
+            if self._pending_edits.get(message_id) is pending:
+                del self._pending_edits[message_id]
 
-    @cache.cache(strategy=cache.Strategy.raw)
-    async def get_starboard(self, guild_id, *, connection=None):
+    def message_cache_stats(self):
+        c = self._message_cache
+        return cache.CacheStats(self._message_hits, self._message_misses, 0, c.evictions,
+                                c.expirations, len(c), c.maxsize)
+
+    @cache.batched(maxsize=8192, strategy=cache.Strategy.lru_ttl, ttl=3600.0, ignore=('self', 'connection'))
+    async def get_starboard(self, guild_ids, *, connection=None):
         connection = connection or self.bot.pool
-        query = "SELECT * FROM starboard WHERE id=$1;"
-        record = await connection.fetchrow(query, guild_id)
-        return StarboardConfig(guild_id=guild_id, bot=self.bot, record=record)
+        query = "SELECT * FROM starboard WHERE id = ANY($1::bigint[]);"
+        records = await connection.fetch(query, guild_ids)
+        records = {r['id']: r for r in records}
+        configs = {}
+        for guild_id in guild_ids:
+            config = configs[guild_id] = StarboardConfig(guild_id=guild_id, bot=self.bot, record=records.get(guild_id))
+            self._track_starboard(config)
+        return configs
+
+    def _track_starboard(self, config):
+        if config.channel_id is None:
+            self._starboard_guilds.discard(config.id)
+        else:
+            self._starboard_guilds.add(config.id)
+
+    async def rebuild_leaderboards(self, *, connection, guild_id=None):
+        """Recounts the star leaderboards of a guild, or every guild if ``None``.
+
+        This has to be called inside a transaction.
+        """
+
+        # keeps stars and unstars out until we're done so nothing is counted twice
+        await connection.execute('LOCK TABLE star_givers, star_receivers IN EXCLUSIVE MODE;')
+
+        query = "DELETE FROM star_givers WHERE $1::bigint IS NULL OR guild_id=$1;"
+        await connection.execute(query, guild_id)
+        query = "DELETE FROM star_receivers WHERE $1::bigint IS NULL OR guild_id=$1;"
+        await connection.execute(query, guild_id)
+
+        query = """INSERT INTO star_givers (guild_id, author_id, stars)
+                   SELECT entry.guild_id, starrers.author_id, COUNT(*)
+                   FROM starrers
+                   INNER JOIN starboard_entries entry
+                   ON entry.id = starrers.entry_id
+                   WHERE $1::bigint IS NULL OR entry.guild_id=$1
+                   GROUP BY entry.guild_id, starrers.author_id;
+                """
+        await connection.execute(query, guild_id)
+
+        query = """INSERT INTO star_receivers (guild_id, author_id, stars)
+                   SELECT guild_id, author_id, SUM(stars)
+                   FROM starboard_entries
+                   WHERE author_id IS NOT NULL
+                   AND   ($1::bigint IS NULL OR guild_id=$1)
+                   GROUP BY guild_id, author_id;
+                """
+        await connection.execute(query, guild_id)
 
     def star_emoji(self, stars):
         if 5 > stars >= 0:
@@ -194,8 +390,9 @@ class Stars:
 
     async def get_message(self, channel, message_id):
         try:
-            return self._message_cache[message_id]
+            msg = self._message_cache[message_id]
         except KeyError:
+            self._message_misses += 1
             try:
                 o = discord.Object(id=message_id + 1)
                 pred = lambda m: m.id == message_id
@@ -209,6 +406,9 @@ class Stars:
                 return msg
             except Exception:
                 return None
+        else:
+            self._message_hits += 1
+            return msg
 
     async def reaction_action(self, fmt, payload):
         if str(payload.emoji) != '\N{WHITE MEDIUM STAR}':
@@ -227,7 +427,7 @@ class Stars:
         async with self.bot.pool.acquire() as con:
             config = self.bot.get_cog('Config')
             if config:
-                plonked = await config.is_plonked(channel.guild.id, payload.user_id, channel_id=payload.channel_id, connection=con)
+                plonked = await config.is_plonked(channel.guild.id, payload.user_id, channel_id=payload.channel_id)
                 if plonked:
                     return
 
@@ -249,6 +449,24 @@ class Stars:
             query = "DELETE FROM starboard WHERE id=$1;"
             await con.execute(query, channel.guild.id)
 
+        self._starboard_guilds.discard(channel.guild.id)
+
+    async def on_message(self, message):
+        if message.guild is None or message.guild.id not in self._starboard_guilds:
+            return
+
+        starboard = await self.get_starboard(message.guild.id)
+        if starboard.channel is None or starboard.locked or starboard.channel.id == message.channel.id:
+            return
+
+        self._message_cache[message.id] = message
+
+    async def on_raw_message_edit(self, payload):
+        msg = self._message_cache.get(payload.message_id)
+        if msg is not None:
+            # same as what the library does for its own message cache
+            msg._update(msg.channel, payload.data)
+
     async def on_raw_reaction_add(self, payload):
         await self.reaction_action('star', payload)
 
@@ -256,6 +474,12 @@ class Stars:
         await self.reaction_action('unstar', payload)
 
     async def on_raw_message_delete(self, payload):
+        self.cancel_edit(payload.message_id)
+        try:
+            del self._message_cache[payload.message_id]
+        except KeyError:
+            pass
+
         if payload.message_id in self._about_to_be_deleted:
             # we triggered this deletion ourselves and
             # we don't need to drop it from the database
@@ -269,10 +493,17 @@ class Stars:
         # at this point a message got deleted in the starboard
         # so just delete it from the database
         async with self.bot.pool.acquire() as con:
-            query = "DELETE FROM starboard_entries WHERE bot_message_id=$1;"
+            query = _delete_entries('bot_message_id=$1')
             await con.execute(query, payload.message_id)
 
     async def on_raw_bulk_message_delete(self, payload):
+        for message_id in payload.message_ids:
+            self.cancel_edit(message_id)
+            try:
+                del self._message_cache[message_id]
+            except KeyError:
+                pass
+
         if payload.message_ids <= self._about_to_be_deleted:
             # see comment above
             self._about_to_be_deleted.difference_update(payload.message_ids)
@@ -283,7 +514,7 @@ class Stars:
             return
 
         async with self.bot.pool.acquire() as con:
-            query = "DELETE FROM starboard_entries WHERE bot_message_id=ANY($1::bigint[]);"
+            query = _delete_entries('bot_message_id=ANY($1::bigint[])')
             await con.execute(query, list(payload.message_ids))
 
     async def on_raw_reaction_clear(self, payload):
@@ -292,11 +523,11 @@ class Stars:
             return
 
         async with self.bot.pool.acquire() as con:
-            starboard = await self.get_starboard(channel.guild.id, connection=con)
+            starboard = await self.get_starboard(channel.guild.id)
             if starboard.channel is None:
                 return
 
-            query = "DELETE FROM starboard_entries WHERE message_id=$1 RETURNING bot_message_id;"
+            query = _delete_entries('message_id=$1')
             bot_message_id = await con.fetchrow(query, payload.message_id)
 
             if bot_message_id is None:
@@ -304,18 +535,54 @@ class Stars:
 
 
             bot_message_id = bot_message_id[0]
+            self.cancel_edit(bot_message_id)
             msg = await self.get_message(starboard.channel, bot_message_id)
             if msg is not None:
                 await msg.delete()
 
-    async def star_message(self, channel, message_id, starrer_id, *, connection):
-        guild_id = channel.guild.id
-        lock = self._locks.get(guild_id)
+    async def resolve_target(self, channel, message_id, *, connection):
+        """Maps a message on the starboard back to the message it's a copy of.
+
+        Anything that isn't in the starboard channel is returned as-is.
+        """
+
+        starboard = await self.get_starboard(channel.guild.id)
+        if starboard.channel is None or channel.id != starboard.channel.id:
+            return channel, message_id
+
+        # special case redirection code goes here
+        # ergo, when we add a reaction from starboard we want it to star
+        # the original message
+
+        query = "SELECT channel_id, message_id FROM starboard_entries WHERE bot_message_id=$1;"
+        record = await connection.fetchrow(query, message_id)
+        if record is None:
+            raise StarError('Could not find message in the starboard.')
+
+        ch = channel.guild.get_channel(record['channel_id'])
+        if ch is None:
+            raise StarError('Could not find original channel.')
+
+        return ch, record['message_id']
+
+    async def acquire_lock(self, message_id):
+        lock = self._locks.get(message_id)
         if lock is None:
-            self._locks[guild_id] = lock = asyncio.Lock(loop=self.bot.loop)
+            self._locks[message_id] = lock = asyncio.Lock(loop=self.bot.loop)
+
+        contended = lock.locked()
+        start = time.perf_counter()
+        await lock.acquire()
+        self.lock_stats.record(time.perf_counter() - start, contended)
+        return lock
 
-        async with lock:
+    async def star_message(self, channel, message_id, starrer_id, *, connection):
+        channel, message_id = await self.resolve_target(channel, message_id, connection=connection)
+        lock = await self.acquire_lock(message_id)
+        try:
             await self._star_message(channel, message_id, starrer_id, connection=connection)
+        finally:
+            lock.release()
 
     async def _star_message(self, channel, message_id, starrer_id, *, connection):
         """Stars a message.
@@ -340,22 +607,6 @@ class Stars:
         if starboard.locked:
             raise StarError('\N{NO ENTRY SIGN} Starboard is locked.')
 
-        if channel.id == starboard.channel.id:
-            # special case redirection code goes here
-            # ergo, when we add a reaction from starboard we want it to star
-            # the original message
-
-            query = "SELECT channel_id, message_id FROM starboard_entries WHERE bot_message_id=$1;"
-            record = await connection.fetchrow(query, message_id)
-            if record is None:
-                raise StarError('Could not find message in the starboard.')
-
-            ch = channel.guild.get_channel(record['channel_id'])
-            if ch is None:
-                raise StarError('Could not find original channel.')
-
-            return await self._star_message(ch, record['message_id'], starrer_id, connection=connection)
-
         msg = await self.get_message(channel, message_id)
 
         if msg is None:
@@ -371,25 +622,27 @@ class Stars:
         if msg.created_at < oldest_allowed:
             raise StarError('\N{NO ENTRY SIGN} This message is too old.')
 
-        # check if this is freshly starred
-        # originally this was a single query but it seems
-        # WHERE ... = (SELECT ... in some_cte) is bugged
-        # so I'm going to do two queries instead
-        query = """WITH to_insert AS (
-                       INSERT INTO starboard_entries AS entries (message_id, channel_id, guild_id, author_id)
-                       VALUES ($1, $2, $3, $4)
-                       ON CONFLICT (message_id) DO NOTHING
-                       RETURNING entries.id
+        # this creates the entry or bumps its star count, adds the starrer and
+        # bumps the leaderboards in one go. if they already starred it then the
+        # whole statement fails so none of the counts are touched
+        query = """WITH entry AS (
+                       INSERT INTO starboard_entries AS entries (message_id, channel_id, guild_id, author_id, stars)
+                       VALUES ($1, $2, $3, $4, 1)
+                       ON CONFLICT (message_id) DO UPDATE SET stars = entries.stars + 1
+                       RETURNING entries.id, entries.stars, entries.bot_message_id, entries.author_id
+                   ), starrer AS (
+                       INSERT INTO starrers (author_id, entry_id)
+                       SELECT $5, id FROM entry
+                   ), given AS (
+                       INSERT INTO star_givers (guild_id, author_id, stars)
+                       VALUES ($3, $5, 1)
+                       ON CONFLICT (guild_id, author_id) DO UPDATE SET stars = star_givers.stars + 1
+                   ), received AS (
+                       INSERT INTO star_receivers (guild_id, author_id, stars)
+                       SELECT $3, author_id, 1 FROM entry WHERE author_id IS NOT NULL
+                       ON CONFLICT (guild_id, author_id) DO UPDATE SET stars = star_receivers.stars + 1
                    )
-                   INSERT INTO starrers (author_id, entry_id)
-                   SELECT $5, entry.id
-                   FROM (
-                       SELECT id FROM to_insert
-                       UNION ALL
-                       SELECT id FROM starboard_entries WHERE message_id=$1
-                       LIMIT 1
-                   ) AS entry
-                   RETURNING entry_id;
+                   SELECT id, stars, bot_message_id FROM entry;
                 """
 
         try:
@@ -397,12 +650,7 @@ class Stars:
         except asyncpg.UniqueViolationError:
             raise StarError('\N{NO ENTRY SIGN} You already starred this message.')
 
-        entry_id = record[0]
-
-        query = "SELECT COUNT(*) FROM starrers WHERE entry_id=$1;"
-        record = await connection.fetchrow(query, entry_id)
-
-        count = record[0]
+        entry_id, count, bot_message_id = record
         if count < starboard.threshold:
             return
 
@@ -410,32 +658,26 @@ class Stars:
         # with our star info
         content, embed = self.get_emoji_message(msg, count)
 
-        # get the message ID to edit:
-        query = "SELECT bot_message_id FROM starboard_entries WHERE message_id=$1;"
-        record = await connection.fetchrow(query, message_id)
-        bot_message_id = record[0]
-
         if bot_message_id is None:
             new_msg = await starboard.channel.send(content, embed=embed)
-            query = "UPDATE starboard_entries SET bot_message_id=$1 WHERE message_id=$2;"
-            await connection.execute(query, new_msg.id, message_id)
+            query = "UPDATE starboard_entries SET bot_message_id=$1 WHERE id=$2;"
+            await connection.execute(query, new_msg.id, entry_id)
         else:
             new_msg = await self.get_message(starboard.channel, bot_message_id)
             if new_msg is None:
                 # deleted? might as well purge the data
-                query = "DELETE FROM starboard_entries WHERE message_id=$1;"
-                await connection.execute(query, message_id)
+                query = _delete_entries('id=$1')
+                await connection.execute(query, entry_id)
             else:
-                await new_msg.edit(content=content, embed=embed)
+                self.schedule_edit(new_msg, content, embed)
 
     async def unstar_message(self, channel, message_id, starrer_id, *, connection):
-        guild_id = channel.guild.id
-        lock = self._locks.get(guild_id)
-        if lock is None:
-            self._locks[guild_id] = lock = asyncio.Lock(loop=self.bot.loop)
-
-        async with lock:
+        channel, message_id = await self.resolve_target(channel, message_id, connection=connection)
+        lock = await self.acquire_lock(message_id)
+        try:
             await self._unstar_message(channel, message_id, starrer_id, connection=connection)
+        finally:
+            lock.release()
 
     async def _unstar_message(self, channel, message_id, starrer_id, *, connection):
         """Unstars a message.
@@ -460,35 +702,40 @@ class Stars:
         if starboard.locked:
             raise StarError('\N{NO ENTRY SIGN} Starboard is locked.')
 
-        if channel.id == starboard.channel.id:
-            query = "SELECT channel_id, message_id FROM starboard_entries WHERE bot_message_id=$1;"
-            record = await connection.fetchrow(query, message_id)
-            if record is None:
-                raise StarError('Could not find message in the starboard.')
-
-            ch = channel.guild.get_channel(record['channel_id'])
-            if ch is None:
-                raise StarError('Could not find original channel.')
-
-            return await self._unstar_message(ch, record['message_id'], starrer_id, connection=connection)
-
-        query = """DELETE FROM starrers USING starboard_entries entry
-                   WHERE entry.message_id=$1
-                   AND   entry.id=starrers.entry_id
-                   AND   starrers.author_id=$2
-                   RETURNING starrers.entry_id, entry.bot_message_id
+        query = """WITH starrer AS (
+                       DELETE FROM starrers USING starboard_entries entry
+                       WHERE entry.message_id=$1
+                       AND   entry.id=starrers.entry_id
+                       AND   starrers.author_id=$2
+                       RETURNING starrers.entry_id
+                   ), entry AS (
+                       UPDATE starboard_entries
+                       SET stars = starboard_entries.stars - 1
+                       FROM starrer
+                       WHERE starboard_entries.id = starrer.entry_id
+                       RETURNING starboard_entries.id, starboard_entries.stars, starboard_entries.bot_message_id,
+                                 starboard_entries.guild_id, starboard_entries.author_id
+                   ), given AS (
+                       UPDATE star_givers
+                       SET stars = star_givers.stars - 1
+                       FROM entry
+                       WHERE star_givers.guild_id = entry.guild_id
+                       AND   star_givers.author_id = $2
+                   ), received AS (
+                       UPDATE star_receivers
+                       SET stars = star_receivers.stars - 1
+                       FROM entry
+                       WHERE star_receivers.guild_id = entry.guild_id
+                       AND   star_receivers.author_id = entry.author_id
+                   )
+                   SELECT id, stars, bot_message_id FROM entry;
                 """
 
         record = await connection.fetchrow(query, message_id, starrer_id)
         if record is None:
             raise StarError('\N{NO ENTRY SIGN} You have not starred this message.')
 
-        entry_id = record[0]
-        bot_message_id = record[1]
-
-        query = "SELECT COUNT(*) FROM starrers WHERE entry_id=$1;"
-        count = await connection.fetchrow(query, entry_id)
-        count = count[0]
+        entry_id, count, bot_message_id = record
 
         if count == 0:
             # delete the entry if we have no more stars
@@ -509,6 +756,7 @@ class Stars:
                 query = "UPDATE starboard_entries SET bot_message_id=NULL WHERE id=$1;"
                 await connection.execute(query, entry_id)
 
+            self.cancel_edit(bot_message_id)
             await bot_message.delete()
         else:
             msg = await self.get_message(channel, message_id)
@@ -516,7 +764,7 @@ class Stars:
                 raise StarError('\N{BLACK QUESTION MARK ORNAMENT} This message could not be found.')
 
             content, embed = self.get_emoji_message(msg, count)
-            await bot_message.edit(content=content, embed=embed)
+            self.schedule_edit(bot_message, content, embed)
 
     @commands.command()
     @checks.is_mod()
@@ -579,6 +827,7 @@ class Stars:
             await ctx.send('Could not create the channel due to an internal error. Join the bot support server for help.')
         else:
             self.get_starboard.invalidate(self, ctx.guild.id)
+            self._starboard_guilds.add(ctx.guild.id)
             await ctx.send(f'\N{GLOWING STAR} Starboard created at {channel.mention}.')
 
     @commands.group(invoke_without_command=True, ignore_extra=False)
@@ -637,20 +886,7 @@ class Stars:
 
         last_messages = await channel.history(limit=100).map(lambda m: m.id).flatten()
 
-        query = """WITH bad_entries AS (
-                       SELECT entry_id
-                       FROM starrers
-                       INNER JOIN starboard_entries
-                       ON starboard_entries.id = starrers.entry_id
-                       WHERE starboard_entries.guild_id=$1
-                       AND   starboard_entries.bot_message_id = ANY($2::bigint[])
-                       GROUP BY entry_id
-                       HAVING COUNT(*) <= $3
-                   )
-                   DELETE FROM starboard_entries USING bad_entries
-                   WHERE starboard_entries.id = bad_entries.entry_id
-                   RETURNING starboard_entries.bot_message_id
-                """
+        query = _delete_entries('guild_id=$1 AND bot_message_id=ANY($2::bigint[]) AND stars <= $3')
 
         to_delete = await ctx.db.fetch(query, ctx.guild.id, last_messages, stars)
 
@@ -659,6 +895,9 @@ class Stars:
         to_delete = [discord.Object(id=r[0]) for r in to_delete if r[0] > min_snowflake]
 
         try:
+            for o in to_delete:
+                self.cancel_edit(o.id)
+
             self._about_to_be_deleted.update(o.id for o in to_delete)
             await channel.delete_messages(to_delete)
         except discord.HTTPException:
@@ -703,7 +942,7 @@ class Stars:
                 return await ctx.send(msg.content, embed=embed)
             else:
                 # somehow it got deleted, so just delete the entry
-                query = "DELETE FROM starboard_entries WHERE message_id=$1;"
+                query = _delete_entries('message_id=$1')
                 await ctx.db.execute(query, record['message_id'])
                 return
 
@@ -798,10 +1037,10 @@ class Stars:
             channel_ids = [m.raw_channel_mentions[0] for m in current_messages]
 
             await ctx.acquire()
-            query = "DELETE FROM starboard_entries WHERE guild_id=$1 AND NOT (bot_message_id=ANY($2::bigint[]))"
+            query = _delete_entries('guild_id=$1 AND NOT (bot_message_id=ANY($2::bigint[]))')
             status = await ctx.db.execute(query, ctx.guild.id, message_ids)
 
-            _, _, deleted = status.partition(' ') # DELETE <number>
+            _, _, deleted = status.partition(' ') # SELECT <number>
             deleted = int(deleted)
 
             # get the up-to-date resolution of bot_message_id -> message_id
@@ -868,6 +1107,11 @@ class Stars:
                 delta = time.time() - start
 
                 await ctx.acquire()
+
+                # the author IDs were just filled in so the receivers are all wrong
+                async with ctx.db.transaction():
+                    await self.rebuild_leaderboards(guild_id=ctx.guild.id, connection=ctx.db)
+
                 query = "UPDATE starboard SET locked = FALSE WHERE id=$1;"
                 await ctx.db.execute(query, ctx.guild.id)
                 self.get_starboard.invalidate(self, ctx.guild.id)
@@ -959,64 +1203,42 @@ class Stars:
         e.timestamp = ctx.starboard.channel.created_at
         e.set_footer(text='Adding stars since')
 
-        # messages starred
-        query = "SELECT COUNT(*) FROM starboard_entries WHERE guild_id=$1;"
-
-        record = await ctx.db.fetchrow(query, ctx.guild.id)
-        total_messages = record[0]
-
-        # total stars given
-        query = """SELECT COUNT(*)
-                   FROM starrers
-                   INNER JOIN starboard_entries entry
-                   ON entry.id = starrers.entry_id
-                   WHERE entry.guild_id=$1;
+        # messages starred and total stars given
+        query = """SELECT (SELECT COUNT(*) FROM starboard_entries WHERE guild_id=$1),
+                          (SELECT COALESCE(SUM(stars), 0) FROM star_givers WHERE guild_id=$1);
                 """
 
-        record = await ctx.db.fetchrow(query, ctx.guild.id)
-        total_stars = record[0]
+        total_messages, total_stars = await ctx.db.fetchrow(query, ctx.guild.id)
 
         e.description = f'{Plural(message=total_messages)} starred with a total of {total_stars} stars.'
         e.colour = discord.Colour.gold()
 
-        # this big query fetches 3 things:
+        # this query fetches 3 things from the leaderboards:
         # top 3 starred posts (Type 3)
         # top 3 most starred authors  (Type 1)
         # top 3 star givers (Type 2)
 
-        query = """WITH t AS (
-                       SELECT
-                           entry.author_id AS entry_author_id,
-                           starrers.author_id,
-                           entry.bot_message_id
-                       FROM starrers
-                       INNER JOIN starboard_entries entry
-                       ON entry.id = starrers.entry_id
-                       WHERE entry.guild_id=$1
-                   )
-                   (
-                       SELECT t.entry_author_id AS "ID", 1 AS "Type", COUNT(*) AS "Stars"
-                       FROM t
-                       WHERE t.entry_author_id IS NOT NULL
-                       GROUP BY t.entry_author_id
-                       ORDER BY "Stars" DESC
+        query = """(
+                       SELECT author_id AS "ID", 1 AS "Type", stars AS "Stars"
+                       FROM star_receivers
+                       WHERE guild_id=$1 AND stars > 0
+                       ORDER BY stars DESC
                        LIMIT 3
                    )
                    UNION ALL
                    (
-                       SELECT t.author_id AS "ID", 2 AS "Type", COUNT(*) AS "Stars"
-                       FROM t
-                       GROUP BY t.author_id
-                       ORDER BY "Stars" DESC
+                       SELECT author_id AS "ID", 2 AS "Type", stars AS "Stars"
+                       FROM star_givers
+                       WHERE guild_id=$1 AND stars > 0
+                       ORDER BY stars DESC
                        LIMIT 3
                    )
                    UNION ALL
                    (
-                       SELECT t.bot_message_id AS "ID", 3 AS "Type", COUNT(*) AS "Stars"
-                       FROM t
-                       WHERE t.bot_message_id IS NOT NULL
-                       GROUP BY t.bot_message_id
-                       ORDER BY "Stars" DESC
+                       SELECT bot_message_id AS "ID", 3 AS "Type", stars AS "Stars"
+                       FROM starboard_entries
+                       WHERE guild_id=$1 AND bot_message_id IS NOT NULL
+                       ORDER BY stars DESC
                        LIMIT 3
                    );
                 """
@@ -1044,52 +1266,28 @@ class Stars:
         # this query calculates
         # 1 - stars received,
         # 2 - stars given
-        # The rest are the top 3 starred posts
+        # 3 - how many of our messages were starred
 
-        query = """WITH t AS (
-                       SELECT entry.author_id AS entry_author_id,
-                              starrers.author_id,
-                              entry.message_id
-                       FROM starrers
-                       INNER JOIN starboard_entries entry
-                       ON entry.id=starrers.entry_id
-                       WHERE entry.guild_id=$1
-                   )
-                   (
-                       SELECT '0'::bigint AS "ID", COUNT(*) AS "Stars"
-                       FROM t
-                       WHERE t.entry_author_id=$2
-                   )
-                   UNION ALL
-                   (
-                       SELECT '0'::bigint AS "ID", COUNT(*) AS "Stars"
-                       FROM t
-                       WHERE t.author_id=$2
-                   )
-                   UNION ALL
-                   (
-                       SELECT t.message_id AS "ID", COUNT(*) AS "Stars"
-                       FROM t
-                       WHERE t.entry_author_id=$2
-                       GROUP BY t.message_id
-                       ORDER BY "Stars" DESC
-                       LIMIT 3
-                   )
+        query = """SELECT (SELECT stars FROM star_receivers WHERE guild_id=$1 AND author_id=$2),
+                          (SELECT stars FROM star_givers WHERE guild_id=$1 AND author_id=$2),
+                          (SELECT COUNT(*) FROM starboard_entries WHERE guild_id=$1 AND author_id=$2);
                 """
 
-        records = await ctx.db.fetch(query, ctx.guild.id, member.id)
-        received = records[0]['Stars']
-        given = records[1]['Stars']
-        top_three = records[2:]
+        received, given, messages_starred = await ctx.db.fetchrow(query, ctx.guild.id, member.id)
+
+        # the top 3 starred posts
+        query = """SELECT message_id AS "ID", stars AS "Stars"
+                   FROM starboard_entries
+                   WHERE guild_id=$1 AND author_id=$2 AND stars > 0
+                   ORDER BY stars DESC
+                   LIMIT 3;
+                """
 
-        # this query calculates how many of our messages were starred
-        query = """SELECT COUNT(*) FROM starboard_entries WHERE guild_id=$1 AND author_id=$2;"""
-        record = await ctx.db.fetchrow(query, ctx.guild.id, member.id)
-        messages_starred = record[0]
+        top_three = await ctx.db.fetch(query, ctx.guild.id, member.id)
 
         e.add_field(name='Messages Starred', value=messages_starred)
-        e.add_field(name='Stars Received', value=received)
-        e.add_field(name='Stars Given', value=given)
+        e.add_field(name='Stars Received', value=received or 0)
+        e.add_field(name='Stars Given', value=given or 0)
 
         e.add_field(name='Top Starred Posts', value=self.records_to_value(top_three), inline=False)
 
@@ -1100,6 +1298,8 @@ class Stars:
     async def star_stats(self, ctx, *, member: discord.Member = None):
         """Shows statistics on the starboard usage of the server or a member."""
 
+        await ctx.acquire(readonly=True)
+
         if member is None:
             await self.star_guild_stats(ctx)
         else:
@@ -1290,5 +1490,31 @@ class Stars:
 
         await ctx.send(f'Successfully sent to {success} channels (out of {len(to_send)}).')
 
+    @commands.command(hidden=True)
+    @commands.is_owner()
+    async def star_rebuild(self, ctx, guild_id: int = None):
+        """Recounts the star leaderboards from the starrers."""
+        start = time.perf_counter()
+        async with ctx.db.transaction():
+            await self.rebuild_leaderboards(guild_id=guild_id, connection=ctx.db)
+
+        await ctx.send(f'Rebuilt the star leaderboards in {time.perf_counter() - start:.2f}s.')
+
+    @commands.command(hidden=True)
+    @commands.is_owner()
+    async def star_locks(self, ctx):
+        """Shows how long star events waited on each other."""
+        stats = self.lock_stats
+        if stats.contended:
+            average = stats.total_wait / stats.contended * 1000
+        else:
+            average = 0.0
+
+        ratio = stats.contended / stats.acquired if stats.acquired else 0.0
+        await ctx.send(f'{stats.acquired} star events, {stats.contended} ({ratio:.2%}) had to wait.\n'
+                       f'Average wait {average:.2f}ms, longest {stats.max_wait * 1000:.2f}ms, '
+                       f'{stats.total_wait:.2f}s in total.\n'
+                       f'{len(self._locks)} messages currently locked.')
+
 def setup(bot):
     bot.add_cog(Stars(bot))
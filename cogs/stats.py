@@ -1,35 +1,297 @@
 from discord.ext import commands
 from collections import Counter
 
-from .utils import checks, db
+from .utils import checks, db, cache, querystats
+from .utils.rates import RateCounter
+from .utils.formats import TabularData
 
 import logging
+import asyncio
+import asyncpg
 import discord
 import datetime
 import traceback
 import psutil
 import os
+import io
+import json
+import time
 
 log = logging.getLogger(__name__)
 
 LOGGING_CHANNEL = 309632009427222529
 
-class Commands(db.Table):
+# command usage is buffered and written with COPY once this many rows are
+# waiting or this many seconds have passed, whichever comes first
+COMMAND_BATCH_SIZE = 100
+COMMAND_FLUSH_INTERVAL = 10.0
+
+# if the database is unreachable or a batch keeps failing, the oldest usages are
+# dropped once this many are waiting or after this many failed flushes in a row
+COMMAND_BUFFER_LIMIT = 10000
+COMMAND_MAX_FAILURES = 5
+
+_command_columns = ('guild_id', 'channel_id', 'author_id', 'used', 'prefix', 'command')
+
+# these have the guild's ID as "id" rather than "guild_id"
+_guild_events = {'GUILD_CREATE', 'GUILD_UPDATE', 'GUILD_DELETE'}
+
+def _shard_id(msg, shard_count):
+    # Discord sends everything without a guild, like DMs, through shard 0
+    data = msg.get('d')
+    if not shard_count or not isinstance(data, dict):
+        return 0
+
+    guild_id = data.get('id') if msg.get('t') in _guild_events else data.get('guild_id')
+    if guild_id is None:
+        return 0
+    return (int(guild_id) >> 22) % shard_count
+
+def _rollup_update(table):
+    return {
+        'uses': f'{table}.uses + EXCLUDED.uses',
+        'first_used': f'LEAST({table}.first_used, EXCLUDED.first_used)',
+    }
+
+class Commands(db.Table, partition_by=db.Range('used', interval='1 month')):
     id = db.PrimaryKeyColumn()
 
     guild_id = db.Column(db.Integer(big=True), index=True)
     channel_id = db.Column(db.Integer(big=True))
     author_id = db.Column(db.Integer(big=True), index=True)
-    used = db.Column(db.Datetime)
+    used = db.Column(db.Datetime, index=True)
     prefix = db.Column(db.String)
     command = db.Column(db.String, index=True)
 
+# Hourly roll ups of the commands table, kept up to date by the command logger.
+# Private messages are stored with a guild_id of 0 since it's part of the key.
+
+class CommandRollups(db.Table, table_name='command_rollups'):
+    id = db.Column(db.Integer(big=True, auto_increment=True), primary_key=True)
+
+    bucket = db.Column(db.Datetime, nullable=False)
+    guild_id = db.Column(db.Integer(big=True), nullable=False)
+    command = db.Column(db.String, nullable=False)
+    uses = db.Column(db.Integer, default=0)
+    first_used = db.Column(db.Datetime)
+
+    uniq = db.Index('bucket', 'guild_id', 'command', unique=True)
+    guild = db.Index('guild_id', 'bucket')
+
+class CommandAuthorRollups(db.Table, table_name='command_author_rollups'):
+    id = db.Column(db.Integer(big=True, auto_increment=True), primary_key=True)
+
+    bucket = db.Column(db.Datetime, nullable=False)
+    guild_id = db.Column(db.Integer(big=True), nullable=False)
+    author_id = db.Column(db.Integer(big=True), nullable=False)
+    command = db.Column(db.String, nullable=False)
+    uses = db.Column(db.Integer, default=0)
+    first_used = db.Column(db.Datetime)
+
+    uniq = db.Index('bucket', 'guild_id', 'author_id', 'command', unique=True)
+    author = db.Index('guild_id', 'author_id', 'bucket')
+
+def _bump(counter, key, delta):
+    counter[key] += delta
+    if counter[key] <= 0:
+        del counter[key]
+
+class AboutCounters:
+    """Running member and channel totals so ``?about`` doesn't have to walk every member.
+
+    ``users`` and ``online`` map a user ID to how many guilds they're in
+    and how many guilds they show up as online in respectively.
+    """
+
+    __slots__ = ('members', 'users', 'online', 'text', 'voice')
+
+    def __init__(self):
+        self.members = 0
+        self.users = Counter()
+        self.online = Counter()
+        self.text = 0
+        self.voice = 0
+
+    @classmethod
+    def from_guilds(cls, guilds):
+        self = cls()
+        for guild in guilds:
+            self.add_guild(guild)
+        return self
+
+    def add_member(self, member, delta=1):
+        self.members += delta
+        _bump(self.users, member.id, delta)
+        if member.status is not discord.Status.offline:
+            _bump(self.online, member.id, delta)
+
+    def add_channel(self, channel, delta=1):
+        if isinstance(channel, discord.TextChannel):
+            self.text += delta
+        elif isinstance(channel, discord.VoiceChannel):
+            self.voice += delta
+
+    def add_guild(self, guild, delta=1):
+        for member in guild.members:
+            self.add_member(member, delta)
+
+        for channel in guild.channels:
+            self.add_channel(channel, delta)
+
+    def update_presence(self, before, after):
+        was_online = before.status is not discord.Status.offline
+        is_online = after.status is not discord.Status.offline
+        if was_online != is_online:
+            _bump(self.online, after.id, 1 if is_online else -1)
+
+    def totals(self):
+        return {
+            'Members': self.members,
+            'Unique': len(self.users),
+            'Unique Online': len(self.online),
+            'Text Channels': self.text,
+            'Voice Channels': self.voice,
+        }
+
 class Stats:
     """Bot usage statistics."""
 
     def __init__(self, bot):
         self.bot = bot
         self.process = psutil.Process()
+        self.counters = AboutCounters.from_guilds(bot.guilds) if bot.is_ready() else None
+        self._partition_task = bot.loop.create_task(self.maintain_partitions())
+        self._data_batch = []
+        self._batch_lock = asyncio.Lock(loop=bot.loop)
+        self._batch_full = asyncio.Event(loop=bot.loop)
+        self.flushes = 0
+        self.last_flush = 0.0
+        self.max_flush = 0.0
+        self.failed_flushes = 0
+        self.dropped_commands = 0
+        self._batch_task = bot.loop.create_task(self.bulk_insert())
+
+    def __unload(self):
+        self._partition_task.cancel()
+        self._batch_task.cancel()
+        # don't lose whatever was still buffered
+        self.bot.loop.create_task(self.flush_commands())
+
+    @property
+    def pending_commands(self):
+        """The number of command usages waiting to be written."""
+        return len(self._data_batch)
+
+    async def flush_commands(self):
+        """Writes the buffered command usage to the database."""
+        async with self._batch_lock:
+            self._batch_full.clear()
+            if not self._data_batch:
+                return
+
+            records, self._data_batch = self._data_batch, []
+            start = time.perf_counter()
+            try:
+                by_command, by_author = self._rollup(records)
+                async with self.bot.pool.acquire() as con:
+                    async with con.transaction():
+                        await con.copy_records_to_table('commands', columns=_command_columns, records=records)
+                        await CommandRollups.upsert_many(by_command, conflict=('bucket', 'guild_id', 'command'),
+                                                         update=_rollup_update('command_rollups'), connection=con)
+                        await CommandAuthorRollups.upsert_many(by_author, conflict=('bucket', 'guild_id', 'author_id', 'command'),
+                                                               update=_rollup_update('command_author_rollups'), connection=con)
+            except asyncio.CancelledError:
+                self._data_batch[:0] = records
+                raise
+            except Exception:
+                self.failed_flushes += 1
+                if self.failed_flushes >= COMMAND_MAX_FAILURES:
+                    # probably a bad row in there, don't let it hold up everything after it
+                    self._drop_commands(len(records), 'they failed to be written %s times in a row' % self.failed_flushes)
+                    self.failed_flushes = 0
+                else:
+                    # put them back so the next flush picks them up
+                    self._data_batch[:0] = records
+                    overflow = len(self._data_batch) - COMMAND_BUFFER_LIMIT
+                    if overflow > 0:
+                        del self._data_batch[:overflow]
+                        self._drop_commands(overflow, 'too many are waiting to be written')
+                raise
+
+            elapsed = time.perf_counter() - start
+            self.failed_flushes = 0
+            self.flushes += 1
+            self.last_flush = elapsed
+            if elapsed > self.max_flush:
+                self.max_flush = elapsed
+
+    def _drop_commands(self, count, reason):
+        self.dropped_commands += count
+        log.warning('Dropped the %s oldest command usages since %s.', count, reason)
+
+    def _rollup(self, records):
+        by_command = {}
+        by_author = {}
+
+        for guild_id, channel_id, author_id, used, prefix, command in records:
+            bucket = used.replace(minute=0, second=0, microsecond=0)
+            guild_id = guild_id or 0
+            for rollup, key in ((by_command, (bucket, guild_id, command)), (by_author, (bucket, guild_id, author_id, command))):
+                try:
+                    entry = rollup[key]
+                except KeyError:
+                    rollup[key] = [1, used]
+                else:
+                    entry[0] += 1
+                    entry[1] = min(entry[1], used)
+
+        by_command = [
+            {'bucket': bucket, 'guild_id': guild_id, 'command': command, 'uses': uses, 'first_used': first}
+            for (bucket, guild_id, command), (uses, first) in by_command.items()
+        ]
+
+        by_author = [
+            {'bucket': bucket, 'guild_id': guild_id, 'author_id': author_id, 'command': command, 'uses': uses, 'first_used': first}
+            for (bucket, guild_id, author_id, command), (uses, first) in by_author.items()
+        ]
+
+        return by_command, by_author
+
+    def _rollup_window(self):
+        # everything after the cutoff but before the first full hour
+        # isn't in a rollup bucket of its own so it comes from the raw table
+        cutoff = datetime.datetime.utcnow() - datetime.timedelta(days=1)
+        return cutoff, cutoff.replace(minute=0, second=0, microsecond=0) + datetime.timedelta(hours=1)
+
+    async def bulk_insert(self):
+        try:
+            while not self.bot.is_closed():
+                try:
+                    await asyncio.wait_for(self._batch_full.wait(), timeout=COMMAND_FLUSH_INTERVAL)
+                except asyncio.TimeoutError:
+                    pass
+
+                try:
+                    await self.flush_commands()
+                except Exception:
+                    log.exception('Could not write %s command usages, retrying later.', self.pending_commands)
+                    await asyncio.sleep(COMMAND_FLUSH_INTERVAL)
+        except asyncio.CancelledError:
+            pass
+
+    async def maintain_partitions(self):
+        # keep a few months of partitions ready ahead of time
+        try:
+            while not self.bot.is_closed():
+                try:
+                    await Commands.create_partitions()
+                except Exception:
+                    log.exception('Could not create the commands partitions, retrying in an hour.')
+                    await asyncio.sleep(3600)
+                else:
+                    await asyncio.sleep(86400)
+        except asyncio.CancelledError:
+            pass
 
     async def on_command(self, ctx):
         command = ctx.command.qualified_name
@@ -43,15 +305,13 @@ class Stats:
             destination = f'#{message.channel} ({message.guild})'
             guild_id = ctx.guild.id
 
-        query = """INSERT INTO commands (guild_id, channel_id, author_id, used, prefix, command)
-                   VALUES ($1, $2, $3, $4, $5, $6)
-                """
-
         log.info(f'{message.created_at}: {message.author} in {destination}: {message.content}')
-        await self.bot.pool.execute(query, guild_id, ctx.channel.id, ctx.author.id, message.created_at, ctx.prefix, command)
+        self._data_batch.append((guild_id, ctx.channel.id, ctx.author.id, message.created_at, ctx.prefix, command))
+        if len(self._data_batch) >= COMMAND_BATCH_SIZE:
+            self._batch_full.set()
 
     async def on_socket_response(self, msg):
-        self.bot.socket_stats[msg.get('t')] += 1
+        self.bot.socket_stats.add((_shard_id(msg, self.bot.shard_count), msg.get('t')))
 
     @property
     def webhook(self):
@@ -95,16 +355,124 @@ class Stats:
             common = counter.most_common()[limit:]
 
         output = '\n'.join(f'{k:<{width}}: {c}' for k, c in common)
+        logged = f'{self.pending_commands} waiting to be logged, last flush took {self.last_flush * 1000:.2f}ms ' \
+                 f'(max {self.max_flush * 1000:.2f}ms over {self.flushes} flushes), ' \
+                 f'{self.dropped_commands} dropped'
+
+        await ctx.send(f'```\n{output}\n```\n{logged}')
+
+    @commands.command(hidden=True)
+    @commands.is_owner()
+    async def cachestats(self, ctx):
+        """Shows the hit rate and size of every cached function."""
+        table = TabularData()
+        table.set_columns(['Function', 'Hits', 'Misses', 'Coalesced', 'Evicted', 'Expired', 'Size'])
+
+        all_stats = cache.get_all_stats()
+        stars = self.bot.get_cog('Stars')
+        if stars is not None:
+            all_stats['Stars.get_message'] = stars.message_cache_stats()
+
+        for name, stats in sorted(all_stats.items()):
+            size = f'{stats.size}/{stats.maxsize}' if stats.maxsize else str(stats.size)
+            table.add_row([name, stats.hits, stats.misses, stats.coalesced, stats.evictions, stats.expirations, size])
+
+        await ctx.send(f'```\n{table.render()}\n```')
+
+    @commands.group(hidden=True, invoke_without_command=True)
+    @commands.is_owner()
+    async def querystats(self, ctx, limit=10):
+        """Shows the queries that took the most time in total."""
+        stats = querystats.stats
+        table = TabularData()
+        table.set_columns(['Query', 'Calls', 'Total', 'p50', 'p99', 'Rows', 'Wait'])
+
+        for entry in stats.top(limit):
+            query = entry.query if len(entry.query) <= 50 else entry.query[:49] + '\N{HORIZONTAL ELLIPSIS}'
+            table.add_row([query, entry.calls, f'{entry.total * 1000:.0f}ms', f'{entry.p50 * 1000:.2f}ms',
+                           f'{entry.p99 * 1000:.2f}ms', entry.rows, f'{entry.wait * 1000:.0f}ms'])
+
+        wait = stats.acquire_wait / stats.acquires * 1000 if stats.acquires else 0.0
+        fmt = f'```\n{table.render()}\n```\nAverage acquire wait: {wait:.2f}ms over {stats.acquires} acquires'
+        if len(fmt) > 2000:
+            fp = io.BytesIO(fmt.encode('utf-8'))
+            await ctx.send('Too many results...', file=discord.File(fp, 'querystats.txt'))
+        else:
+            await ctx.send(fmt)
+
+    @querystats.command(name='export')
+    @commands.is_owner()
+    async def querystats_export(self, ctx):
+        """Exports a snapshot of the query statistics as JSON."""
+        data = json.dumps(querystats.stats.snapshot(), indent=2)
+        fp = io.BytesIO(data.encode('utf-8'))
+        await ctx.send(file=discord.File(fp, 'querystats.json'))
+
+    @querystats.command(name='reset')
+    @commands.is_owner()
+    async def querystats_reset(self, ctx):
+        """Resets the query statistics."""
+        querystats.stats.reset()
+        await ctx.send(ctx.tick(True))
+
+    @commands.command(hidden=True)
+    @commands.is_owner()
+    async def dbusage(self, ctx, limit=20):
+        """Shows how often commands ran without touching the database."""
+        table = TabularData()
+        table.set_columns(['Command', 'Uses', 'No DB'])
+
+        counter = self.bot.commands_without_db
+        for name, count in counter.most_common(limit):
+            table.add_row([name, self.bot.command_stats[name], count])
+
+        await ctx.send(f'```\n{table.render()}\n```')
+
+    @commands.command(hidden=True)
+    @commands.is_owner()
+    async def checkcounters(self, ctx):
+        """Recomputes the ?about counters and shows how far off they were."""
+        fresh = AboutCounters.from_guilds(self.bot.guilds)
+        tracked = self.counters.totals() if self.counters is not None else {}
+
+        table = TabularData()
+        table.set_columns(['Counter', 'Tracked', 'Actual', 'Drift'])
+        for name, actual in fresh.totals().items():
+            value = tracked.get(name)
+            if value is None:
+                table.add_row([name, 'N/A', actual, 'N/A'])
+            else:
+                table.add_row([name, value, actual, f'{value - actual:+}'])
 
-        await ctx.send(f'```\n{output}\n```')
+        self.counters = fresh
+        await ctx.send(f'```\n{table.render()}\n```')
 
     @commands.command(hidden=True)
-    async def socketstats(self, ctx):
-        delta = datetime.datetime.utcnow() - self.bot.uptime
-        minutes = delta.total_seconds() / 60
-        total = sum(self.bot.socket_stats.values())
-        cpm = total / minutes
-        await ctx.send(f'{total} socket events observed ({cpm:.2f}/minute):\n{self.bot.socket_stats}')
+    async def socketstats(self, ctx, limit=10):
+        """Shows socket event rates per second for the bot, each shard and the busiest events."""
+        rates = self.bot.socket_stats
+        keys = list(rates.keys())
+
+        def add_row(table, name, summary):
+            table.add_row([name, *(f'{rate:.2f}' for rate in summary[:4]), summary.peak])
+
+        table = TabularData()
+        table.set_columns(['Shard', 'Now', '1m', '5m', '15m', 'Peak'])
+        add_row(table, 'All', rates.summary())
+        for shard_id in sorted({shard_id for shard_id, _ in keys}):
+            add_row(table, shard_id, rates.summary(k for k in keys if k[0] == shard_id))
+
+        events = TabularData()
+        events.set_columns(['Event', 'Now', '1m', '5m', '15m', 'Peak'])
+        summaries = [
+            (str(event), rates.summary(k for k in keys if k[1] == event))
+            for event in {event for _, event in keys}
+        ]
+        summaries.sort(key=lambda t: t[1].fifteen, reverse=True)
+        for name, summary in summaries[:limit]:
+            add_row(events, name, summary)
+
+        await ctx.send(f'```\n{table.render()}\n```\n```\n{events.render()}\n```')
 
     def get_bot_uptime(self, *, brief=False):
         now = datetime.datetime.utcnow()
@@ -153,18 +521,15 @@ class Stats:
         embed.set_author(name=str(owner), icon_url=owner.avatar_url)
 
         # statistics
-        total_members = sum(1 for _ in self.bot.get_all_members())
-        total_online = len({m.id for m in self.bot.get_all_members() if m.status is not discord.Status.offline})
-        total_unique = len(self.bot.users)
+        if self.counters is None:
+            self.counters = AboutCounters.from_guilds(self.bot.guilds)
 
-        voice_channels = []
-        text_channels = []
-        for guild in self.bot.guilds:
-            voice_channels.extend(guild.voice_channels)
-            text_channels.extend(guild.text_channels)
-
-        text = len(text_channels)
-        voice = len(voice_channels)
+        counters = self.counters
+        total_members = counters.members
+        total_online = len(counters.online)
+        total_unique = len(counters.users)
+        text = counters.text
+        voice = counters.voice
 
         embed.add_field(name='Members', value=f'{total_members} total\n{total_unique} unique\n{total_online} unique online')
         embed.add_field(name='Channels', value=f'{text + voice} total\n{text} text\n{voice} voice')
@@ -190,17 +555,18 @@ class Stats:
         )
 
         embed = discord.Embed(title='Server Command Stats', colour=discord.Colour.blurple())
+        cutoff, hour = self._rollup_window()
 
         # total command uses
-        query = "SELECT COUNT(*), MIN(used) FROM commands WHERE guild_id=$1;"
+        query = "SELECT COALESCE(SUM(uses), 0), MIN(first_used) FROM command_rollups WHERE guild_id=$1;"
         count = await ctx.db.fetchrow(query, ctx.guild.id)
 
         embed.description = f'{count[0]} commands used.'
         embed.set_footer(text='Tracking command usage since').timestamp = count[1] or datetime.datetime.utcnow()
 
         query = """SELECT command,
-                          COUNT(*) as "uses"
-                   FROM commands
+                          SUM(uses) as "uses"
+                   FROM command_rollups
                    WHERE guild_id=$1
                    GROUP BY command
                    ORDER BY "uses" DESC
@@ -215,16 +581,23 @@ class Stats:
         embed.add_field(name='Top Commands', value=value, inline=True)
 
         query = """SELECT command,
-                          COUNT(*) as "uses"
-                   FROM commands
-                   WHERE guild_id=$1
-                   AND used > (CURRENT_TIMESTAMP - INTERVAL '1 day')
+                          SUM(uses) as "uses"
+                   FROM (
+                       SELECT command, uses
+                       FROM command_rollups
+                       WHERE guild_id=$1 AND bucket >= $3
+                       UNION ALL
+                       SELECT command, COUNT(*)::int
+                       FROM commands
+                       WHERE guild_id=$1 AND used > $2 AND used < $3
+                       GROUP BY command
+                   ) AS today
                    GROUP BY command
                    ORDER BY "uses" DESC
                    LIMIT 5;
                 """
 
-        records = await ctx.db.fetch(query, ctx.guild.id)
+        records = await ctx.db.fetch(query, ctx.guild.id, cutoff, hour)
 
         value = '\n'.join(f'{lookup[index]}: {command} ({uses} uses)'
                           for (index, (command, uses)) in enumerate(records)) or 'No Commands.'
@@ -232,8 +605,8 @@ class Stats:
         embed.add_field(name='\u200b', value='\u200b', inline=True)
 
         query = """SELECT author_id,
-                          COUNT(*) AS "uses"
-                   FROM commands
+                          SUM(uses) AS "uses"
+                   FROM command_author_rollups
                    WHERE guild_id=$1
                    GROUP BY author_id
                    ORDER BY "uses" DESC
@@ -249,17 +622,24 @@ class Stats:
         embed.add_field(name='Top Command Users', value=value, inline=True)
 
         query = """SELECT author_id,
-                          COUNT(*) AS "uses"
-                   FROM commands
-                   WHERE guild_id=$1
-                   AND used > (CURRENT_TIMESTAMP - INTERVAL '1 day')
+                          SUM(uses) AS "uses"
+                   FROM (
+                       SELECT author_id, uses
+                       FROM command_author_rollups
+                       WHERE guild_id=$1 AND bucket >= $3
+                       UNION ALL
+                       SELECT author_id, COUNT(*)::int
+                       FROM commands
+                       WHERE guild_id=$1 AND used > $2 AND used < $3
+                       GROUP BY author_id
+                   ) AS today
                    GROUP BY author_id
                    ORDER BY "uses" DESC
                    LIMIT 5;
                 """
 
 
-        records = await ctx.db.fetch(query, ctx.guild.id)
+        records = await ctx.db.fetch(query, ctx.guild.id, cutoff, hour)
 
         value = '\n'.join(f'{lookup[index]}: <@!{author_id}> ({uses} bot uses)'
                           for (index, (author_id, uses)) in enumerate(records)) or 'No command users.'
@@ -278,17 +658,21 @@ class Stats:
 
         embed = discord.Embed(title='Command Stats', colour=member.colour)
         embed.set_author(name=str(member), icon_url=member.avatar_url)
+        cutoff, hour = self._rollup_window()
 
         # total command uses
-        query = "SELECT COUNT(*), MIN(used) FROM commands WHERE guild_id=$1 AND author_id=$2;"
+        query = """SELECT COALESCE(SUM(uses), 0), MIN(first_used)
+                   FROM command_author_rollups
+                   WHERE guild_id=$1 AND author_id=$2;
+                """
         count = await ctx.db.fetchrow(query, ctx.guild.id, member.id)
 
         embed.description = f'{count[0]} commands used.'
         embed.set_footer(text='First command used').timestamp = count[1] or datetime.datetime.utcnow()
 
         query = """SELECT command,
-                          COUNT(*) as "uses"
-                   FROM commands
+                          SUM(uses) as "uses"
+                   FROM command_author_rollups
                    WHERE guild_id=$1 AND author_id=$2
                    GROUP BY command
                    ORDER BY "uses" DESC
@@ -303,17 +687,23 @@ class Stats:
         embed.add_field(name='Most Used Commands', value=value, inline=False)
 
         query = """SELECT command,
-                          COUNT(*) as "uses"
-                   FROM commands
-                   WHERE guild_id=$1
-                   AND author_id=$2
-                   AND used > (CURRENT_TIMESTAMP - INTERVAL '1 day')
+                          SUM(uses) as "uses"
+                   FROM (
+                       SELECT command, uses
+                       FROM command_author_rollups
+                       WHERE guild_id=$1 AND author_id=$2 AND bucket >= $4
+                       UNION ALL
+                       SELECT command, COUNT(*)::int
+                       FROM commands
+                       WHERE guild_id=$1 AND author_id=$2 AND used > $3 AND used < $4
+                       GROUP BY command
+                   ) AS today
                    GROUP BY command
                    ORDER BY "uses" DESC
                    LIMIT 5;
                 """
 
-        records = await ctx.db.fetch(query, ctx.guild.id, member.id)
+        records = await ctx.db.fetch(query, ctx.guild.id, member.id, cutoff, hour)
 
         value = '\n'.join(f'{lookup[index]}: {command} ({uses} uses)'
                           for (index, (command, uses)) in enumerate(records)) or 'No Commands'
@@ -326,6 +716,7 @@ class Stats:
     async def stats(self, ctx, *, member: discord.Member = None):
         """Tells you command usage stats for the server or a member."""
 
+        await ctx.acquire(readonly=True)
         if member is None:
             await self.show_guild_stats(ctx)
         else:
@@ -335,7 +726,8 @@ class Stats:
     async def stats_global(self, ctx):
         """Global all time command statistics."""
 
-        query = "SELECT COUNT(*) FROM commands;"
+        await ctx.acquire(readonly=True)
+        query = "SELECT COALESCE(SUM(uses), 0) FROM command_rollups;"
         total = await ctx.db.fetchrow(query)
 
         e = discord.Embed(title='Command Stats', colour=discord.Colour.blurple())
@@ -349,8 +741,8 @@ class Stats:
             '\N{SPORTS MEDAL}'
         )
 
-        query = """SELECT command, COUNT(*) AS "uses"
-                   FROM commands
+        query = """SELECT command, SUM(uses) AS "uses"
+                   FROM command_rollups
                    GROUP BY command
                    ORDER BY "uses" DESC
                    LIMIT 5;
@@ -360,8 +752,8 @@ class Stats:
         value = '\n'.join(f'{lookup[index]}: {command} ({uses} uses)' for (index, (command, uses)) in enumerate(records))
         e.add_field(name='Top Commands', value=value, inline=False)
 
-        query = """SELECT guild_id, COUNT(*) AS "uses"
-                   FROM commands
+        query = """SELECT NULLIF(guild_id, 0) AS "guild_id", SUM(uses) AS "uses"
+                   FROM command_rollups
                    GROUP BY guild_id
                    ORDER BY "uses" DESC
                    LIMIT 5;
@@ -380,8 +772,8 @@ class Stats:
 
         e.add_field(name='Top Guilds', value='\n'.join(value), inline=False)
 
-        query = """SELECT author_id, COUNT(*) AS "uses"
-                   FROM commands
+        query = """SELECT author_id, SUM(uses) AS "uses"
+                   FROM command_author_rollups
                    GROUP BY author_id
                    ORDER BY "uses" DESC
                    LIMIT 5;
@@ -401,8 +793,12 @@ class Stats:
     async def stats_today(self, ctx):
         """Global command statistics for the day."""
 
-        query = "SELECT COUNT(*) FROM commands WHERE used > (CURRENT_TIMESTAMP - INTERVAL '1 day');"
-        total = await ctx.db.fetchrow(query)
+        await ctx.acquire(readonly=True)
+        cutoff, hour = self._rollup_window()
+        query = """SELECT (SELECT COALESCE(SUM(uses), 0) FROM command_rollups WHERE bucket >= $2)
+                        + (SELECT COUNT(*) FROM commands WHERE used > $1 AND used < $2);
+                """
+        total = await ctx.db.fetchrow(query, cutoff, hour)
 
         e = discord.Embed(title='Last 24 Hour Command Stats', colour=discord.Colour.blurple())
         e.description = f'{total[0]} commands used today.'
@@ -415,27 +811,43 @@ class Stats:
             '\N{SPORTS MEDAL}'
         )
 
-        query = """SELECT command, COUNT(*) AS "uses"
-                   FROM commands
-                   WHERE used > (CURRENT_TIMESTAMP - INTERVAL '1 day')
+        query = """SELECT command, SUM(uses) AS "uses"
+                   FROM (
+                       SELECT command, uses
+                       FROM command_rollups
+                       WHERE bucket >= $2
+                       UNION ALL
+                       SELECT command, COUNT(*)::int
+                       FROM commands
+                       WHERE used > $1 AND used < $2
+                       GROUP BY command
+                   ) AS today
                    GROUP BY command
                    ORDER BY "uses" DESC
                    LIMIT 5;
                 """
 
-        records = await ctx.db.fetch(query)
+        records = await ctx.db.fetch(query, cutoff, hour)
         value = '\n'.join(f'{lookup[index]}: {command} ({uses} uses)' for (index, (command, uses)) in enumerate(records))
         e.add_field(name='Top Commands', value=value, inline=False)
 
-        query = """SELECT guild_id, COUNT(*) AS "uses"
-                   FROM commands
-                   WHERE used > (CURRENT_TIMESTAMP - INTERVAL '1 day')
+        query = """SELECT guild_id, SUM(uses) AS "uses"
+                   FROM (
+                       SELECT NULLIF(guild_id, 0) AS guild_id, uses
+                       FROM command_rollups
+                       WHERE bucket >= $2
+                       UNION ALL
+                       SELECT guild_id, COUNT(*)::int
+                       FROM commands
+                       WHERE used > $1 AND used < $2
+                       GROUP BY guild_id
+                   ) AS today
                    GROUP BY guild_id
                    ORDER BY "uses" DESC
                    LIMIT 5;
                 """
 
-        records = await ctx.db.fetch(query)
+        records = await ctx.db.fetch(query, cutoff, hour)
         value = []
         for (index, (guild_id, uses)) in enumerate(records):
             if guild_id is None:
@@ -447,15 +859,23 @@ class Stats:
 
         e.add_field(name='Top Guilds', value='\n'.join(value), inline=False)
 
-        query = """SELECT author_id, COUNT(*) AS "uses"
-                   FROM commands
-                   WHERE used > (CURRENT_TIMESTAMP - INTERVAL '1 day')
+        query = """SELECT author_id, SUM(uses) AS "uses"
+                   FROM (
+                       SELECT author_id, uses
+                       FROM command_author_rollups
+                       WHERE bucket >= $2
+                       UNION ALL
+                       SELECT author_id, COUNT(*)::int
+                       FROM commands
+                       WHERE used > $1 AND used < $2
+                       GROUP BY author_id
+                   ) AS today
                    GROUP BY author_id
                    ORDER BY "uses" DESC
                    LIMIT 5;
                 """
 
-        records = await ctx.db.fetch(query)
+        records = await ctx.db.fetch(query, cutoff, hour)
         value = []
         for (index, (author_id, uses)) in enumerate(records):
             user = self.bot.get_user(author_id) or f'<Unknown {author_id}>'
@@ -486,13 +906,43 @@ class Stats:
         await self.webhook.send(embed=e)
 
     async def on_guild_join(self, guild):
+        if self.counters is not None:
+            self.counters.add_guild(guild)
+
         e = discord.Embed(colour=0x53dda4, title='New Guild') # green colour
         await self.send_guild_stats(e, guild)
 
     async def on_guild_remove(self, guild):
+        if self.counters is not None:
+            self.counters.add_guild(guild, -1)
+
         e = discord.Embed(colour=0xdd5f53, title='Left Guild') # red colour
         await self.send_guild_stats(e, guild)
 
+    async def on_ready(self):
+        # a fresh session means a fresh member cache, so start over
+        self.counters = AboutCounters.from_guilds(self.bot.guilds)
+
+    async def on_member_join(self, member):
+        if self.counters is not None:
+            self.counters.add_member(member)
+
+    async def on_member_remove(self, member):
+        if self.counters is not None:
+            self.counters.add_member(member, -1)
+
+    async def on_member_update(self, before, after):
+        if self.counters is not None:
+            self.counters.update_presence(before, after)
+
+    async def on_guild_channel_create(self, channel):
+        if self.counters is not None:
+            self.counters.add_channel(channel)
+
+    async def on_guild_channel_delete(self, channel):
+        if self.counters is not None:
+            self.counters.add_channel(channel, -1)
+
     async def on_command_error(self, ctx, error):
         ignored = (commands.NoPrivateMessage, commands.DisabledCommand, commands.CheckFailure,
                    commands.CommandNotFound, commands.UserInputError, discord.Forbidden)
@@ -534,8 +984,8 @@ def setup(bot):
     if not hasattr(bot, 'command_stats'):
         bot.command_stats = Counter()
 
-    if not hasattr(bot, 'socket_stats'):
-        bot.socket_stats = Counter()
+    if not isinstance(getattr(bot, 'socket_stats', None), RateCounter):
+        bot.socket_stats = RateCounter()
 
     bot.add_cog(Stats(bot))
     commands.Bot.on_error = on_error
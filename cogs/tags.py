@@ -48,7 +48,6 @@ def can_use_box():
 class TagsTable(db.Table, table_name='tags'):
     id = db.PrimaryKeyColumn()
 
-    # we will create more indexes manually
     name = db.Column(db.String, index=True)
 
     content = db.Column(db.String)
@@ -57,21 +56,13 @@ class TagsTable(db.Table, table_name='tags'):
     location_id = db.Column(db.Integer(big=True), index=True)
     created_at = db.Column(db.Datetime, default="now() at time zone 'utc'")
 
-    @classmethod
-    def create_table(cls, *, exists_ok=True):
-        statement = super().create_table(exists_ok=exists_ok)
-
-        # create the indexes
-        sql = "CREATE INDEX IF NOT EXISTS tags_name_trgm_idx ON tags USING GIN (name gin_trgm_ops);\n" \
-              "CREATE INDEX IF NOT EXISTS tags_name_lower_idx ON tags (LOWER(name));\n" \
-              "CREATE UNIQUE INDEX IF NOT EXISTS tags_uniq_idx ON tags (LOWER(name), location_id);"
-
-        return statement + '\n' + sql
+    name_trgm = db.Index('name', using='gin', ops='gin_trgm_ops')
+    name_lower = db.Index('LOWER(name)')
+    uniq = db.Index('LOWER(name)', 'location_id', unique=True)
 
 class TagLookup(db.Table, table_name='tag_lookup'):
     id = db.PrimaryKeyColumn()
 
-    # we will create more indexes manually
     name = db.Column(db.String, index=True)
     location_id = db.Column(db.Integer(big=True), index=True)
 
@@ -79,16 +70,9 @@ class TagLookup(db.Table, table_name='tag_lookup'):
     created_at = db.Column(db.Datetime, default="now() at time zone 'utc'")
     tag_id = db.Column(db.ForeignKey('tags', 'id'))
 
-    @classmethod
-    def create_table(cls, *, exists_ok=True):
-        statement = super().create_table(exists_ok=exists_ok)
-
-        # create the indexes
-        sql = "CREATE INDEX IF NOT EXISTS tag_lookup_name_trgm_idx ON tag_lookup USING GIN (name gin_trgm_ops);\n" \
-              "CREATE INDEX IF NOT EXISTS tag_lookup_name_lower_idx ON tag_lookup (LOWER(name));\n" \
-              "CREATE UNIQUE INDEX IF NOT EXISTS tag_lookup_uniq_idx ON tag_lookup (LOWER(name), location_id);"
-
-        return statement + '\n' + sql
+    name_trgm = db.Index('name', using='gin', ops='gin_trgm_ops')
+    name_lower = db.Index('LOWER(name)')
+    uniq = db.Index('LOWER(name)', 'location_id', unique=True)
 
 class TagName(commands.clean_content):
     def __init__(self, *, lower=False):
@@ -518,6 +502,7 @@ class Tags:
     async def stats(self, ctx, *, member: discord.Member = None):
         """Gives tag statistics for a member or the server."""
 
+        await ctx.acquire(readonly=True)
         if member is None:
             await self.guild_tag_stats(ctx)
         else:
@@ -998,6 +983,7 @@ class Tags:
     async def box_stats(self, ctx):
         """Shows statistics about the tag box."""
 
+        await ctx.acquire(readonly=True)
         # This is the best I could split it to.
         # Originally it was 3 different queries but 2 is the best I could do
         # Splitting it into a single query incurred insane overhead for some reason.
@@ -422,9 +422,12 @@ class Tournament:
 
     def __init__(self, bot):
         self.bot = bot
-        self.config = config.Config('tournament.json')
+        self.config = config.Config('tournament.json', flush_interval=10.0)
         self._already_running_registration = set()
 
+    def __unload(self):
+        self.config.close()
+
     async def __error(self, ctx, error):
         if isinstance(error, (ChallongeError, commands.BadArgument)):
             traceback.print_exc()
@@ -1,11 +1,20 @@
 import inspect
 import asyncio
 import enum
+import json
+import logging
+import time
+import uuid
 
+from collections import namedtuple, OrderedDict, deque
 from functools import wraps
 
 from lru import LRU
 
+log = logging.getLogger(__name__)
+
+CacheStats = namedtuple('CacheStats', 'hits misses coalesced evictions expirations size maxsize')
+
 def _wrap_and_store_coroutine(cache, key, coro):
     async def func():
         value = await coro
@@ -18,41 +27,387 @@ def _wrap_new_coroutine(value):
         return value
     return new_coroutine()
 
+def _in_transaction(connection):
+    try:
+        return connection.is_in_transaction()
+    except AttributeError:
+        # a pool, or a lazy connection that hasn't acquired anything yet
+        return False
+
+class ExpiringCache:
+    """A size bounded mapping where every entry expires ``ttl`` seconds after being set.
+
+    If ``lru`` is ``True`` then looking up an entry marks it as recently used,
+    otherwise entries are evicted in insertion order once ``maxsize`` is reached.
+
+    Expired entries are removed lazily on lookup and by a periodic sweep
+    that only has to look at the entries that actually expired.
+    """
+
+    def __init__(self, maxsize, ttl, *, lru=False):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.lru = lru
+        self.evictions = 0
+        self.expirations = 0
+
+        # key: (value, expires_at)
+        self._data = OrderedDict()
+
+        # (expires_at, key) in expiry order, since the TTL is the same for
+        # every entry this is just insertion order.
+        self._expiry = deque()
+        self._sweeper = None
+
+    def __repr__(self):
+        return f'<ExpiringCache size={len(self._data)} maxsize={self.maxsize} ttl={self.ttl}>'
+
+    def __getitem__(self, key):
+        value, expires_at = self._data[key]
+        if expires_at <= time.monotonic():
+            del self._data[key]
+            self.expirations += 1
+            raise KeyError(key)
+
+        if self.lru:
+            self._data.move_to_end(key)
+        return value
+
+    def __setitem__(self, key, value):
+        expires_at = time.monotonic() + self.ttl
+        data = self._data
+        data[key] = (value, expires_at)
+        data.move_to_end(key)
+        self._expiry.append((expires_at, key))
+
+        while len(data) > self.maxsize:
+            data.popitem(last=False)
+            self.evictions += 1
+
+        # overwritten and evicted keys leave their old expiry behind,
+        # so every now and then only keep the ones that are still live
+        if len(self._expiry) > 2 * self.maxsize:
+            self._compact()
+
+        if self._sweeper is None:
+            self._sweeper = asyncio.get_event_loop().call_later(self.ttl, self.sweep)
+
+    def __delitem__(self, key):
+        del self._data[key]
+
+    def __contains__(self, key):
+        try:
+            self[key]
+        except KeyError:
+            return False
+        else:
+            return True
+
+    def __len__(self):
+        return len(self._data)
+
+    def get(self, key, default=None):
+        try:
+            return self[key]
+        except KeyError:
+            return default
+
+    def clear(self):
+        self._data.clear()
+        self._expiry.clear()
+
+    def _compact(self):
+        live = sorted(((expires_at, key) for key, (_, expires_at) in self._data.items()), key=lambda e: e[0])
+        self._expiry = deque(live)
+
+    def sweep(self):
+        """Removes every expired entry."""
+        self._sweeper = None
+        now = time.monotonic()
+        data = self._data
+        expiry = self._expiry
+
+        while expiry and expiry[0][0] <= now:
+            expires_at, key = expiry.popleft()
+            try:
+                _, current = data[key]
+            except KeyError:
+                continue
+
+            # the key might have been set again since then
+            if current == expires_at:
+                del data[key]
+                self.expirations += 1
+
+        # once everything is gone there's no need to keep the timer alive
+        if expiry:
+            self._sweeper = asyncio.get_event_loop().call_later(self.ttl, self.sweep)
+
+# qualified name: wrapper, used to expose every cache's counters at once
+_registry = {}
+
+def get_all_stats():
+    """Returns a mapping of the qualified function name to its :class:`CacheStats`."""
+    return {name: wrapper.get_stats() for name, wrapper in _registry.items()}
+
+class _Counters:
+    __slots__ = ('hits', 'misses', 'coalesced', 'evictions')
+
+    def __init__(self):
+        self.hits = 0
+        self.misses = 0
+        self.coalesced = 0
+        self.evictions = 0
+
+    def on_evict(self, key, value):
+        self.evictions += 1
+
 class Strategy(enum.Enum):
     lru = 1
     raw = 2
+    ttl = 3
+    lru_ttl = 4
 
-def cache(maxsize=128, strategy=Strategy.lru):
-    def decorator(func):
-        if strategy is Strategy.lru:
-            _internal_cache = LRU(maxsize)
-            _stats = _internal_cache.get_stats
-        elif strategy is Strategy.raw:
-            _internal_cache = {}
-            _stats = lambda: (0, 0)
-
-        def _make_key(args, kwargs):
-            # this is a bit of a cluster fuck
-            # we do care what 'self' parameter is when we __repr__ it
-            def _true_repr(o):
-                if o.__class__.__repr__ is object.__repr__:
-                    return f'<{o.__class__.__module__}.{o.__class__.__name__}>'
-                return repr(o)
-
-            key = [ f'{func.__module__}.{func.__name__}' ]
-            key.extend(_true_repr(o) for o in args)
-            for k, v in kwargs.items():
-                # note: this only really works for this use case in particular
-                # I want to pass asyncpg.Connection objects to the parameters
-                # however, they use default __repr__ and I do not care what
-                # connection is passed in, so I needed a bypass.
-                if k == 'connection':
+# separates the positional arguments from the keyword arguments in a key
+_kwargs_mark = object()
+
+def _create_storage(maxsize, strategy, ttl, counters):
+    if strategy is Strategy.lru:
+        return LRU(maxsize, callback=counters.on_evict)
+    elif strategy is Strategy.raw:
+        return {}
+    else:
+        return ExpiringCache(maxsize, ttl, lru=strategy is Strategy.lru_ttl)
+
+def _create_key_builder(func, ignore, key_funcs):
+    # the names of the parameters that can be passed positionally
+    # so we can tell which argument is which without binding a signature
+    positional = tuple(
+        p.name for p in inspect.signature(func).parameters.values()
+        if p.kind in (p.POSITIONAL_ONLY, p.POSITIONAL_OR_KEYWORD)
+    )
+    rewrites_args = any(name in ignore or name in key_funcs for name in positional)
+
+    def _make_key(args, kwargs):
+        # the fast path is just the argument tuple itself
+        if rewrites_args:
+            parts = []
+            for name, value in zip(positional, args):
+                if name in ignore:
                     continue
+                key_func = key_funcs.get(name)
+                parts.append(value if key_func is None else key_func(value))
 
-                key.append(_true_repr(k))
-                key.append(_true_repr(v))
+            # anything that didn't get zipped is from a *args parameter
+            parts.extend(args[len(positional):])
+            key = tuple(parts)
+        else:
+            key = args
 
-            return ''.join(key)
+        if kwargs:
+            parts = []
+            for name, value in kwargs.items():
+                # e.g. asyncpg.Connection objects, we don't care which
+                # connection is passed in so it shouldn't be in the key.
+                if name in ignore:
+                    continue
+                key_func = key_funcs.get(name)
+                parts.append(name)
+                parts.append(value if key_func is None else key_func(value))
+
+            if parts:
+                key += (_kwargs_mark, *parts)
+
+        return key
+
+    return _make_key
+
+class _Preload:
+    """Fills a cache in bulk, see the ``preload`` attribute of cached functions.
+
+    Keys that were invalidated since it started, or that were looked up
+    in the meantime, are skipped since the bulk data is older than they
+    are. Once ``limit`` entries are primed the rest are skipped too.
+    """
+
+    __slots__ = ('_active', '_make_key', '_storage', '_pending', 'limit', 'primed', 'invalidated', 'cleared')
+
+    def __init__(self, active, make_key, storage, pending, limit):
+        self._active = active
+        self._make_key = make_key
+        self._storage = storage
+        self._pending = pending
+        self.limit = limit
+        self.primed = 0
+        self.invalidated = set()
+        self.cleared = False
+
+    def __enter__(self):
+        self._active.append(self)
+        return self
+
+    def __exit__(self, *args):
+        self._active.remove(self)
+
+    @property
+    def full(self):
+        return self.limit is not None and self.primed >= self.limit
+
+    def prime(self, value, *args, **kwargs):
+        if self.cleared or self.full:
+            return
+
+        key = self._make_key(args, kwargs)
+        if key in self.invalidated or key in self._pending or key in self._storage:
+            return
+
+        self._storage[key] = value
+        self.primed += 1
+
+def _attach(wrapper, func, *, storage, pending, counters, make_key, strategy, maxsize):
+    name = func.__qualname__
+
+    # the preloads that are currently running
+    preloads = []
+
+    def _drop(key):
+        for preload in preloads:
+            preload.invalidated.add(key)
+
+        # drop the in-flight lookup too so it doesn't store a stale value
+        pending.pop(key, None)
+        try:
+            del storage[key]
+        except KeyError:
+            return False
+        else:
+            return True
+
+    def _invalidate(*args, **kwargs):
+        key = make_key(args, kwargs)
+        if _bus is not None:
+            _bus.publish(name, key)
+        return _drop(key)
+
+    def _prime(value, *args, **kwargs):
+        # a lookup that's in-flight is older than this value
+        key = make_key(args, kwargs)
+        pending.pop(key, None)
+        storage[key] = value
+
+    def _clear():
+        for preload in preloads:
+            preload.cleared = True
+
+        pending.clear()
+        storage.clear()
+
+    def _preload():
+        # the cache keeps at most maxsize entries so there's no point in priming more
+        limit = None if strategy is Strategy.raw else maxsize
+        return _Preload(preloads, make_key, storage, pending, limit)
+
+    def _stats():
+        c = counters
+        if isinstance(storage, ExpiringCache):
+            evictions, expirations = storage.evictions, storage.expirations
+        else:
+            evictions, expirations = c.evictions, 0
+
+        size = None if strategy is Strategy.raw else maxsize
+        return CacheStats(c.hits, c.misses, c.coalesced, evictions, expirations, len(storage), size)
+
+    wrapper.cache = storage
+    wrapper.get_key = lambda *args, **kwargs: make_key(args, kwargs)
+    wrapper.invalidate = _invalidate
+    wrapper.prime = _prime
+    wrapper.preload = _preload
+    wrapper.clear = _clear
+    wrapper.get_stats = _stats
+    wrapper._drop_key = _drop
+    _registry[name] = wrapper
+    return wrapper
+
+def cache(maxsize=128, strategy=Strategy.lru, ttl=None, *, ignore=('connection',), key=None):
+    """Caches the result of a function based on its arguments.
+
+    The cache key is a tuple of the arguments passed, so every argument
+    that makes it into the key must be hashable.
+
+    Parameters
+    -----------
+    maxsize: Optional[int]
+        The maximum number of entries to keep. Ignored for :attr:`Strategy.raw`.
+    strategy: :class:`Strategy`
+        The eviction strategy to use.
+    ttl: Optional[float]
+        How many seconds an entry lives for. Required for
+        :attr:`Strategy.ttl` and :attr:`Strategy.lru_ttl`.
+    ignore: Iterable[str]
+        The parameter names that are not part of the key.
+        Defaults to ``('connection',)``.
+    key: Optional[Dict[str, Callable]]
+        A mapping of parameter name to a function that returns the
+        value to use in the key for that argument, e.g.
+        ``key={'self': lambda self: None}``.
+    """
+
+    ignore = frozenset(ignore)
+    key_funcs = key or {}
+
+    if strategy in (Strategy.ttl, Strategy.lru_ttl) and ttl is None:
+        raise TypeError(f'{strategy} requires a ttl.')
+
+    def decorator(func):
+        _counters = _Counters()
+        _internal_cache = _create_storage(maxsize, strategy, ttl, _counters)
+        _make_key = _create_key_builder(func, ignore, key_funcs)
+
+        # key: asyncio.Future for the lookup that is currently running
+        _pending = {}
+        is_coroutine = asyncio.iscoroutinefunction(func)
+
+        async def _load(key, future, args, kwargs):
+            try:
+                value = await func(*args, **kwargs)
+            except asyncio.CancelledError:
+                # only happens when the loop is shutting down
+                future.cancel()
+                raise
+            except Exception as e:
+                # errors are given to every waiter but never cached
+                future.set_exception(e)
+                # mark it as retrieved in case there were no waiters
+                future.exception()
+            else:
+                future.set_result(value)
+                # if we got invalidated mid-flight then the value is stale
+                if _pending.get(key) is future:
+                    _internal_cache[key] = value
+            finally:
+                if _pending.get(key) is future:
+                    del _pending[key]
+
+        async def _single_flight(key, args, kwargs):
+            # by the time we're scheduled someone else might have filled it
+            try:
+                return _internal_cache[key]
+            except KeyError:
+                pass
+
+            try:
+                future = _pending[key]
+            except KeyError:
+                # the lookup runs in its own task so that cancelling whoever
+                # started it doesn't cancel it for everyone piggybacking on it
+                _counters.misses += 1
+                _pending[key] = future = asyncio.get_event_loop().create_future()
+                asyncio.ensure_future(_load(key, future, args, kwargs))
+            else:
+                _counters.coalesced += 1
+
+            # the shield is so a cancelled waiter doesn't cancel everyone else
+            return await asyncio.shield(future)
 
         @wraps(func)
         def wrapper(*args, **kwargs):
@@ -60,6 +415,10 @@ def cache(maxsize=128, strategy=Strategy.lru):
             try:
                 value = _internal_cache[key]
             except KeyError:
+                if is_coroutine:
+                    return _single_flight(key, args, kwargs)
+
+                _counters.misses += 1
                 value = func(*args, **kwargs)
 
                 if inspect.isawaitable(value):
@@ -68,21 +427,310 @@ def cache(maxsize=128, strategy=Strategy.lru):
                 _internal_cache[key] = value
                 return value
             else:
-                if asyncio.iscoroutinefunction(func):
+                _counters.hits += 1
+                if is_coroutine:
                     return _wrap_new_coroutine(value)
                 return value
 
-        def _invalidate(*args, **kwargs):
+        return _attach(wrapper, func, storage=_internal_cache, pending=_pending, counters=_counters,
+                                      make_key=_make_key, strategy=strategy, maxsize=maxsize)
+    return decorator
+
+def batched(maxsize=128, strategy=Strategy.lru, ttl=None, *, ignore=('connection',), key=None):
+    """Like :func:`cache` except that cache misses are loaded in bulk.
+
+    The decorated coroutine is called with a list of every key that missed
+    during the same event loop iteration in place of its last positional
+    argument and must return a mapping of key to value. Keys missing from the
+    mapping resolve to ``None``. Callers still look up a single key, which
+    has to be passed positionally as the last argument: ::
+
+        @cache.batched()
+        async def get_config(self, guild_ids, *, connection=None):
+            connection = connection or self.bot.pool
+            query = "SELECT * FROM config WHERE id = ANY($1::bigint[]);"
+            records = await connection.fetch(query, guild_ids)
+            return {r['id']: r for r in records}
+
+        config = await self.get_config(guild_id)
+
+    The bulk call runs in its own task on behalf of many callers, so
+    the arguments in ``ignore`` (e.g. ``connection``) are not passed to it.
+    A miss that passes one of them anyway skips the batch and is loaded on
+    its own with them, so it can see the uncommitted writes of its
+    connection. Its result isn't cached if that connection is in a transaction.
+
+    The parameters are the same as :func:`cache`.
+    """
+
+    ignore = frozenset(ignore)
+    key_funcs = key or {}
+
+    if strategy in (Strategy.ttl, Strategy.lru_ttl) and ttl is None:
+        raise TypeError(f'{strategy} requires a ttl.')
+
+    def decorator(func):
+        _counters = _Counters()
+        _internal_cache = _create_storage(maxsize, strategy, ttl, _counters)
+        _make_key = _create_key_builder(func, ignore, key_funcs)
+
+        positional = [
+            p for p in inspect.signature(func).parameters.values()
+            if p.kind in (p.POSITIONAL_ONLY, p.POSITIONAL_OR_KEYWORD)
+        ]
+        if not positional:
+            raise TypeError(f'{func.__qualname__} needs a positional parameter for the keys to look up.')
+
+        # key: asyncio.Future for the lookup that is currently running
+        _pending = {}
+
+        # group: { item: [(key, future)] } for the batch that hasn't been sent yet
+        # a group is the rest of the arguments, e.g. the self parameter
+        _batches = {}
+
+        async def _load(batch, args, kwargs):
+            try:
+                result = await func(*args, list(batch), **kwargs)
+            except asyncio.CancelledError:
+                # this task belongs to no caller, so this only happens
+                # when the loop is shutting down
+                for waiters in batch.values():
+                    for key, future in waiters:
+                        if _pending.get(key) is future:
+                            del _pending[key]
+                        future.cancel()
+                raise
+            except Exception as e:
+                # errors are given to every waiter but never cached, this task
+                # doesn't re-raise since nobody is around to retrieve it.
+                for waiters in batch.values():
+                    for key, future in waiters:
+                        if _pending.get(key) is future:
+                            del _pending[key]
+                        future.set_exception(e)
+                        future.exception()
+                return
+
+            for item, waiters in batch.items():
+                value = result.get(item)
+                for key, future in waiters:
+                    # if we got invalidated mid-flight then the value is stale
+                    if _pending.get(key) is future:
+                        del _pending[key]
+                        _internal_cache[key] = value
+                    future.set_result(value)
+
+        def _dispatch(group, args, kwargs):
+            batch = _batches.pop(group)
+            asyncio.ensure_future(_load(batch, args, kwargs))
+
+        async def _load_alone(key, args, kwargs):
+            _counters.misses += 1
+            item = args[-1]
+            result = await func(*args[:-1], [item], **kwargs)
+            value = result.get(item)
+            if not any(_in_transaction(kwargs[name]) for name in kwargs if name in ignore):
+                _internal_cache[key] = value
+            return value
+
+        async def _lookup(key, args, kwargs):
+            # by the time we're scheduled someone else might have filled it
+            try:
+                return _internal_cache[key]
+            except KeyError:
+                pass
+
+            if any(kwargs.get(name) is not None for name in ignore):
+                return await _load_alone(key, args, kwargs)
+
+            try:
+                future = _pending[key]
+            except KeyError:
+                pass
+            else:
+                _counters.coalesced += 1
+                return await asyncio.shield(future)
+
+            _counters.misses += 1
+            loop = asyncio.get_event_loop()
+            _pending[key] = future = loop.create_future()
+
+            rest, item = args[:-1], args[-1]
+            group = _make_key(rest, kwargs)
             try:
-                del _internal_cache[_make_key(args, kwargs)]
+                batch = _batches[group]
             except KeyError:
-                return False
+                # the first miss of this iteration schedules the bulk call
+                # for the next one, everything until then joins the batch
+                batch = _batches[group] = {}
+                kwargs = {k: v for k, v in kwargs.items() if k not in ignore}
+                loop.call_soon(_dispatch, group, rest, kwargs)
+
+            batch.setdefault(item, []).append((key, future))
+            return await asyncio.shield(future)
+
+        @wraps(func)
+        def wrapper(*args, **kwargs):
+            if len(args) != len(positional):
+                # otherwise the last positional argument isn't the item and we'd batch the wrong thing
+                raise TypeError(f'{func.__qualname__} takes {positional[-1].name} as its last positional argument.')
+
+            key = _make_key(args, kwargs)
+            try:
+                value = _internal_cache[key]
+            except KeyError:
+                return _lookup(key, args, kwargs)
             else:
-                return True
+                _counters.hits += 1
+                return _wrap_new_coroutine(value)
 
-        wrapper.cache = _internal_cache
-        wrapper.get_key = lambda *args, **kwargs: _make_key(args, kwargs)
-        wrapper.invalidate = _invalidate
-        wrapper.get_stats = _stats
-        return wrapper
+        return _attach(wrapper, func, storage=_internal_cache, pending=_pending, counters=_counters,
+                                      make_key=_make_key, strategy=strategy, maxsize=maxsize)
     return decorator
+
+# the running InvalidationBus, if any
+_bus = None
+
+def _encode_key(key):
+    try:
+        index = key.index(_kwargs_mark)
+    except ValueError:
+        return [list(key), []]
+    else:
+        return [list(key[:index]), list(key[index + 1:])]
+
+def _decode_key(data):
+    args, kwargs = data
+    if kwargs:
+        return (*args, _kwargs_mark, *kwargs)
+    return tuple(args)
+
+class InvalidationBus:
+    """Broadcasts cache invalidations to every other process using the
+    same database through PostgreSQL's LISTEN/NOTIFY.
+
+    When a cached function is invalidated, the key is sent over ``channel``
+    and every other process drops its own copy of the entry. Only keys that
+    can be serialised to JSON are broadcast, so cached methods should
+    ignore ``self``, e.g. ``ignore=('self', 'connection')``.
+
+    If the listening connection is lost then every cache is cleared once it
+    comes back, since any invalidation sent in the meantime was missed.
+    Until :meth:`start` is called or if broadcasting fails, invalidations
+    are local only and the other processes will only catch up on expiry.
+
+    Parameters
+    -----------
+    pool: asyncpg.pool.Pool
+        The pool to send notifications with. One connection is held
+        for as long as the bus is running to listen with.
+    channel: str
+        The channel to notify and listen to.
+    check_interval: float
+        How often to check if the listening connection is still alive.
+    """
+
+    def __init__(self, pool, *, channel='cache_invalidation', check_interval=5.0, loop=None):
+        self.pool = pool
+        self.channel = channel
+        self.check_interval = check_interval
+        self.loop = loop or asyncio.get_event_loop()
+        self.connected = False
+
+        # to ignore our own notifications
+        self.id = uuid.uuid4().hex
+        self._queue = asyncio.Queue()
+        self._tasks = []
+
+    def start(self):
+        global _bus
+        _bus = self
+        self._tasks = [self.loop.create_task(self._listen()), self.loop.create_task(self._send())]
+
+    def close(self):
+        global _bus
+        if _bus is self:
+            _bus = None
+
+        for task in self._tasks:
+            task.cancel()
+        self._tasks = []
+
+    def publish(self, name, key):
+        try:
+            payload = json.dumps({'id': self.id, 'name': name, 'key': _encode_key(key)})
+        except TypeError:
+            log.debug('Not broadcasting invalidation for %s, the key is not serialisable.', name)
+            return
+
+        self._queue.put_nowait(payload)
+
+    async def _send(self):
+        while True:
+            payload = await self._queue.get()
+            try:
+                await self.pool.execute('SELECT pg_notify($1, $2);', self.channel, payload)
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                log.exception('Could not broadcast cache invalidation %s.', payload)
+
+    def _on_notification(self, connection, pid, channel, payload):
+        try:
+            data = json.loads(payload)
+            if data['id'] == self.id:
+                return
+
+            wrapper = _registry.get(data['name'])
+            key = _decode_key(data['key'])
+        except (ValueError, KeyError, TypeError):
+            log.warning('Received a malformed cache invalidation: %s', payload)
+            return
+
+        if wrapper is not None:
+            wrapper._drop_key(key)
+
+    async def _listen(self):
+        backoff = 1.0
+        reconnecting = False
+        while True:
+            try:
+                con = await self.pool.acquire()
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                log.exception('Could not acquire a connection for cache invalidations, retrying in %.0fs.', backoff)
+                await asyncio.sleep(backoff)
+                backoff = min(backoff * 2, 60.0)
+                continue
+
+            try:
+                await con.add_listener(self.channel, self._on_notification)
+                if reconnecting:
+                    # we were deaf for a while so nothing is trustworthy
+                    log.info('Cache invalidation listener reconnected, clearing every cache.')
+                    for wrapper in _registry.values():
+                        wrapper.clear()
+
+                self.connected = True
+                backoff = 1.0
+                while not con.is_closed():
+                    await asyncio.sleep(self.check_interval)
+
+                log.warning('Cache invalidation listener lost its connection.')
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                log.exception('Cache invalidation listener failed.')
+            finally:
+                self.connected = False
+                reconnecting = True
+                try:
+                    if not con.is_closed():
+                        await con.remove_listener(self.channel, self._on_notification)
+                    await self.pool.release(con)
+                except Exception:
+                    pass
+
+            await asyncio.sleep(backoff)
+            backoff = min(backoff * 2, 60.0)
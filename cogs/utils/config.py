@@ -2,6 +2,7 @@ import json
 import os
 import uuid
 import asyncio
+import weakref
 
 def _create_encoder(cls):
     def _default(self, o):
@@ -11,13 +12,55 @@ def _create_encoder(cls):
 
     return type('_Encoder', (json.JSONEncoder,), { 'default': _default })
 
+# every Config that defers its writes or keeps a journal open, so they can be flushed on shutdown
+_write_behind = weakref.WeakSet()
+
 class Config:
-    """The "database" object. Internally based on ``json``."""
+    """The "database" object. Internally based on ``json``.
+
+    If ``flush_interval`` is passed then writes are deferred. :meth:`put`,
+    :meth:`remove` and :meth:`save` only mark the data as dirty and it is
+    written to disk at most once every ``flush_interval`` seconds. Use
+    :meth:`flush` or :meth:`flush_all` to write it out right away.
+
+    If ``backend='journal'`` is passed then :meth:`put` and :meth:`remove`
+    append a single line to ``<name>.journal`` instead of rewriting the
+    whole file. The file itself becomes a snapshot that the journal is
+    replayed on top of when loading, and it is rewritten (compacted) once
+    the journal grows past ``compact_after`` bytes or when :meth:`save`
+    is called. ``fsync`` controls when the journal is synced to disk,
+    either ``'always'``, ``'interval'`` (every ``fsync_interval`` seconds)
+    or ``'never'`` to leave it up to the OS.
+
+    Cogs should call :meth:`close` when they're unloaded so nothing is
+    left pending for the instance that replaces them.
+    """
 
     def __init__(self, name, **options):
         self.name = name
         self.object_hook = options.pop('object_hook', None)
         self.encoder = options.pop('encoder', None)
+        self.flush_interval = options.pop('flush_interval', None)
+        self._dirty = False
+        self._flusher = None
+
+        self.backend = options.pop('backend', 'json')
+        if self.backend not in ('json', 'journal'):
+            raise ValueError(f'unknown config backend {self.backend!r}')
+
+        self.fsync = options.pop('fsync', 'always')
+        if self.fsync not in ('always', 'interval', 'never'):
+            raise ValueError(f'unknown fsync policy {self.fsync!r}')
+
+        self.fsync_interval = options.pop('fsync_interval', 1.0)
+        self.compact_after = options.pop('compact_after', 1024 * 1024)
+        self.journal_name = f'{name}.journal'
+        self._journal = None
+        # which journal file we know about and how much of it, see _owns_journal
+        self._journal_id = None
+        self._journal_size = 0
+        self._syncer = None
+        self._compacting = False
 
         try:
             hook = options.pop('hook')
@@ -34,6 +77,9 @@ class Config:
         else:
             self.load_from_file()
 
+        if self.flush_interval is not None or self.backend == 'journal':
+            _write_behind.add(self)
+
     def load_from_file(self):
         try:
             with open(self.name, 'r') as f:
@@ -41,21 +87,211 @@ class Config:
         except FileNotFoundError:
             self._db = {}
 
+        if self.backend == 'journal' and self._replay():
+            # start from a clean journal so a torn line from a crash
+            # doesn't hide whatever gets appended after it
+            self._compact(self._db.copy())
+
+    def _replay(self):
+        try:
+            fp = open(self.journal_name, 'r', encoding='utf-8')
+        except FileNotFoundError:
+            return False
+
+        replayed = False
+        with fp:
+            for line in fp:
+                replayed = True
+                try:
+                    op, key, *value = json.loads(line, object_hook=self.object_hook)
+                except ValueError:
+                    # a partially written line, nothing after it can be trusted
+                    break
+
+                if op == 'put':
+                    self._db[key] = value[0]
+                else:
+                    self._db.pop(key, None)
+
+            self._track_journal(fp)
+
+        return replayed
+
     async def load(self):
         with await self.lock:
             await self.loop.run_in_executor(None, self.load_from_file)
 
-    def _dump(self):
+    def _dump(self, data):
         temp = '%s-%s.tmp' % (uuid.uuid4(), self.name)
         with open(temp, 'w', encoding='utf-8') as tmp:
-            json.dump(self._db.copy(), tmp, ensure_ascii=True, cls=self.encoder, separators=(',', ':'))
+            json.dump(data, tmp, ensure_ascii=True, cls=self.encoder, separators=(',', ':'))
+            if self.backend == 'journal':
+                # the journal is truncated right after this so the snapshot
+                # has to actually be on disk first
+                tmp.flush()
+                os.fsync(tmp.fileno())
 
         # atomically move the file
         os.replace(temp, self.name)
 
-    async def save(self):
+    def _track_journal(self, fp):
+        stat = os.fstat(fp.fileno())
+        self._journal_id = (stat.st_dev, stat.st_ino)
+        self._journal_size = stat.st_size
+
+    def _owns_journal(self):
+        # if another instance, e.g. the one from a reloaded cog, replaced or appended
+        # to the journal since we last saw it then emptying it would lose lines we never saw
+        try:
+            stat = os.stat(self.journal_name)
+        except FileNotFoundError:
+            return True
+
+        return (stat.st_dev, stat.st_ino) == self._journal_id and stat.st_size == self._journal_size
+
+    def _compact(self, data):
+        self._dump(data)
+
+        # replaying the old journal on top of the new snapshot is harmless
+        # so it's fine if we die between the two replaces, or if the journal
+        # isn't ours to empty and is left for the next compaction
+        if not self._owns_journal():
+            return
+
+        if self._journal is not None:
+            self._journal.close()
+
+        # a new file rather than truncating this one so an instance that still
+        # holds the old one can tell that it isn't theirs to compact anymore
+        temp = '%s-%s.tmp' % (uuid.uuid4(), self.journal_name)
+        self._journal = open(temp, 'a', encoding='utf-8', newline='')
+        os.replace(temp, self.journal_name)
+        self._track_journal(self._journal)
+
+    def _append_line(self, line):
+        if self._journal is None:
+            self._journal = open(self.journal_name, 'a', encoding='utf-8', newline='')
+            if self._journal_id is None:
+                # there was no journal when we loaded, anything already in it isn't ours
+                stat = os.fstat(self._journal.fileno())
+                self._journal_id = (stat.st_dev, stat.st_ino)
+
+        self._journal.write(line)
+        self._journal.flush()
+        if self.fsync == 'always':
+            os.fsync(self._journal.fileno())
+
+        # only count what we wrote ourselves, the lines are plain ASCII
+        self._journal_size += len(line)
+        return self._journal.tell()
+
+    def _sync_journal(self):
+        if self._journal is not None:
+            os.fsync(self._journal.fileno())
+
+    async def _append(self, entry):
+        line = json.dumps(entry, ensure_ascii=True, cls=self.encoder, separators=(',', ':')) + '\n'
+        with await self.lock:
+            size = await self.loop.run_in_executor(None, self._append_line, line)
+
+        if self.fsync == 'interval' and self._syncer is None:
+            self._syncer = self.loop.call_later(self.fsync_interval, self._schedule_sync)
+
+        if size >= self.compact_after and not self._compacting:
+            self._compacting = True
+            self.loop.create_task(self.compact())
+
+    def _schedule_sync(self):
+        self._syncer = None
+        self.loop.create_task(self._run_sync())
+
+    async def _run_sync(self):
+        with await self.lock:
+            await self.loop.run_in_executor(None, self._sync_journal)
+
+    async def compact(self):
+        """Writes a new snapshot and empties the journal."""
+        try:
+            await self._write()
+        finally:
+            self._compacting = False
+
+    async def _write(self):
+        writer = self._compact if self.backend == 'journal' else self._dump
         with await self.lock:
-            await self.loop.run_in_executor(None, self._dump)
+            # copy here rather than in the executor so it doesn't race with us
+            await self.loop.run_in_executor(None, writer, self._db.copy())
+
+    def _mark_dirty(self):
+        self._dirty = True
+        if self._flusher is None:
+            self._flusher = self.loop.call_later(self.flush_interval, self._schedule_flush)
+
+    def _schedule_flush(self):
+        self._flusher = None
+        self.loop.create_task(self.flush())
+
+    async def save(self):
+        if self.flush_interval is not None:
+            self._mark_dirty()
+        else:
+            await self._write()
+
+    async def flush(self):
+        """Writes any pending changes to disk."""
+        if self._flusher is not None:
+            self._flusher.cancel()
+            self._flusher = None
+
+        if not self._dirty:
+            return
+
+        self._dirty = False
+        try:
+            await self._write()
+        except Exception:
+            # try again later
+            self._mark_dirty()
+            raise
+
+    @classmethod
+    async def flush_all(cls):
+        """Writes the pending changes of every deferred config to disk."""
+        for config in list(_write_behind):
+            await config.flush()
+
+    def close(self):
+        """Writes any pending changes to disk right away and stops the timers.
+
+        This blocks rather than waiting for the lock so that it can be called
+        from a cog's ``__unload``, before the reloaded cog reads the file.
+        The config shouldn't be used afterwards.
+        """
+        for timer in (self._flusher, self._syncer):
+            if timer is not None:
+                timer.cancel()
+
+        self._flusher = self._syncer = None
+        _write_behind.discard(self)
+
+        if self._dirty:
+            self._dirty = False
+            if self.backend == 'journal':
+                self._compact(self._db.copy())
+            else:
+                self._dump(self._db.copy())
+
+        if self._journal is not None:
+            self._journal.flush()
+            os.fsync(self._journal.fileno())
+            self._journal.close()
+            self._journal = None
+
+    @classmethod
+    def close_all(cls):
+        """Closes every config that defers its writes or keeps a journal open."""
+        for config in list(_write_behind):
+            config.close()
 
     def get(self, key, *args):
         """Retrieves a config entry."""
@@ -63,13 +299,21 @@ class Config:
 
     async def put(self, key, value, *args):
         """Edits a config entry."""
-        self._db[str(key)] = value
-        await self.save()
+        key = str(key)
+        self._db[key] = value
+        if self.backend == 'journal':
+            await self._append(['put', key, value])
+        else:
+            await self.save()
 
     async def remove(self, key):
         """Removes a config entry."""
-        del self._db[str(key)]
-        await self.save()
+        key = str(key)
+        del self._db[key]
+        if self.backend == 'journal':
+            await self._append(['del', key])
+        else:
+            await self.save()
 
     def __contains__(self, item):
         return str(item) in self._db
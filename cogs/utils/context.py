@@ -1,28 +1,104 @@
 from discord.ext import commands
+from . import db
 import asyncio
+import logging
+
+log = logging.getLogger(__name__)
 
 class _ContextDBAcquire:
-    __slots__ = ('ctx', 'timeout')
+    __slots__ = ('ctx', 'timeout', 'readonly')
 
-    def __init__(self, ctx, timeout):
+    def __init__(self, ctx, timeout, readonly):
         self.ctx = ctx
         self.timeout = timeout
+        self.readonly = readonly
 
     def __await__(self):
-        return self.ctx._acquire(self.timeout).__await__()
+        return self.ctx._acquire(self.timeout, self.readonly).__await__()
 
     async def __aenter__(self):
-        await self.ctx._acquire(self.timeout)
-        return self.ctx.db
+        return await self.ctx._acquire(self.timeout, self.readonly)
 
     async def __aexit__(self, *args):
         await self.ctx.release()
 
+def _forward(name, *, write=False):
+    async def method(self, *args, **kwargs):
+        con = await self._ctx._acquire(None, write=write)
+        return await getattr(con, name)(*args, **kwargs)
+
+    method.__name__ = name
+    return method
+
+class _LazyTransaction:
+    __slots__ = ('ctx', 'kwargs', 'transaction')
+
+    def __init__(self, ctx, kwargs):
+        self.ctx = ctx
+        self.kwargs = kwargs
+        self.transaction = None
+
+    async def start(self):
+        con = await self.ctx._acquire(None, write=not self.kwargs.get('readonly', False))
+        self.transaction = con.transaction(**self.kwargs)
+        await self.transaction.start()
+
+    async def commit(self):
+        await self.transaction.commit()
+
+    async def rollback(self):
+        await self.transaction.rollback()
+
+    async def __aenter__(self):
+        await self.start()
+
+    async def __aexit__(self, *args):
+        return await self.transaction.__aexit__(*args)
+
+class _LazyConnection:
+    """Stands in for :attr:`Context.db`.
+
+    A connection is only acquired from the pool the first time a query is
+    made through it, so commands that never touch the database don't hold
+    one for their whole run. It is released by the bot after invoke.
+    """
+
+    __slots__ = ('_ctx',)
+
+    def __init__(self, ctx):
+        self._ctx = ctx
+
+    # writes go to the primary even after ctx.acquire(readonly=True)
+    execute = _forward('execute', write=True)
+    executemany = _forward('executemany', write=True)
+    fetch = _forward('fetch')
+    fetchrow = _forward('fetchrow')
+    fetchval = _forward('fetchval')
+    prepare = _forward('prepare')
+    copy_records_to_table = _forward('copy_records_to_table', write=True)
+    copy_to_table = _forward('copy_to_table', write=True)
+    copy_from_query = _forward('copy_from_query')
+
+    def transaction(self, **kwargs):
+        return _LazyTransaction(self._ctx, kwargs)
+
+    def __getattr__(self, name):
+        con = self._ctx._connection
+        if con is None:
+            raise AttributeError(f'{name!r} needs an acquired connection, use ctx.acquire() first')
+        return getattr(con, name)
+
+    def __repr__(self):
+        return f'<_LazyConnection connection={self._ctx._connection!r}>'
+
 class Context(commands.Context):
     def __init__(self, **kwargs):
         super().__init__(**kwargs)
         self.pool = self.bot.pool
-        self.db = None
+        self._connection = None
+        self._connection_pool = None
+        self.used_db = False
+        self.db = _LazyConnection(self)
 
     async def entry_to_code(self, entries):
         width = max(len(a) for a, b in entries)
@@ -64,22 +140,19 @@ class Context(commands.Context):
         await self.release()
 
         # only give them 3 tries.
-        try:
-            for i in range(3):
-                try:
-                    message = await self.bot.wait_for('message', check=check, timeout=30.0)
-                except asyncio.TimeoutError:
-                    raise ValueError('Took too long. Goodbye.')
-
-                index = int(message.content)
-                try:
-                    return matches[index - 1]
-                except:
-                    await self.send(f'Please give me a valid number. {2 - i} tries remaining...')
-
-            raise ValueError('Too many tries. Goodbye.')
-        finally:
-            await self.acquire()
+        for i in range(3):
+            try:
+                message = await self.bot.wait_for('message', check=check, timeout=30.0)
+            except asyncio.TimeoutError:
+                raise ValueError('Took too long. Goodbye.')
+
+            index = int(message.content)
+            try:
+                return matches[index - 1]
+            except:
+                await self.send(f'Please give me a valid number. {2 - i} tries remaining...')
+
+        raise ValueError('Too many tries. Goodbye.')
 
     async def prompt(self, message, *, timeout=60.0, delete_after=True, reacquire=True, author_id=None):
         """An interactive reaction confirmation dialog.
@@ -93,8 +166,8 @@ class Context(commands.Context):
         delete_after: bool
             Whether to delete the confirmation message after we're done.
         reacquire: bool
-            Whether to release the database connection and then acquire it
-            again when we're done.
+            Whether to release the database connection while waiting. It is
+            acquired again the next time :attr:`db` is used.
         author_id: Optional[int]
             The member who should respond to the prompt. Defaults to the author of the
             Context's message.
@@ -146,9 +219,6 @@ class Context(commands.Context):
             confirm = None
 
         try:
-            if reacquire:
-                await self.acquire()
-
             if delete_after:
                 await msg.delete()
         finally:
@@ -160,13 +230,44 @@ class Context(commands.Context):
             return f'{emoji}: {label}'
         return emoji
 
-    async def _acquire(self, timeout):
-        if self.db is None:
-            self.db = await self.pool.acquire(timeout=timeout)
-        return self.db
+    async def _acquire(self, timeout, readonly=False, *, write=False):
+        if write and self._connection is not None and self._connection_pool is not self.pool:
+            # we're on the replica from an earlier ctx.acquire(readonly=True),
+            # move back to the primary unless a transaction is holding us there
+            if self._connection.is_in_transaction():
+                raise RuntimeError('Cannot write through a read only connection inside a transaction.')
+            await self.release()
 
-    def acquire(self, *, timeout=None):
-        """Acquires a database connection from the pool. e.g. ::
+        if readonly and self._connection is not None:
+            # e.g. a check already used the primary, move over to the replica
+            # unless a transaction is open, then it has to stay put
+            pool = db.Table.read_pool()
+            if pool is not self._connection_pool:
+                if self._connection.is_in_transaction():
+                    log.warning('Read only connection requested by %s inside a transaction, staying on the primary.',
+                                self.command and self.command.qualified_name)
+                else:
+                    await self.release()
+
+        if self._connection is None:
+            pool = db.Table.read_pool() if readonly else self.pool
+            self._connection = await pool.acquire(timeout=timeout)
+            self._connection_pool = pool
+            self.used_db = True
+        return self._connection
+
+    def acquire(self, *, timeout=None, readonly=False):
+        """Acquires a database connection from the pool right away.
+
+        This is rarely needed since :attr:`db` acquires one on first use,
+        except for commands that only read and can put up with slightly
+        stale data. Those can pass ``readonly=True`` to use the read
+        replica if there's a healthy one, a connection that was already
+        acquired from the primary is swapped for one unless it's in a
+        transaction. Writes through :attr:`db` (``execute``, ``executemany``,
+        the ``copy_*_to_table`` methods and transactions) move it back to
+        the primary. Queries that write through ``fetch`` and friends, e.g.
+        ``INSERT ... RETURNING``, should be done before acquiring one. e.g. ::
 
             async with ctx.acquire():
                 await ctx.db.execute(...)
@@ -179,7 +280,7 @@ class Context(commands.Context):
             finally:
                 await ctx.release()
         """
-        return _ContextDBAcquire(self, timeout)
+        return _ContextDBAcquire(self, timeout, readonly)
 
     async def release(self):
         """Releases the database connection from the pool.
@@ -192,9 +293,10 @@ class Context(commands.Context):
         # from source digging asyncpg source, releasing an already
         # released connection does nothing
 
-        if self.db is not None:
-            await self.bot.pool.release(self.db)
-            self.db = None
+        if self._connection is not None:
+            await self._connection_pool.release(self._connection)
+            self._connection = None
+            self._connection_pool = None
 
     async def show_help(self, command=None):
         """Shows the help command for the specified command if given.
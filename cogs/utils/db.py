@@ -37,12 +37,18 @@ import uuid
 import datetime
 import inspect
 import decimal
+import re
 import asyncpg
 import logging
 import asyncio
 
+from . import querystats
+from .querystats import InstrumentedConnection, InstrumentedPool
+
 log = logging.getLogger(__name__)
 
+_bounds = re.compile(r"FROM \((?:'([^']+)'|MINVALUE)\) TO \('([^']+)'\)")
+
 class SchemaError(Exception):
     pass
 
@@ -295,9 +301,9 @@ class Array(SQLType):
 
 class Column:
     __slots__ = ( 'column_type', 'index', 'primary_key', 'nullable',
-                  'default', 'unique', 'name', 'index_name' )
+                  'default', 'unique', 'name', 'index_name', 'backfill' )
     def __init__(self, column_type, *, index=False, primary_key=False,
-                 nullable=True, unique=False, default=None, name=None):
+                 nullable=True, unique=False, default=None, name=None, backfill=None):
 
         if inspect.isclass(column_type):
             column_type = column_type()
@@ -314,6 +320,9 @@ class Column:
         self.name = name
         self.index_name = None # to be filled later
 
+        # an SQL expression to fill in existing rows with when the column is added by a migration
+        self.backfill = backfill
+
         if sum(map(bool, (unique, primary_key, default is not None))) > 1:
             raise SchemaError("'unique', 'primary_key', and 'default' are mutually exclusive.")
 
@@ -347,7 +356,7 @@ class Column:
 
         return self.unique == other.unique and self.primary_key == other.primary_key
 
-    def _create_table(self):
+    def _create_table(self, *, constraints=True):
         builder = []
         builder.append(self.name)
         builder.append(self.column_type.to_sql())
@@ -361,9 +370,9 @@ class Column:
                 builder.append(str(default).upper())
             else:
                 builder.append("(%s)" % default)
-        elif self.unique:
+        elif self.unique and constraints:
             builder.append('UNIQUE')
-        elif self.primary_key:
+        elif self.primary_key and constraints:
             builder.append('PRIMARY KEY')
 
         if not self.nullable:
@@ -377,6 +386,198 @@ class PrimaryKeyColumn(Column):
     def __init__(self):
         super().__init__(Integer(auto_increment=True), primary_key=True)
 
+class Index:
+    """A table level index.
+
+    Unlike ``Column(index=True)`` this can span multiple columns or
+    expressions, be unique, use another access method or be partial.
+
+    If no name is given then it is named ``<table>_<attribute>_idx``
+    after the attribute it is assigned to.
+
+    Parameters
+    -----------
+    \*expressions: str
+        The column names or expressions to index, e.g. ``'LOWER(name)'``.
+    unique: bool
+        Whether this is a ``UNIQUE`` index.
+    using: Optional[str]
+        The index method to use, e.g. ``'gin'``.
+    ops: Optional[str]
+        The operator class to use for every expression, e.g. ``'gin_trgm_ops'``.
+    where: Optional[str]
+        The predicate for a partial index.
+    """
+
+    __slots__ = ('expressions', 'name', 'unique', 'using', 'ops', 'where')
+
+    def __init__(self, *expressions, name=None, unique=False, using=None, ops=None, where=None):
+        if not expressions:
+            raise SchemaError('An index needs at least one column or expression.')
+
+        self.expressions = list(expressions)
+        self.name = name
+        self.unique = unique
+        self.using = using.upper() if using else None
+        self.ops = ops
+        self.where = where
+
+    @classmethod
+    def from_dict(cls, data):
+        data = data.copy()
+        expressions = data.pop('expressions')
+        return cls(*expressions, **data)
+
+    def to_dict(self):
+        return { attr: getattr(self, attr) for attr in self.__slots__ }
+
+    def __eq__(self, other):
+        return isinstance(other, Index) and self.to_dict() == other.to_dict()
+
+    def __ne__(self, other):
+        return not self.__eq__(other)
+
+    def _create_index(self, table_name, *, concurrently=False):
+        builder = ['CREATE']
+        if self.unique:
+            builder.append('UNIQUE')
+
+        builder.append('INDEX')
+        if concurrently:
+            builder.append('CONCURRENTLY')
+
+        builder.append('IF NOT EXISTS')
+        builder.append(self.name)
+        builder.append('ON')
+        builder.append(table_name)
+
+        if self.using:
+            builder.append('USING')
+            builder.append(self.using)
+
+        if self.ops:
+            expressions = ('%s %s' % (expr, self.ops) for expr in self.expressions)
+        else:
+            expressions = self.expressions
+
+        builder.append('(%s)' % ', '.join(expressions))
+
+        if self.where:
+            builder.append('WHERE')
+            builder.append(self.where)
+
+        return ' '.join(builder) + ';'
+
+    def _drop_index(self, *, concurrently=False):
+        if concurrently:
+            return 'DROP INDEX CONCURRENTLY IF EXISTS %s;' % self.name
+        return 'DROP INDEX IF EXISTS %s;' % self.name
+
+class Range:
+    """Partitions a table by ranges of a timestamp column.
+
+    Every partition covers one ``interval`` and is named after the start of
+    it, e.g. ``commands_p2018_04`` for monthly partitions. A default partition
+    catches anything outside of them. ``premake`` is how many partitions past
+    the current one are created ahead of time by :meth:`Table.create_partitions`.
+
+    Parameters
+    -----------
+    column: str
+        The column to partition by.
+    interval: str
+        One of ``'1 day'``, ``'1 week'``, ``'1 month'`` or ``'1 year'``.
+    premake: int
+        How many future partitions to keep around.
+    """
+
+    __slots__ = ('column', 'interval', 'premake')
+
+    _formats = {
+        'day': '%Y_%m_%d',
+        'week': '%Y_%m_%d',
+        'month': '%Y_%m',
+        'year': '%Y',
+    }
+
+    def __init__(self, column, *, interval='1 month', premake=3):
+        count, _, unit = interval.partition(' ')
+        unit = unit.rstrip('s').lower()
+        if count != '1' or unit not in self._formats:
+            raise SchemaError('interval must be one of 1 day, 1 week, 1 month or 1 year')
+
+        self.column = column
+        self.interval = '1 %s' % unit
+        self.premake = premake
+
+    @property
+    def unit(self):
+        return self.interval[2:]
+
+    @classmethod
+    def from_dict(cls, data):
+        return cls(data['column'], interval=data['interval'], premake=data['premake'])
+
+    def to_dict(self):
+        return { attr: getattr(self, attr) for attr in self.__slots__ }
+
+    def __eq__(self, other):
+        # premake only matters at runtime so it doesn't need a migration
+        return isinstance(other, Range) and self.column == other.column and self.interval == other.interval
+
+    def __ne__(self, other):
+        return not self.__eq__(other)
+
+    def floor(self, dt):
+        """Returns the start of the partition ``dt`` falls in."""
+        dt = datetime.datetime(dt.year, dt.month, dt.day)
+        unit = self.unit
+        if unit == 'week':
+            return dt - datetime.timedelta(days=dt.weekday())
+        if unit == 'month':
+            return dt.replace(day=1)
+        if unit == 'year':
+            return dt.replace(month=1, day=1)
+        return dt
+
+    def next(self, start):
+        """Returns the start of the partition after the one starting at ``start``."""
+        unit = self.unit
+        if unit == 'day':
+            return start + datetime.timedelta(days=1)
+        if unit == 'week':
+            return start + datetime.timedelta(days=7)
+        if unit == 'month':
+            if start.month == 12:
+                return start.replace(year=start.year + 1, month=1)
+            return start.replace(month=start.month + 1)
+        return start.replace(year=start.year + 1)
+
+    def partition_name(self, table_name, start):
+        return '%s_p%s' % (table_name, start.strftime(self._formats[self.unit]))
+
+    def partitions(self, table_name, now=None):
+        """Yields ``(name, start, end)`` for the current partition and the premade ones."""
+        start = self.floor(now or datetime.datetime.utcnow())
+        for _ in range(self.premake + 1):
+            end = self.next(start)
+            yield self.partition_name(table_name, start), start, end
+            start = end
+
+    def create_partitions_sql(self, table_name, now=None, *, existing=()):
+        """Returns the statements that create the default, current and premade partitions.
+
+        Partitions overlapping one of the ``(start, end)`` ranges in ``existing``
+        are left out, e.g. the current one while the legacy partition still covers it.
+        """
+        fmt = "CREATE TABLE IF NOT EXISTS {0} PARTITION OF {1} FOR VALUES FROM ('{2}') TO ('{3}');"
+        statements = ['CREATE TABLE IF NOT EXISTS {0}_default PARTITION OF {0} DEFAULT;'.format(table_name)]
+        for name, start, end in self.partitions(table_name, now):
+            if any(start < taken_end and taken_start < end for taken_start, taken_end in existing):
+                continue
+            statements.append(fmt.format(name, table_name, start.isoformat(' '), end.isoformat(' ')))
+        return statements
+
 class SchemaDiff:
     __slots__ = ('table', 'upgrade', 'downgrade')
 
@@ -391,7 +592,13 @@ class SchemaDiff:
     def is_empty(self):
         return len(self.upgrade) == 0 and len(self.downgrade) == 0
 
-    def to_sql(self, *, downgrade=False):
+    def to_sql(self, *, downgrade=False, concurrent_indexes=False):
+        """Returns the SQL for this diff.
+
+        If ``concurrent_indexes`` is ``True`` then the table level indexes are
+        left out so they can be run separately through :meth:`index_sql`, since
+        ``CONCURRENTLY`` can't be used inside a transaction.
+        """
         statements = []
         base = 'ALTER TABLE %s ' % self.table.__tablename__
         path = self.upgrade if not downgrade else self.downgrade
@@ -433,23 +640,219 @@ class SchemaDiff:
                 fmt = 'ALTER COLUMN {0[name]} SET NOT NULL'.format(constraints)
                 sub_statements.append(fmt)
 
+        backfills = []
         for added in path.get('add_columns', []):
             column = Column.from_dict(added)
             sub_statements.append('ADD COLUMN ' + column._create_table())
+            if column.backfill is not None:
+                backfills.append('%s = %s' % (column.name, column.backfill))
 
         if sub_statements:
             statements.append(base + ', '.join(sub_statements) + ';')
 
+        if backfills:
+            statements.append('UPDATE %s SET %s;' % (self.table.__tablename__, ', '.join(backfills)))
+
+        partition = path.get('partition_by')
+        if partition is not None:
+            statements.extend(self._partition_sql(partition['before'], partition['after']))
+
         # handle the index creation bits
         for dropped in path.get('drop_index', []):
             statements.append('DROP INDEX IF EXISTS {0[index]};'.format(dropped))
 
+        # changing the partitioning already (re)creates the indexes so don't emit them twice
         for added in path.get('add_index', []):
             fmt = 'CREATE INDEX IF NOT EXISTS {0[index]} ON {1.__tablename__} ({0[name]});'
-            statements.append(fmt.format(added, self.table))
+            statement = fmt.format(added, self.table)
+            if statement not in statements:
+                statements.append(statement)
+
+        if not concurrent_indexes:
+            statements.extend(s for s in self.index_sql(downgrade=downgrade) if s not in statements)
 
         return '\n'.join(statements)
 
+    def _partition_sql(self, before, after):
+        table = self.table
+        name = table.__tablename__
+
+        if before is not None and after is not None:
+            raise SchemaError('Changing how %s is partitioned has to be done manually.' % name)
+
+        primary_keys = [c.name for c in table.columns if c.primary_key]
+        unique = [c.name for c in table.columns if c.unique]
+        serials = [c.name for c in table.columns if isinstance(c.column_type, Integer) and c.column_type.auto_increment]
+        statements = []
+
+        if after is not None:
+            # a regular table can't be turned into a partitioned one in place.
+            # instead the old table becomes the partition for everything up until
+            # the end of the current interval, since it already has some of its rows
+            partition = Range.from_dict(after)
+            legacy = name + '_legacy'
+            bound = partition.next(partition.floor(datetime.datetime.utcnow()))
+            key = partition.column
+
+            # rows without a partition key can't go in a range partition
+            statements.append('DELETE FROM %s WHERE %s IS NULL;' % (name, key))
+
+            # validating this ahead of time lets the ATTACH and SET NOT NULL below
+            # skip scanning the table while it's locked
+            check = '%s_%s_bound' % (legacy, key)
+            fmt = "ALTER TABLE {0} ADD CONSTRAINT {1} CHECK ({2} IS NOT NULL AND {2} < '{3}') NOT VALID;"
+            statements.append(fmt.format(name, check, key, bound.isoformat(' ')))
+            statements.append('ALTER TABLE %s VALIDATE CONSTRAINT %s;' % (name, check))
+            statements.append('ALTER TABLE %s RENAME TO %s;' % (name, legacy))
+
+            # free up the names for the new indexes, postgres attaches
+            # the matching old ones to them rather than building them again
+            old_indexes = ['%s_pkey' % name] if primary_keys else []
+            old_indexes.extend('%s_%s_key' % (name, column) for column in unique)
+            old_indexes.extend(c.index_name for c in table.columns if c.index)
+            old_indexes.extend(index.name for index in table.indexes)
+            for index in old_indexes:
+                statements.append('ALTER INDEX IF EXISTS {0} RENAME TO {0}_legacy;'.format(index))
+
+            fmt = 'CREATE TABLE {0} (LIKE {1} INCLUDING DEFAULTS) PARTITION BY RANGE ({2});'
+            statements.append(fmt.format(name, legacy, partition.column))
+
+            for column in serials:
+                statements.append('ALTER SEQUENCE {0}_{1}_seq OWNED BY {0}.{1};'.format(name, column))
+
+            for constraint in table._partitioned_constraints(partition.column):
+                statements.append('ALTER TABLE %s ADD %s;' % (name, constraint))
+
+            if primary_keys:
+                statements.append('ALTER TABLE %s ALTER COLUMN %s SET NOT NULL;' % (legacy, key))
+
+            statements.extend(table._index_statements())
+
+            fmt = "ALTER TABLE {0} ATTACH PARTITION {1} FOR VALUES FROM (MINVALUE) TO ('{2}');"
+            statements.append(fmt.format(name, legacy, bound.isoformat(' ')))
+            statements.append('ALTER TABLE %s DROP CONSTRAINT %s;' % (legacy, check))
+            statements.extend(partition.create_partitions_sql(name, existing=[(datetime.datetime.min, bound)]))
+        else:
+            partitioned = name + '_partitioned'
+            statements.append('ALTER TABLE %s RENAME TO %s;' % (name, partitioned))
+            statements.append('CREATE TABLE %s (LIKE %s INCLUDING DEFAULTS);' % (name, partitioned))
+            statements.append('INSERT INTO %s SELECT * FROM %s;' % (name, partitioned))
+
+            for column in serials:
+                statements.append('ALTER SEQUENCE {0}_{1}_seq OWNED BY {0}.{1};'.format(name, column))
+
+            # this takes the partitions and their indexes along with it
+            statements.append('DROP TABLE %s CASCADE;' % partitioned)
+
+            if primary_keys:
+                statements.append('ALTER TABLE %s ADD PRIMARY KEY (%s);' % (name, ', '.join(primary_keys)))
+
+            for column in unique:
+                statements.append('ALTER TABLE %s ADD UNIQUE (%s);' % (name, column))
+
+            statements.extend(table._index_statements())
+
+        return statements
+
+    def index_sql(self, *, downgrade=False, concurrently=False):
+        """Returns a list of statements that drop and create the table level indexes."""
+        path = self.upgrade if not downgrade else self.downgrade
+        statements = []
+
+        for dropped in path.get('remove_indexes', []):
+            statements.append(Index.from_dict(dropped)._drop_index(concurrently=concurrently))
+
+        for added in path.get('add_indexes', []):
+            index = Index.from_dict(added)
+            statements.append(index._create_index(self.table.__tablename__, concurrently=concurrently))
+
+        return statements
+
+    async def execute(self, con, *, downgrade=False, verbose=False):
+        """Runs the diff on the given connection.
+
+        When we're not inside a transaction, the indexes of regular tables
+        are built (and dropped) concurrently so the table isn't locked meanwhile.
+        """
+        # partitioned tables can't have their indexes built concurrently
+        path = self.upgrade if not downgrade else self.downgrade
+        partitioned = self.table.__partition__ is not None or 'partition_by' in path
+        concurrently = not partitioned and not con.is_in_transaction()
+        sql = self.to_sql(downgrade=downgrade, concurrent_indexes=concurrently)
+        if verbose:
+            print(sql)
+
+        if sql:
+            await con.execute(sql)
+
+        if concurrently:
+            # these can't be run as part of a multi-statement string
+            for statement in self.index_sql(downgrade=downgrade, concurrently=True):
+                if verbose:
+                    print(statement)
+                await con.execute(statement)
+
+class ReplicaMonitor:
+    """Keeps track of whether a read replica is fit to serve reads.
+
+    The replay lag is checked every ``interval`` seconds. If the replica
+    can't be reached or is more than ``max_lag`` seconds behind then
+    :attr:`healthy` is ``False`` and reads go to the primary instead.
+    """
+
+    # a server that isn't in recovery isn't replicating from anything,
+    # so it's as up to date as it's going to get
+    _lag_query = """SELECT CASE
+                        WHEN NOT pg_is_in_recovery() THEN 0
+                        WHEN pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() THEN 0
+                        ELSE EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp())
+                    END;
+                 """
+
+    def __init__(self, pool, *, max_lag=30.0, interval=10.0):
+        self.pool = pool
+        self.max_lag = max_lag
+        self.interval = interval
+        self.lag = None
+        self.healthy = False
+        self._task = None
+
+    async def check(self):
+        try:
+            lag = await self.pool.fetchval(self._lag_query, timeout=self.interval)
+        except (OSError, asyncio.TimeoutError, asyncpg.PostgresError) as e:
+            lag = None
+            reason = f'unreachable ({e.__class__.__name__})'
+        else:
+            reason = f'lagging by {lag:.2f}s' if lag is not None else 'has not replayed anything'
+
+        self.lag = lag
+        healthy = lag is not None and lag <= self.max_lag
+        if healthy != self.healthy:
+            if healthy:
+                log.info('Read replica is healthy again, lag is %.2fs.', lag)
+            else:
+                log.warning('Read replica is %s, falling back to the primary.', reason)
+        self.healthy = healthy
+
+    async def _monitor(self):
+        while True:
+            await asyncio.sleep(self.interval)
+            try:
+                await self.check()
+            except Exception:
+                log.exception('Could not check the read replica.')
+                self.healthy = False
+
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.ensure_future(self._monitor())
+
+    def close(self):
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+
 class MaybeAcquire:
     def __init__(self, connection, *, pool):
         self.connection = connection
@@ -474,6 +877,7 @@ class TableMeta(type):
 
     def __new__(cls, name, parents, dct, **kwargs):
         columns = []
+        indexes = []
 
         try:
             table_name = kwargs['table_name']
@@ -481,6 +885,10 @@ class TableMeta(type):
             table_name = name.lower()
 
         dct['__tablename__'] = table_name
+        dct['__partition__'] = partition = kwargs.get('partition_by')
+
+        if partition is not None and not isinstance(partition, Range):
+            raise SchemaError('partition_by must be a Range.')
 
         for elem, value in dct.items():
             if isinstance(value, Column):
@@ -491,8 +899,14 @@ class TableMeta(type):
                     value.index_name = '%s_%s_idx' % (table_name, value.name)
 
                 columns.append(value)
+            elif isinstance(value, Index):
+                if value.name is None:
+                    value.name = '%s_%s_idx' % (table_name, elem)
+
+                indexes.append(value)
 
         dct['columns'] = columns
+        dct['indexes'] = indexes
         return super().__new__(cls, name, parents, dct)
 
     def __init__(self, name, parents, dct, **kwargs):
@@ -500,7 +914,7 @@ class TableMeta(type):
 
 class Table(metaclass=TableMeta):
     @classmethod
-    async def create_pool(cls, uri, **kwargs):
+    async def create_pool(cls, uri, *, explain_budget=None, **kwargs):
         """Sets up and returns the PostgreSQL connection pool that is used.
 
         .. note::
@@ -508,14 +922,52 @@ class Table(metaclass=TableMeta):
             This must be called at least once before doing anything with the tables.
             And must be called on the ``Table`` class.
 
+        The pool is wrapped in an :class:`InstrumentedPool` so statement latency
+        and acquire waits show up in :data:`querystats.stats`.
+
         Parameters
         -----------
         uri: str
             The PostgreSQL URI to connect to.
+        explain_budget: Optional[float]
+            How many seconds a statement can take before its plan is captured.
+            ``None`` disables plan capturing.
+        \*\*kwargs
+            The arguments to forward to asyncpg.create_pool.
+        """
+
+        cls._pool = pool = await cls._make_pool(uri, **kwargs)
+        querystats.stats.explain_budget = explain_budget
+        return pool
+
+    @classmethod
+    async def create_replica_pool(cls, uri, *, max_lag=30.0, check_interval=10.0, **kwargs):
+        """Sets up the optional connection pool for a read replica.
+
+        Reads that opt in with ``readonly=True`` are sent here as long as the
+        replica is reachable and at most ``max_lag`` seconds behind the
+        primary. Otherwise they fall back to the primary pool.
+
+        Parameters
+        -----------
+        uri: str
+            The PostgreSQL URI of the replica.
+        max_lag: float
+            How many seconds behind the primary the replica is allowed to be.
+        check_interval: float
+            How often to check the replica's lag, in seconds.
         \*\*kwargs
             The arguments to forward to asyncpg.create_pool.
         """
 
+        pool = await cls._make_pool(uri, explain=False, **kwargs)
+        cls._replica = replica = ReplicaMonitor(pool, max_lag=max_lag, interval=check_interval)
+        await replica.check()
+        replica.start()
+        return pool
+
+    @classmethod
+    async def _make_pool(cls, uri, *, explain=True, **kwargs):
         def _encode_jsonb(value):
             return json.dumps(value)
 
@@ -526,15 +978,28 @@ class Table(metaclass=TableMeta):
 
         async def init(con):
             await con.set_type_codec('jsonb', schema='pg_catalog', encoder=_encode_jsonb, decoder=_decode_jsonb, format='text')
+            if isinstance(con, InstrumentedConnection):
+                # plans are captured on the primary, a statement that ran elsewhere can't be explained there
+                con.explainable = explain
             if old_init is not None:
                 await old_init(con)
 
-        cls._pool = pool = await asyncpg.create_pool(uri, init=init, **kwargs)
-        return pool
+        kwargs.setdefault('connection_class', InstrumentedConnection)
+        pool = await asyncpg.create_pool(uri, init=init, **kwargs)
+        return InstrumentedPool(pool, explain=explain)
+
+    @classmethod
+    def read_pool(cls):
+        """Returns the replica pool if it's healthy, otherwise the primary pool."""
+        replica = getattr(cls, '_replica', None)
+        if replica is not None and replica.healthy:
+            return replica.pool
+        return cls._pool
 
     @classmethod
-    def acquire_connection(cls, connection):
-        return MaybeAcquire(connection, pool=cls._pool)
+    def acquire_connection(cls, connection, *, readonly=False):
+        pool = cls.read_pool() if readonly else cls._pool
+        return MaybeAcquire(connection, pool=pool)
 
     @classmethod
     def write_migration(cls, *, directory='migrations'):
@@ -632,10 +1097,7 @@ class Table(metaclass=TableMeta):
             return False
 
         async with MaybeAcquire(connection, pool=cls._pool) as con:
-            sql = diff.to_sql(downgrade=downgrade)
-            if verbose:
-                print(sql)
-            await con.execute(sql)
+            await diff.execute(con, downgrade=downgrade, verbose=verbose)
 
         current = directory.with_name('current-' + p.name)
         with current.open('w', encoding='utf-8') as fp:
@@ -706,10 +1168,7 @@ class Table(metaclass=TableMeta):
 
         # execute the upgrade SQL
         async with MaybeAcquire(connection, pool=cls._pool) as con:
-            sql = diff.to_sql()
-            if verbose:
-                print(sql)
-            await con.execute(sql)
+            await diff.execute(con, verbose=verbose)
 
         # load the migration data
         with p.open('r', encoding='utf-8') as fp:
@@ -771,6 +1230,33 @@ class Table(metaclass=TableMeta):
                 print(sql)
             await con.execute(sql)
 
+    @classmethod
+    def _partitioned_constraints(cls, key):
+        # primary keys and unique constraints on a partitioned table
+        # have to include the column it is partitioned by
+        primary_keys = [c.name for c in cls.columns if c.primary_key]
+        if primary_keys:
+            if key not in primary_keys:
+                primary_keys.append(key)
+            yield 'PRIMARY KEY (%s)' % ', '.join(primary_keys)
+
+        for column in cls.columns:
+            if column.unique:
+                yield 'UNIQUE (%s)' % ', '.join({ column.name: None, key: None })
+
+    @classmethod
+    def _index_statements(cls):
+        statements = []
+        for column in cls.columns:
+            if column.index:
+                fmt = 'CREATE INDEX IF NOT EXISTS {1.index_name} ON {0} ({1.name});'.format(cls.__tablename__, column)
+                statements.append(fmt)
+
+        for index in cls.indexes:
+            statements.append(index._create_index(cls.__tablename__))
+
+        return statements
+
     @classmethod
     def create_table(cls, *, exists_ok=True):
         """Generates the CREATE TABLE stub."""
@@ -781,17 +1267,92 @@ class Table(metaclass=TableMeta):
             builder.append('IF NOT EXISTS')
 
         builder.append(cls.__tablename__)
-        builder.append('(%s)' % ', '.join(c._create_table() for c in cls.columns))
-        statements.append(' '.join(builder) + ';')
 
-        # handle the index creations
-        for column in cls.columns:
-            if column.index:
-                fmt = 'CREATE INDEX IF NOT EXISTS {1.index_name} ON {0} ({1.name});'.format(cls.__tablename__, column)
-                statements.append(fmt)
+        partition = cls.__partition__
+        if partition is None:
+            builder.append('(%s)' % ', '.join(c._create_table() for c in cls.columns))
+            statements.append(' '.join(builder) + ';')
+        else:
+            definitions = [c._create_table(constraints=False) for c in cls.columns]
+            definitions.extend(cls._partitioned_constraints(partition.column))
+            builder.append('(%s)' % ', '.join(definitions))
+            builder.append('PARTITION BY RANGE (%s)' % partition.column)
+            statements.append(' '.join(builder) + ';')
+            statements.extend(partition.create_partitions_sql(cls.__tablename__))
 
+        # handle the index creations
+        statements.extend(cls._index_statements())
         return '\n'.join(statements)
 
+    @classmethod
+    async def create_partitions(cls, *, connection=None, now=None):
+        """Creates the current partition and the premade future ones if they don't exist.
+
+        This should be called periodically so there's always a partition to insert into.
+        """
+        partition = cls.__partition__
+        if partition is None:
+            raise SchemaError('%s is not partitioned.' % cls.__tablename__)
+
+        async with MaybeAcquire(connection, pool=cls._pool) as con:
+            # the legacy partition of a table that was just partitioned covers the current interval
+            existing = [(start, end) for _, start, end in await cls._partition_bounds(con)]
+            for statement in partition.create_partitions_sql(cls.__tablename__, now, existing=existing):
+                await con.execute(statement)
+
+    @classmethod
+    async def _partition_bounds(cls, con):
+        # returns (name, start, end) for every partition but the default one,
+        # a partition going from MINVALUE starts at datetime.min
+        query = """SELECT c.relname, pg_get_expr(c.relpartbound, c.oid)
+                   FROM pg_inherits i
+                   INNER JOIN pg_class c ON c.oid = i.inhrelid
+                   WHERE i.inhparent = $1::regclass;
+                """
+
+        def parse(value):
+            return datetime.datetime.strptime(value[:19], '%Y-%m-%d %H:%M:%S')
+
+        bounds = []
+        for name, bound in await con.fetch(query, cls.__tablename__):
+            # FOR VALUES FROM ('...') TO ('...'), the default partition has no bounds
+            match = _bounds.search(bound)
+            if match is None:
+                continue
+
+            start, end = match.groups()
+            bounds.append((name, datetime.datetime.min if start is None else parse(start), parse(end)))
+        return bounds
+
+    @classmethod
+    async def detach_partitions(cls, before, *, drop=False, connection=None):
+        """Detaches every partition that only holds rows older than ``before``.
+
+        Detaching only touches the catalog so it's cheap. The detached tables
+        are left around as regular tables unless ``drop`` is ``True``.
+
+        Returns
+        --------
+        List[str]
+            The names of the detached partitions.
+        """
+        partition = cls.__partition__
+        if partition is None:
+            raise SchemaError('%s is not partitioned.' % cls.__tablename__)
+
+        detached = []
+        async with MaybeAcquire(connection, pool=cls._pool) as con:
+            for name, _, end in await cls._partition_bounds(con):
+                if end > before:
+                    continue
+
+                await con.execute('ALTER TABLE %s DETACH PARTITION %s;' % (cls.__tablename__, name))
+                if drop:
+                    await con.execute('DROP TABLE %s;' % name)
+                detached.append(name)
+
+        return detached
+
     @classmethod
     async def insert(cls, connection=None, **kwargs):
         """Inserts an element to the table."""
@@ -819,6 +1380,137 @@ class Table(metaclass=TableMeta):
         async with MaybeAcquire(connection, pool=cls._pool) as con:
             await con.execute(sql, *verified.values())
 
+    @classmethod
+    def _verify_batch(cls, records):
+        """Validates a batch of records against the columns.
+
+        Every record must have the same keys. Rather than checking every value
+        the distinct types of each column are collected and checked once.
+
+        Returns a tuple of the column names and the rows as tuples.
+        """
+        records = list(records)
+        if not records:
+            return (), []
+
+        given = records[0].keys()
+        columns = [column for column in cls.columns if column.name in given]
+        if len(columns) != len(given):
+            unknown = given - { column.name for column in columns }
+            raise TypeError('unknown columns for %s: %s' % (cls.__tablename__, ', '.join(unknown)))
+
+        names = tuple(column.name for column in columns)
+        try:
+            rows = [tuple(record[name] for name in names) for record in records]
+        except KeyError as e:
+            raise TypeError('every record must have the same columns, missing %s' % e) from None
+
+        for index, column in enumerate(columns):
+            types = { type(row[index]) for row in rows }
+            if type(None) in types:
+                if not column.nullable:
+                    raise TypeError('Cannot pass None to non-nullable column %s.' % column.name)
+                types.discard(type(None))
+
+            check = column.column_type.python
+            for value_type in types:
+                if not check or not issubclass(value_type, check):
+                    fmt = 'column {0.name} expected {1.__name__}, received {2.__name__}'
+                    raise TypeError(fmt.format(column, check, value_type))
+
+        return names, rows
+
+    @classmethod
+    async def insert_many(cls, records, *, connection=None):
+        """Inserts many elements to the table at once using ``COPY``.
+
+        Parameters
+        -----------
+        records: Iterable[dict]
+            The rows to insert, as keyword arguments to :meth:`insert` would be.
+            Every row must have the same keys.
+        connection: Optional[asyncpg.Connection]
+            The connection to use, otherwise one is acquired from the pool.
+
+        Returns
+        --------
+        int
+            The number of rows inserted.
+        """
+
+        columns, rows = cls._verify_batch(records)
+        if not rows:
+            return 0
+
+        async with MaybeAcquire(connection, pool=cls._pool) as con:
+            status = await con.copy_records_to_table(cls.__tablename__, columns=columns, records=rows)
+
+        # COPY <count>
+        return int(status.split()[-1])
+
+    @classmethod
+    async def upsert_many(cls, records, *, conflict=None, update=None, connection=None):
+        """Inserts or updates many elements at once.
+
+        The rows are copied into a temporary table and then moved over with
+        ``INSERT ... ON CONFLICT``. Rows in the same batch must not conflict
+        with each other.
+
+        Parameters
+        -----------
+        records: Iterable[dict]
+            The rows to upsert. Every row must have the same keys.
+        conflict: Optional[Sequence[str]]
+            The columns of the unique constraint to check. Defaults to the
+            primary key.
+        update: Optional[Union[Sequence[str], Dict[str, str]]]
+            The columns to overwrite on conflict. A dict maps a column to the SQL
+            expression to set it to, e.g. ``{'total': 'emoji_stats.total + EXCLUDED.total'}``.
+            Defaults to every given column not in ``conflict``. If empty then
+            conflicting rows are left alone.
+        connection: Optional[asyncpg.Connection]
+            The connection to use, otherwise one is acquired from the pool.
+
+        Returns
+        --------
+        int
+            The number of rows inserted or updated.
+        """
+
+        columns, rows = cls._verify_batch(records)
+        if not rows:
+            return 0
+
+        if conflict is None:
+            conflict = [column.name for column in cls.columns if column.primary_key]
+            if not conflict:
+                raise SchemaError('%s has no primary key to upsert on.' % cls.__tablename__)
+
+        if update is None:
+            update = [name for name in columns if name not in conflict]
+
+        if not isinstance(update, dict):
+            update = { name: 'EXCLUDED.%s' % name for name in update }
+
+        if update:
+            action = 'DO UPDATE SET ' + ', '.join('%s = %s' % pair for pair in update.items())
+        else:
+            action = 'DO NOTHING'
+
+        temp = '_upsert_%s' % cls.__tablename__
+        names = ', '.join(columns)
+        create = 'CREATE TEMPORARY TABLE {0} ON COMMIT DROP AS SELECT {1} FROM {2} WITH NO DATA;'
+        upsert = 'INSERT INTO {0} ({1}) SELECT {1} FROM {2} ON CONFLICT ({3}) {4};'
+
+        async with MaybeAcquire(connection, pool=cls._pool) as con:
+            async with con.transaction():
+                await con.execute(create.format(temp, names, cls.__tablename__))
+                await con.copy_records_to_table(temp, columns=columns, records=rows)
+                status = await con.execute(upsert.format(cls.__tablename__, names, temp, ', '.join(conflict), action))
+
+        # INSERT 0 <count>
+        return int(status.split()[-1])
+
     @classmethod
     def to_dict(cls):
         x = {}
@@ -828,6 +1520,8 @@ class Table(metaclass=TableMeta):
         # nb: columns is ordered due to the ordered dict usage
         #     this is used to help detect renames
         x['columns'] = [a._to_dict() for a in cls.columns]
+        x['indexes'] = [a.to_dict() for a in cls.indexes]
+        x['partition_by'] = cls.__partition__ and cls.__partition__.to_dict()
         return x
 
     @classmethod
@@ -842,6 +1536,12 @@ class Table(metaclass=TableMeta):
         self = cls()
         self.__tablename__ = data['name']
         self.columns = [Column.from_dict(a) for a in data['columns']]
+
+        # older data files predate table level indexes
+        self.indexes = [Index.from_dict(a) for a in data.get('indexes', [])]
+
+        partition = data.get('partition_by')
+        self.__partition__ = partition and Range.from_dict(partition)
         return self
 
     @classmethod
@@ -878,6 +1578,13 @@ class Table(metaclass=TableMeta):
         add_index:
             name: str [The column name]
             index: str [The index name]
+        partition_by:
+            before: Optional[object] [The previous Range]
+            after: Optional[object] [The new Range]
+        add_indexes:
+            index: object [A table level index]
+        remove_indexes:
+            index: object [A table level index]
         changed_constraints:
             name: str [The column name]
             before:
@@ -991,6 +1698,34 @@ class Table(metaclass=TableMeta):
             upgrade.setdefault('remove_columns', []).extend(removed)
             downgrade.setdefault('add_columns', []).extend(removed)
 
+        if self.__partition__ != before.__partition__:
+            a = self.__partition__ and self.__partition__.to_dict()
+            b = before.__partition__ and before.__partition__.to_dict()
+            upgrade['partition_by'] = { 'before': b, 'after': a }
+            downgrade['partition_by'] = { 'before': a, 'after': b }
+
+        # table level indexes are matched up by name, a changed definition
+        # means dropping the old index and building the new one
+        before_indexes = { index.name: index for index in before.indexes }
+        after_indexes = { index.name: index for index in self.indexes }
+
+        for name, index in after_indexes.items():
+            old = before_indexes.get(name)
+            if old == index:
+                continue
+
+            if old is not None:
+                upgrade.setdefault('remove_indexes', []).append(old.to_dict())
+                downgrade.setdefault('add_indexes', []).append(old.to_dict())
+
+            upgrade.setdefault('add_indexes', []).append(index.to_dict())
+            downgrade.setdefault('remove_indexes', []).append(index.to_dict())
+
+        for name, old in before_indexes.items():
+            if name not in after_indexes:
+                upgrade.setdefault('remove_indexes', []).append(old.to_dict())
+                downgrade.setdefault('add_indexes', []).append(old.to_dict())
+
         return SchemaDiff(self, upgrade, downgrade)
 
 async def _table_creator(tables, *, verbose=True):
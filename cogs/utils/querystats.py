@@ -0,0 +1,361 @@
+from collections import namedtuple, OrderedDict
+
+import asyncio
+import datetime
+import functools
+import hashlib
+import logging
+import math
+import re
+import time
+
+import asyncpg
+
+log = logging.getLogger(__name__)
+
+_whitespace = re.compile(r'\s+')
+
+# string literals and bare numbers, but not $1 style parameters or identifiers like t1
+_literals = re.compile(r"'(?:[^']|'')*'|(?<![\w$])\d+(?:\.\d+)?\b")
+
+@functools.lru_cache(maxsize=2048)
+def normalise(query):
+    """Collapses whitespace and literals so the same statement is grouped together."""
+    return _literals.sub('?', _whitespace.sub(' ', query).strip())
+
+@functools.lru_cache(maxsize=2048)
+def fingerprint(query):
+    """A short stable ID for the normalised form of a query."""
+    return hashlib.sha1(normalise(query).encode('utf-8')).hexdigest()[:12]
+
+_writes = re.compile(r'\b(?:INSERT|UPDATE|DELETE)\b', re.IGNORECASE)
+
+def _explain_kind(query):
+    """Returns the EXPLAIN options to use for a query, or None if it can't be explained."""
+    stripped = query.strip().rstrip(';')
+    if ';' in stripped:
+        # multiple statements
+        return None
+
+    keyword = stripped.split(None, 1)[0].upper() if stripped else ''
+    if keyword in ('INSERT', 'UPDATE', 'DELETE'):
+        return ''
+    if keyword in ('SELECT', 'WITH', 'VALUES', 'TABLE'):
+        # a WITH might hide a write in one of its CTEs
+        return '' if _writes.search(stripped) else '(ANALYZE, BUFFERS)'
+    return None
+
+CapturedPlan = namedtuple('CapturedPlan', 'fingerprint query elapsed analyzed captured_at plan')
+
+# latencies are bucketed logarithmically with 5% wide buckets so we get
+# decent percentiles without keeping every sample around
+_BUCKET_WIDTH = math.log(1.05)
+
+def _bucket(seconds):
+    return int(math.floor(math.log(max(seconds, 1e-6)) / _BUCKET_WIDTH))
+
+def _bucket_value(bucket):
+    return math.exp((bucket + 0.5) * _BUCKET_WIDTH)
+
+class QueryEntry:
+    __slots__ = ('query', 'fingerprint', 'calls', 'total', 'rows', 'wait', 'max', 'histogram')
+
+    def __init__(self, query):
+        self.query = query
+        self.fingerprint = fingerprint(query)
+        self.calls = 0
+        self.total = 0.0
+        self.rows = 0
+        self.wait = 0.0
+        self.max = 0.0
+        self.histogram = {}
+
+    def add(self, elapsed, rows):
+        self.calls += 1
+        self.total += elapsed
+        self.rows += rows
+        if elapsed > self.max:
+            self.max = elapsed
+
+        bucket = _bucket(elapsed)
+        self.histogram[bucket] = self.histogram.get(bucket, 0) + 1
+
+    def percentile(self, percent):
+        if not self.calls:
+            return 0.0
+
+        needed = self.calls * percent / 100.0
+        seen = 0
+        for bucket in sorted(self.histogram):
+            seen += self.histogram[bucket]
+            if seen >= needed:
+                return min(_bucket_value(bucket), self.max)
+        return self.max
+
+    @property
+    def p50(self):
+        return self.percentile(50)
+
+    @property
+    def p99(self):
+        return self.percentile(99)
+
+    def to_dict(self):
+        return {
+            'query': self.query,
+            'fingerprint': self.fingerprint,
+            'calls': self.calls,
+            'total': self.total,
+            'p50': self.p50,
+            'p99': self.p99,
+            'max': self.max,
+            'rows': self.rows,
+            'acquire_wait': self.wait,
+        }
+
+class QueryStats:
+    """Per statement latency statistics for the connection pool.
+
+    Statements are grouped by their text after going through :func:`normalise`.
+    Anything slower than ``slow_threshold`` seconds is logged.
+
+    If ``explain_budget`` is set then statements slower than it get their plan
+    captured on a spare connection from ``pool``. Reads are run through
+    ``EXPLAIN (ANALYZE, BUFFERS)`` in a transaction that is rolled back, writes
+    only get a plain ``EXPLAIN``. A fingerprint is explained at most once every
+    ``explain_cooldown`` seconds and only the latest ``max_plans`` are kept.
+
+    Only the ``max_queries`` most recently run statements are tracked, so
+    dynamic SQL can't grow the statistics forever.
+    """
+
+    def __init__(self, *, slow_threshold=0.5, explain_budget=None, explain_cooldown=600.0, max_plans=100,
+                 max_queries=1000):
+        self.slow_threshold = slow_threshold
+        self.explain_budget = explain_budget
+        self.explain_cooldown = explain_cooldown
+        self.max_plans = max_plans
+        self.max_queries = max_queries
+        self.pool = None
+        self.plans = OrderedDict()
+        self._explaining = set()
+        # the connections plans are being captured on, their statements aren't recorded
+        self._untracked = set()
+        self.queries = OrderedDict()
+        self.acquires = 0
+        self.acquire_wait = 0.0
+        self.acquire_max = 0.0
+        self.started = time.time()
+
+    def _entry(self, query):
+        key = normalise(query)
+        try:
+            self.queries.move_to_end(key)
+            return self.queries[key]
+        except KeyError:
+            entry = self.queries[key] = QueryEntry(key)
+            while len(self.queries) > self.max_queries:
+                self.queries.popitem(last=False)
+            return entry
+
+    def record(self, query, elapsed, rows, args=()):
+        """Records a statement. ``args`` is ``None`` if it can't be explained with them, e.g. executemany."""
+        self._entry(query).add(elapsed, rows)
+        if elapsed >= self.slow_threshold:
+            log.warning('Slow query took %.2fms: %s', elapsed * 1000, normalise(query))
+
+        budget = self.explain_budget
+        if budget is not None and args is not None and elapsed >= budget and self.pool is not None:
+            self._maybe_explain(query, args, elapsed)
+
+    def _maybe_explain(self, query, args, elapsed):
+        key = fingerprint(query)
+        if key in self._explaining:
+            return
+
+        previous = self.plans.get(key)
+        now = datetime.datetime.utcnow()
+        if previous is not None and (now - previous.captured_at).total_seconds() < self.explain_cooldown:
+            return
+
+        options = _explain_kind(query)
+        if options is None:
+            return
+
+        self._explaining.add(key)
+        asyncio.ensure_future(self._explain(key, query, args, options, elapsed))
+
+    async def _explain(self, key, query, args, options, elapsed):
+        try:
+            try:
+                # don't wait around for a connection, the bot needs them more
+                con = await self.pool.acquire(timeout=0.1)
+            except asyncio.TimeoutError:
+                return
+
+            self._untracked.add(con)
+            try:
+                tr = con.transaction(readonly=bool(options))
+                await tr.start()
+                try:
+                    await con.execute("SET LOCAL statement_timeout = '30s';")
+                    explain = f'EXPLAIN {options} {query}' if options else f'EXPLAIN {query}'
+                    records = await con.fetch(explain, *args)
+                finally:
+                    await tr.rollback()
+            finally:
+                self._untracked.discard(con)
+                await self.pool.release(con)
+        except Exception:
+            log.exception('Could not capture the plan for %s', normalise(query))
+        else:
+            plan = '\n'.join(record[0] for record in records)
+            self.plans.pop(key, None)
+            self.plans[key] = CapturedPlan(key, normalise(query), elapsed, bool(options), datetime.datetime.utcnow(), plan)
+            while len(self.plans) > self.max_plans:
+                self.plans.popitem(last=False)
+        finally:
+            self._explaining.discard(key)
+
+    def record_acquire(self, waited, query=None):
+        self.acquires += 1
+        self.acquire_wait += waited
+        if waited > self.acquire_max:
+            self.acquire_max = waited
+
+        if query is not None:
+            self._entry(query).wait += waited
+
+    def top(self, limit=10):
+        return sorted(self.queries.values(), key=lambda e: e.total, reverse=True)[:limit]
+
+    def snapshot(self):
+        """Returns a JSON serialisable copy of the statistics."""
+        return {
+            'started': self.started,
+            'taken': time.time(),
+            'acquires': self.acquires,
+            'acquire_wait': self.acquire_wait,
+            'acquire_max': self.acquire_max,
+            'queries': [entry.to_dict() for entry in self.top(None)],
+        }
+
+    def reset(self):
+        self.queries.clear()
+        self.acquires = 0
+        self.acquire_wait = 0.0
+        self.acquire_max = 0.0
+        self.started = time.time()
+
+stats = QueryStats()
+
+def _count_status(status):
+    # e.g. INSERT 0 5, UPDATE 3, DELETE 0
+    try:
+        return int(status.rsplit(' ', 1)[-1])
+    except (ValueError, AttributeError):
+        return 0
+
+def _timed(name, count_rows, *, explainable=True):
+    method = getattr(asyncpg.Connection, name)
+
+    @functools.wraps(method)
+    async def wrapped(self, query, *args, **kwargs):
+        if self in stats._untracked:
+            return await method(self, query, *args, **kwargs)
+
+        start = time.perf_counter()
+        result = await method(self, query, *args, **kwargs)
+        can_explain = explainable and self.explainable
+        stats.record(query, time.perf_counter() - start, count_rows(result), args if can_explain else None)
+        return result
+
+    return wrapped
+
+class InstrumentedConnection(asyncpg.Connection):
+    """A connection that records how long every statement takes in :data:`stats`.
+
+    Plans are only captured on the primary pool, so connections to any other
+    server, e.g. a read replica, have ``explainable`` set to ``False``.
+    """
+
+    explainable = True
+
+    execute = _timed('execute', _count_status)
+    # its arguments are a list of argument tuples, so there's nothing to explain with
+    executemany = _timed('executemany', lambda r: 0, explainable=False)
+    fetch = _timed('fetch', len)
+    fetchrow = _timed('fetchrow', lambda r: int(r is not None))
+    fetchval = _timed('fetchval', lambda r: 1)
+
+class _TimedAcquire:
+    __slots__ = ('pool', 'timeout', 'connection')
+
+    def __init__(self, pool, timeout):
+        self.pool = pool
+        self.timeout = timeout
+        self.connection = None
+
+    async def _acquire(self):
+        start = time.perf_counter()
+        con = await self.pool.acquire(timeout=self.timeout)
+        stats.record_acquire(time.perf_counter() - start)
+        return con
+
+    def __await__(self):
+        return self._acquire().__await__()
+
+    async def __aenter__(self):
+        self.connection = await self._acquire()
+        return self.connection
+
+    async def __aexit__(self, *args):
+        con, self.connection = self.connection, None
+        await self.pool.release(con)
+
+class InstrumentedPool:
+    """Wraps an :class:`asyncpg.pool.Pool` to record time spent waiting on acquire.
+
+    The pool's connections should be :class:`InstrumentedConnection` so the
+    statements themselves are recorded. Everything else is forwarded.
+
+    Only the pool created with ``explain=True`` is used to capture plans, the
+    connections of any other pool should not be ``explainable``.
+    """
+
+    def __init__(self, pool, *, explain=True):
+        self._pool = pool
+
+        # plans are captured on the raw pool so they don't count as waits
+        if explain:
+            stats.pool = pool
+
+    def __getattr__(self, name):
+        return getattr(self._pool, name)
+
+    def acquire(self, *, timeout=None):
+        return _TimedAcquire(self._pool, timeout)
+
+    async def _run(self, name, query, args, kwargs):
+        start = time.perf_counter()
+        con = await self._pool.acquire()
+        stats.record_acquire(time.perf_counter() - start, query)
+        try:
+            return await getattr(con, name)(query, *args, **kwargs)
+        finally:
+            await self._pool.release(con)
+
+    async def execute(self, query, *args, **kwargs):
+        return await self._run('execute', query, args, kwargs)
+
+    async def executemany(self, query, *args, **kwargs):
+        return await self._run('executemany', query, args, kwargs)
+
+    async def fetch(self, query, *args, **kwargs):
+        return await self._run('fetch', query, args, kwargs)
+
+    async def fetchrow(self, query, *args, **kwargs):
+        return await self._run('fetchrow', query, args, kwargs)
+
+    async def fetchval(self, query, *args, **kwargs):
+        return await self._run('fetchval', query, args, kwargs)
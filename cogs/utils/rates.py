@@ -0,0 +1,98 @@
+from collections import namedtuple
+
+import array
+import time
+
+RateSummary = namedtuple('RateSummary', 'current one five fifteen peak')
+
+class RateCounter:
+    """Counts events per second over a fixed window of time.
+
+    Every key gets a ring buffer of one second buckets so memory use only
+    depends on the number of keys, not on uptime. Recording an event is a
+    single array increment, the buckets of a key that went stale are only
+    cleared the next time that key is recorded or read.
+
+    Parameters
+    -----------
+    window: int
+        How many seconds of history to keep.
+    """
+
+    def __init__(self, window=900):
+        self.window = window
+        # one extra bucket for the second that's still in progress
+        self._size = window + 1
+        self._buckets = {}
+        # key: the last second its buckets were brought up to date
+        self._touched = {}
+        self._started = int(time.monotonic())
+
+    def add(self, key):
+        second = int(time.monotonic())
+        try:
+            buckets = self._buckets[key]
+        except KeyError:
+            # a second's worth of events fits in 32 bits just fine
+            buckets = self._buckets[key] = array.array('I', [0]) * self._size
+            self._touched[key] = second
+        else:
+            if self._touched[key] != second:
+                self._catch_up(key, buckets, second)
+
+        buckets[second % self._size] += 1
+
+    def _catch_up(self, key, buckets, second):
+        last = self._touched[key]
+        if last >= second:
+            return
+
+        self._touched[key] = second
+        if second - last >= self._size:
+            for index in range(self._size):
+                buckets[index] = 0
+        else:
+            for s in range(last + 1, second + 1):
+                buckets[s % self._size] = 0
+
+    def keys(self):
+        return self._buckets.keys()
+
+    def _series(self, keys, second):
+        size = self._size
+        start = second + 1
+        order = [(start + i) % size for i in range(self.window)]
+
+        if keys is None:
+            keys = self._buckets.keys()
+
+        combined = [0] * self.window
+        for key in keys:
+            buckets = self._buckets.get(key)
+            if buckets is None:
+                continue
+            self._catch_up(key, buckets, second)
+            for i, index in enumerate(order):
+                combined[i] += buckets[index]
+        return combined
+
+    def series(self, keys=None):
+        """Returns the combined count of every complete second in the window, oldest first."""
+        return self._series(keys, int(time.monotonic()))
+
+    def summary(self, keys=None):
+        """Returns the per second rates for the given keys, or every key if ``None``.
+
+        ``current`` is the average over the last 10 seconds and ``peak`` is the
+        busiest second in the window. Averages over periods longer than the
+        uptime are taken over the uptime instead.
+        """
+        second = int(time.monotonic())
+        series = self._series(keys, second)
+        elapsed = max(second - self._started, 1)
+
+        def average(seconds):
+            seconds = min(seconds, elapsed, self.window)
+            return sum(series[-seconds:]) / seconds
+
+        return RateSummary(average(10), average(60), average(300), average(900), max(series, default=0))
@@ -3,6 +3,7 @@
 # function must be migrate_cog_name
 
 import json
+import os
 import datetime
 import csv
 import io
@@ -295,7 +296,7 @@ async def migrate_stars(pool, client):
 
     async with pool.acquire() as con:
         # the incredibly basic case, creating the starboard table
-        await con.execute("TRUNCATE starboard, starboard_entries, starrers RESTART IDENTITY;")
+        await con.execute("TRUNCATE starboard, starboard_entries, starrers, star_givers, star_receivers RESTART IDENTITY;")
 
         records = []
         for guild_id in stars:
@@ -348,6 +349,50 @@ async def migrate_stars(pool, client):
         status = await con.copy_records_to_table('starrers', columns=Starrer.__slots__, records=records)
         print('Starboard Starrers', status)
 
+        query = """UPDATE starboard_entries entry
+                   SET stars = counted.total
+                   FROM (SELECT entry_id, COUNT(*) AS total FROM starrers GROUP BY entry_id) AS counted
+                   WHERE entry.id = counted.entry_id;
+                """
+        status = await con.execute(query)
+        print('Starboard Counts', status)
+
+        async with con.transaction():
+            await _fill_star_leaderboards(con)
+
+async def _fill_star_leaderboards(con):
+    # the same thing Stars.rebuild_leaderboards does for every guild
+    # the lock keeps stars and unstars out until we're done so nothing is counted twice
+    await con.execute('LOCK TABLE star_givers, star_receivers IN EXCLUSIVE MODE;')
+    await con.execute('DELETE FROM star_givers;')
+    await con.execute('DELETE FROM star_receivers;')
+
+    query = """INSERT INTO star_givers (guild_id, author_id, stars)
+               SELECT entry.guild_id, starrers.author_id, COUNT(*)
+               FROM starrers
+               INNER JOIN starboard_entries entry
+               ON entry.id = starrers.entry_id
+               GROUP BY entry.guild_id, starrers.author_id;
+            """
+    status = await con.execute(query)
+    print('Star Givers', status)
+
+    query = """INSERT INTO star_receivers (guild_id, author_id, stars)
+               SELECT guild_id, author_id, SUM(stars)
+               FROM starboard_entries
+               WHERE author_id IS NOT NULL
+               GROUP BY guild_id, author_id;
+            """
+    status = await con.execute(query)
+    print('Star Receivers', status)
+
+async def migrate_star_leaderboards(pool, client):
+    # not from JSON, this fills the leaderboards of a database that already has
+    # its starboard in PostgreSQL so they're right as soon as the bot starts
+    async with pool.acquire() as con:
+        async with con.transaction():
+            await _fill_star_leaderboards(con)
+
 async def migrate_profile(pool, client):
     # note: also porting over pokemon.json
     friend_codes = _load_json('pokemon.json').get('friend_codes', {})
@@ -409,3 +454,75 @@ async def migrate_emoji(pool, client):
 
         status = await con.copy_records_to_table('emoji_stats', columns=('guild_id', 'emoji_id', 'total'), records=records)
         print('Emoji Statistics', status)
+
+async def migrate_meta(pool, client):
+    # guild_id: [prefixes]
+    prefixes = _load_json('prefixes.json')
+
+    async with pool.acquire() as con:
+        await con.execute("TRUNCATE guild_prefixes;")
+
+        records = [(int(guild_id), value) for guild_id, value in prefixes.items()]
+        status = await con.copy_records_to_table('guild_prefixes', columns=('id', 'prefixes'), records=records)
+        print('Prefixes', status)
+
+async def migrate_stats(pool, client):
+    # not from JSON, this (re)builds the hourly roll ups from the raw commands log
+    # one month at a time, the months that are done get written to the progress file
+    # so that if it stops partway through running it again picks up where it left off
+    # rather than starting over on a big table
+    progress_file = 'command_rollups_progress.json'
+    try:
+        done = set(_load_json(progress_file))
+    except FileNotFoundError:
+        done = set()
+
+    # old rows can be missing a command or an author, they can't be rolled up so they're skipped
+    rollups = (
+        ('Command Rollups', 'command_rollups',
+         """INSERT INTO command_rollups (bucket, guild_id, command, uses, first_used)
+            SELECT date_trunc('hour', used), COALESCE(guild_id, 0), command, COUNT(*), MIN(used)
+            FROM commands
+            WHERE used >= $1 AND used < $2 AND command IS NOT NULL
+            GROUP BY 1, 2, 3;
+         """),
+        ('Command Author Rollups', 'command_author_rollups',
+         """INSERT INTO command_author_rollups (bucket, guild_id, author_id, command, uses, first_used)
+            SELECT date_trunc('hour', used), COALESCE(guild_id, 0), author_id, command, COUNT(*), MIN(used)
+            FROM commands
+            WHERE used >= $1 AND used < $2 AND command IS NOT NULL AND author_id IS NOT NULL
+            GROUP BY 1, 2, 3, 4;
+         """),
+    )
+
+    async with pool.acquire() as con:
+        first, last = await con.fetchrow("SELECT date_trunc('month', MIN(used)), MAX(used) FROM commands;")
+        if first is None:
+            print('Command Rollups', 'nothing to migrate')
+            return
+
+        month = first
+        while month <= last:
+            following = (month + datetime.timedelta(days=32)).replace(day=1)
+            key = month.strftime('%Y-%m')
+            if key in done:
+                print(f'[{key}] already migrated, skipping')
+                month = following
+                continue
+
+            # the lock keeps the command logger out until this month is done so nothing gets counted twice
+            # deleting the month first means a month that failed halfway is just built again
+            async with con.transaction():
+                await con.execute("LOCK TABLE command_rollups, command_author_rollups IN SHARE ROW EXCLUSIVE MODE;")
+                for name, table, query in rollups:
+                    await con.execute(f"DELETE FROM {table} WHERE bucket >= $1 AND bucket < $2;", month, following)
+                    status = await con.execute(query, month, following)
+                    print(f'[{key}] {name}', status)
+
+            done.add(key)
+            with open(progress_file, 'w', encoding='utf-8') as fp:
+                json.dump(sorted(done), fp)
+
+            month = following
+
+    os.remove(progress_file)
@@ -50,12 +50,23 @@ def run_bot():
     log = logging.getLogger()
 
     try:
-        pool = loop.run_until_complete(Table.create_pool(config.postgresql, command_timeout=60))
+        explain_budget = getattr(config, 'explain_budget', None)
+        pool = loop.run_until_complete(Table.create_pool(config.postgresql, command_timeout=60,
+                                                         explain_budget=explain_budget))
     except Exception as e:
         click.echo('Could not set up PostgreSQL. Exiting.', file=sys.stderr)
         log.exception('Could not set up PostgreSQL. Exiting.')
         return
 
+    replica = getattr(config, 'postgresql_replica', None)
+    if replica is not None:
+        try:
+            max_lag = getattr(config, 'replica_max_lag', 30.0)
+            loop.run_until_complete(Table.create_replica_pool(replica, command_timeout=60, max_lag=max_lag))
+        except Exception:
+            # not fatal, reads just go to the primary
+            log.exception('Could not set up the read replica, continuing without it.')
+
     bot = RoboDanny()
     bot.pool = pool
     bot.run()
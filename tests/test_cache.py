@@ -0,0 +1,155 @@
+import asyncio
+
+from cogs.utils import cache
+
+def run(coro):
+    loop = asyncio.new_event_loop()
+    asyncio.set_event_loop(loop)
+    try:
+        return loop.run_until_complete(coro)
+    finally:
+        loop.close()
+        asyncio.set_event_loop(None)
+
+def test_cancelled_leader_does_not_cancel_followers():
+    calls = 0
+    release = None
+
+    @cache.cache()
+    async def lookup(key):
+        nonlocal calls
+        calls += 1
+        await release.wait()
+        return key * 2
+
+    async def main():
+        nonlocal release
+        release = asyncio.Event()
+        leader = asyncio.ensure_future(lookup(21))
+        await asyncio.sleep(0)
+        follower = asyncio.ensure_future(lookup(21))
+        await asyncio.sleep(0)
+
+        leader.cancel()
+        await asyncio.sleep(0)
+        release.set()
+
+        assert await follower == 42
+        assert leader.cancelled()
+
+    run(main())
+    assert calls == 1
+    stats = lookup.get_stats()
+    assert (stats.misses, stats.coalesced) == (1, 1)
+    # the lookup still finished so its value got cached
+    assert lookup.cache[(21,)] == 42
+
+def test_cancelled_leader_does_not_cancel_batch():
+    release = None
+
+    @cache.batched()
+    async def lookup(keys):
+        await release.wait()
+        return {key: key * 2 for key in keys}
+
+    async def main():
+        nonlocal release
+        release = asyncio.Event()
+        leader = asyncio.ensure_future(lookup(1))
+        follower = asyncio.ensure_future(lookup(1))
+        await asyncio.sleep(0)
+        await asyncio.sleep(0)
+
+        leader.cancel()
+        await asyncio.sleep(0)
+        release.set()
+
+        assert await follower == 2
+        assert leader.cancelled()
+
+    run(main())
+
+def test_expiring_cache_expiry_queue_is_bounded():
+    async def main():
+        c = cache.ExpiringCache(10, 3600.0, lru=True)
+        for i in range(100000):
+            # a mix of overwrites and evictions
+            c[i % 15] = i
+            c[i] = i
+
+        assert len(c) == 10
+        assert len(c._expiry) <= 2 * c.maxsize
+        # every live key still has its expiry queued for the sweep
+        assert set(c._data) <= {key for _, key in c._expiry}
+
+    run(main())
+
+def test_preload_skips_invalidated_keys_and_stops_at_maxsize():
+    @cache.cache(maxsize=3)
+    async def lookup(key):
+        return 'fresh'
+
+    async def main():
+        with lookup.preload() as preload:
+            # the bulk query runs here while a key gets invalidated
+            lookup.invalidate(1)
+            for key in range(10):
+                if preload.full:
+                    break
+                preload.prime('stale', key)
+
+        assert preload.primed == 3
+        assert (1,) not in lookup.cache
+        assert await lookup(1) == 'fresh'
+        assert await lookup(3) == 'stale'
+
+        # invalidations after it finished don't leak into the next one
+        with lookup.preload() as preload:
+            assert not preload.invalidated
+
+    run(main())
+
+class FakeConnection:
+    def __init__(self, in_transaction=False):
+        self.in_transaction = in_transaction
+
+    def is_in_transaction(self):
+        return self.in_transaction
+
+def test_batched_explicit_connection_skips_the_batch():
+    calls = []
+
+    @cache.batched()
+    async def lookup(keys, *, connection=None):
+        calls.append((list(keys), connection))
+        return {key: (key, connection) for key in keys}
+
+    async def main():
+        pooled = asyncio.ensure_future(lookup(1))
+        con = FakeConnection(in_transaction=True)
+        assert await lookup(1, connection=con) == (1, con)
+        assert await pooled == (1, None)
+
+        # a value read inside a transaction might never be committed
+        lookup.invalidate(1)
+        await lookup(1, connection=con)
+        assert (1,) not in lookup.cache
+
+        con = FakeConnection()
+        await lookup(1, connection=con)
+        assert lookup.cache[(1,)] == (1, con)
+
+    run(main())
+    assert calls[0][1] is not None
+
+def test_batched_item_has_to_be_positional():
+    @cache.batched()
+    async def lookup(prefix, keys):
+        return {key: prefix + key for key in keys}
+
+    try:
+        lookup('a', keys='b')
+    except TypeError:
+        pass
+    else:
+        raise AssertionError('expected a TypeError')
@@ -0,0 +1,80 @@
+import asyncio
+import json
+
+from cogs.utils import config
+
+def run(coro):
+    loop = asyncio.new_event_loop()
+    asyncio.set_event_loop(loop)
+    try:
+        return loop.run_until_complete(coro)
+    finally:
+        loop.close()
+        asyncio.set_event_loop(None)
+        asyncio.set_event_loop(None)
+
+def test_close_writes_pending_changes_and_stops_the_timer(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+
+    async def main():
+        loop = asyncio.get_event_loop()
+        db = config.Config('deferred.json', loop=loop, flush_interval=60.0)
+        await db.put('state', 1)
+        assert db._flusher is not None
+
+        db.close()
+        assert db._flusher is None
+
+        with open('deferred.json') as fp:
+            assert json.load(fp) == {'state': 1}
+
+        # a reloaded cog's instance sees the write straight away
+        assert config.Config('deferred.json', loop=loop).get('state') == 1
+
+    run(main())
+
+# these go through the synchronous halves since the async ones
+# use ``with await lock`` which newer versions of Python reject
+def put(db, key, value):
+    db._db[key] = value
+    db._append_line(json.dumps(['put', key, value]) + '\n')
+
+def test_compaction_leaves_lines_from_another_instance(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    loop = asyncio.new_event_loop()
+    asyncio.set_event_loop(loop)
+    try:
+        old = config.Config('journal.json', loop=loop, backend='journal', fsync='never')
+        put(old, 'a', 1)
+
+        # the cog got reloaded and the new instance wrote something the old one never saw
+        new = config.Config('journal.json', loop=loop, backend='journal', fsync='never')
+        put(new, 'b', 2)
+
+        old._compact(old._db.copy())
+        new.close()
+        old.close()
+
+        assert config.Config('journal.json', loop=loop, backend='journal').all() == {'a': 1, 'b': 2}
+    finally:
+        loop.close()
+        asyncio.set_event_loop(None)
+
+def test_compaction_empties_its_own_journal(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    loop = asyncio.new_event_loop()
+    asyncio.set_event_loop(loop)
+    try:
+        db = config.Config('journal.json', loop=loop, backend='journal', fsync='never')
+        put(db, 'a', 1)
+        put(db, 'b', 2)
+        db._compact(db._db.copy())
+        assert (tmp_path / 'journal.json.journal').stat().st_size == 0
+
+        put(db, 'c', 3)
+        db.close()
+        assert db._journal is None
+        assert config.Config('journal.json', loop=loop, backend='journal').all() == {'a': 1, 'b': 2, 'c': 3}
+    finally:
+        loop.close()
+        asyncio.set_event_loop(None)
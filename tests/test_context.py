@@ -0,0 +1,125 @@
+import asyncio
+
+import pytest
+
+from cogs.utils import db
+from cogs.utils.context import Context, _LazyConnection
+
+class FakeConnection:
+    def __init__(self, pool):
+        self.pool = pool
+        self.transaction_open = False
+        self.executed = []
+
+    def is_in_transaction(self):
+        return self.transaction_open
+
+    async def fetchval(self, query, *args):
+        return 1
+
+    async def execute(self, query, *args):
+        self.executed.append(query)
+
+class FakePool:
+    def __init__(self):
+        self.acquired = []
+        self.released = []
+
+    async def acquire(self, *, timeout=None):
+        con = FakeConnection(self)
+        self.acquired.append(con)
+        return con
+
+    async def release(self, con):
+        self.released.append(con)
+
+class FakeReplica:
+    healthy = True
+
+    def __init__(self, pool):
+        self.pool = pool
+
+@pytest.fixture
+def make_context(monkeypatch):
+    # the pools are global so put them back once the test is done
+    def make(primary, replica):
+        monkeypatch.setattr(db.Table, '_pool', primary, raising=False)
+        monkeypatch.setattr(db.Table, '_replica', FakeReplica(replica), raising=False)
+
+        ctx = Context.__new__(Context)
+        ctx.pool = primary
+        ctx.command = None
+        ctx._connection = None
+        ctx._connection_pool = None
+        ctx.used_db = False
+        ctx.db = _LazyConnection(ctx)
+        return ctx
+
+    return make
+
+def run(coro):
+    loop = asyncio.new_event_loop()
+    try:
+        return loop.run_until_complete(coro)
+    finally:
+        loop.close()
+
+def test_readonly_acquire_moves_off_the_primary(make_context):
+    primary, replica = FakePool(), FakePool()
+    ctx = make_context(primary, replica)
+
+    async def main():
+        # e.g. a check that used ctx.db
+        await ctx.db.fetchval('SELECT 1;')
+        await ctx.acquire(readonly=True)
+
+    run(main())
+
+    assert primary.released == primary.acquired
+    assert len(replica.acquired) == 1
+    assert ctx._connection is replica.acquired[0]
+    assert ctx._connection_pool is replica
+
+def test_readonly_acquire_stays_in_transaction(make_context):
+    primary, replica = FakePool(), FakePool()
+    ctx = make_context(primary, replica)
+
+    async def main():
+        await ctx.db.fetchval('SELECT 1;')
+        ctx._connection.transaction_open = True
+        await ctx.acquire(readonly=True)
+
+    run(main())
+
+    assert primary.released == []
+    assert replica.acquired == []
+    assert ctx._connection is primary.acquired[0]
+
+def test_write_after_readonly_acquire_goes_to_the_primary(make_context):
+    primary, replica = FakePool(), FakePool()
+    ctx = make_context(primary, replica)
+
+    async def main():
+        await ctx.acquire(readonly=True)
+        await ctx.db.fetchval('SELECT 1;')
+        await ctx.db.execute('UPDATE x SET y=1;')
+
+    run(main())
+
+    assert replica.released == replica.acquired
+    assert len(replica.acquired) == 1
+    assert ctx._connection is primary.acquired[0]
+    assert primary.acquired[0].executed == ['UPDATE x SET y=1;']
+
+def test_write_after_readonly_acquire_in_transaction_raises(make_context):
+    primary, replica = FakePool(), FakePool()
+    ctx = make_context(primary, replica)
+
+    async def main():
+        await ctx.acquire(readonly=True)
+        ctx._connection.transaction_open = True
+        with pytest.raises(RuntimeError):
+            await ctx.db.execute('UPDATE x SET y=1;')
+
+    run(main())
+    assert primary.acquired == []
@@ -0,0 +1,47 @@
+import copy
+import datetime
+
+from cogs.utils import db
+
+class Events(db.Table, partition_by=db.Range('used', interval='1 month')):
+    id = db.PrimaryKeyColumn()
+    used = db.Column(db.Datetime, index=True)
+    name = db.Column(db.String, index=True)
+
+def partitioning_diff():
+    before = copy.deepcopy(Events.to_dict())
+    before['partition_by'] = None
+    for column in before['columns']:
+        if column['name'] == 'used':
+            column['index'] = False
+
+    return Events.from_dict(Events.to_dict()).diff(Events.from_dict(before))
+
+def test_partitioning_attaches_legacy_up_to_the_next_interval():
+    sql = partitioning_diff().to_sql().splitlines()
+    partition = Events.__partition__
+    bound = partition.next(partition.floor(datetime.datetime.utcnow())).isoformat(' ')
+
+    attach = "ALTER TABLE events ATTACH PARTITION events_legacy FOR VALUES FROM (MINVALUE) TO ('%s');" % bound
+    assert attach in sql
+
+    # the check constraint is validated before the table is locked by the rename
+    check = next(i for i, statement in enumerate(sql) if 'VALIDATE CONSTRAINT' in statement)
+    assert check < sql.index('ALTER TABLE events RENAME TO events_legacy;') < sql.index(attach)
+    assert sql[0] == 'DELETE FROM events WHERE used IS NULL;'
+
+    # nothing else is created over the range the legacy partition covers
+    created = [statement for statement in sql if 'PARTITION OF events FOR VALUES' in statement]
+    assert created and "FROM ('%s')" % bound in created[0]
+
+def test_partitioning_creates_each_index_once():
+    sql = partitioning_diff().to_sql().splitlines()
+    assert sql.count('CREATE INDEX IF NOT EXISTS events_used_idx ON events (used);') == 1
+
+def test_create_partitions_sql_skips_existing_ranges():
+    partition = db.Range('used', interval='1 month', premake=1)
+    now = datetime.datetime(2026, 10, 17)
+    existing = [(datetime.datetime.min, datetime.datetime(2026, 11, 1))]
+    sql = partition.create_partitions_sql('events', now, existing=existing)
+    assert not any('events_p2026_10' in statement for statement in sql)
+    assert any('events_p2026_11' in statement for statement in sql)
@@ -0,0 +1,39 @@
+from cogs.utils import rates
+
+class Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+def test_stale_buckets_are_cleared_per_key(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(rates.time, 'monotonic', clock)
+    counter = rates.RateCounter(window=10)
+
+    counter.add('a')
+    counter.add('b')
+    clock.now += 1
+    counter.add('a')
+
+    # only complete seconds count, 'b' wasn't touched since but its count is still there
+    assert counter.series(['a']) == [0] * 9 + [1]
+    assert counter.series(['b']) == [0] * 9 + [1]
+
+    clock.now += 9
+    assert counter.series(['b']) == [1] + [0] * 9
+
+    # once it's older than the window it's gone, even though 'b' was never touched
+    clock.now += 1
+    assert counter.series(['b']) == [0] * 10
+    counter.add('a')
+    clock.now += 1
+    assert counter.series() == [0] * 9 + [1]
+
+    # a gap longer than the window clears everything
+    clock.now += 50
+    counter.add('a')
+    assert sum(counter.series(['a'])) == 0
+    clock.now += 1
+    assert counter.series(['a'])[-1] == 1